@@ -1,6 +1,9 @@
 import cv2
 import json
+import re
 import numpy as np
+from occupancy_store import atomic_write_json
+from slot_geometry import NO_SLOT, SlotIndex
 
 # Globale Variablen
 points = []  # Aktuelle Punkte für einen Parkplatz
@@ -8,6 +11,25 @@ all_parkings = []  # Liste aller gespeicherten Parkplätze
 global_coordinates = {}  # Globale Fensterkoordinaten
 current_parking_id = ""  # Zwischenspeicher für die Eingabe der Parkplatz-ID
 selected_parking = None  # Für das Löschen eines Parkplatzes
+slot_index = None  # Räumlicher Index für das Finden eines Parkplatzes per Klick
+first_quad = None  # Erstes Eck-Viereck für eine Reihe oder ein Raster (Tab)
+dirty = True  # Anzeige muss neu gezeichnet werden (nur nach Eingaben)
+
+# Zeichenebenen: frame bleibt unverändert, base enthält alle gespeicherten Parkplätze und die
+# Anweisungen, display zusätzlich die aktuelle Eingabe. Geändert werden nur betroffene Bereiche.
+base = None
+display = None
+overlay_box = None  # Bereich der zuletzt gezeichneten Eingabe in display
+LABEL_REACH = (120, 16)  # Wie weit eine Beschriftung über ihren Parkplatz hinausragen kann (x, y)
+
+INSTRUCTIONS = [
+    "Linksklick: Punkt setzen",
+    "Rechtsklick: Parkplatz entfernen",
+    "Enter: Parkplatz-ID speichern",
+    "Tab: Eck-Viereck fuer Reihe/Raster",
+    "Z: Letzten Punkt entfernen",
+    "Q: Beenden"
+]
 
 # Funktion zur Initialisierung der JSON-Datei
 def initialize_json():
@@ -42,20 +64,190 @@ def calculate_global_coordinates(frame):
 
 # Funktion zur Verarbeitung von Mausaktionen
 def mouse_callback(event, x, y, flags, param):
-    global points, selected_parking, all_parkings, frame
+    global points, selected_parking, dirty
     if event == cv2.EVENT_LBUTTONDOWN:  # Linksklick
         points.append((x, y))  # Punkt zur Liste hinzufügen
         print(f"Klick-Koordinaten: ({x}, {y})")  # Koordinaten in der Konsole ausgeben
+        dirty = True
     elif event == cv2.EVENT_RBUTTONDOWN:  # Rechtsklick
-        for parking in all_parkings:
-            area = np.array(parking["coordinates"], np.int32)
-            if cv2.pointPolygonTest(area, (x, y), False) >= 0:
-                selected_parking = parking
-                all_parkings.remove(parking)
-                print(f"Parkplatz-ID {parking['id']} wurde entfernt.")
-                update_json()
-                reload_parkings(frame)
-                break
+        index = slot_index.query_point(x, y)
+        if index != NO_SLOT:
+            selected_parking = remove_parking(index)
+            print(f"Parkplatz-ID {selected_parking['id']} wurde entfernt.")
+            update_json()
+            dirty = True
+
+# Index über alle Parkplätze neu aufbauen (nach dem Laden)
+def rebuild_index():
+    global slot_index
+    h, w = frame.shape[:2]
+    slot_index = SlotIndex([parking["coordinates"] for parking in all_parkings], w, h)
+
+# Rechteck (x1, y1, x2, y2) auf das Bild begrenzen; None, wenn es außerhalb liegt
+def clip_box(x1, y1, x2, y2):
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = max(int(x1), 0), max(int(y1), 0), min(int(x2), w), min(int(y2), h)
+    return (x1, y1, x2, y2) if x1 < x2 and y1 < y2 else None
+
+# Bereich, den ein Parkplatz samt Linie und Beschriftung belegt
+def parking_box(coordinates):
+    area = np.array(coordinates, np.int32).reshape(-1, 2)
+    (x1, y1), (x2, y2) = area.min(axis=0), area.max(axis=0)
+    label_x, label_y = area[0]
+    return clip_box(min(x1, label_x) - 2, min(y1, label_y - LABEL_REACH[1]) - 2,
+                    max(x2, label_x + LABEL_REACH[0]) + 3, max(y2, label_y) + 3)
+
+# Parkplatz in eine Ebene (oder einen Ausschnitt davon mit Versatz offset) zeichnen
+def draw_parking(layer, parking, offset=(0, 0)):
+    area = np.array(parking["coordinates"], np.int32).reshape(-1, 2) + offset
+    cv2.polylines(layer, [area], True, (0, 255, 0), 2)
+    cv2.putText(layer, parking["id"], tuple(area[0].tolist()), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+# Tastenanweisungen oben rechts (in einen Ausschnitt mit Versatz offset)
+def draw_instructions(layer, offset=(0, 0)):
+    x_offset = frame.shape[1] - 300 + offset[0]
+    y_offset = 20 + offset[1]
+    for i, text in enumerate(INSTRUCTIONS):
+        cv2.putText(layer, text, (x_offset, y_offset + i * 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+
+# Grundebene einmal komplett aufbauen (Start)
+def build_base():
+    global base, display, overlay_box
+    base = frame.copy()
+    for parking in all_parkings:
+        draw_parking(base, parking)
+    draw_instructions(base)
+    display = base.copy()
+    overlay_box = None
+
+# Bereich der Grundebene aus dem Originalbild neu zeichnen (nur Parkplätze, die ihn berühren).
+# Nie über bestehende Linien zeichnen: Text sieht nach zweimaligem Zeichnen anders aus.
+def redraw_region(box):
+    if box is None:
+        return
+    x1, y1, x2, y2 = box
+    base[y1:y2, x1:x2] = frame[y1:y2, x1:x2]
+    view = base[y1:y2, x1:x2]
+    for index in slot_index.query_box(x1 - LABEL_REACH[0], y1 - 2, x2 + 2, y2 + LABEL_REACH[1]):
+        draw_parking(view, all_parkings[index], (-x1, -y1))
+    draw_instructions(view, (-x1, -y1))
+    copy_region(box)
+
+# Bereich der Grundebene in die Anzeige übernehmen
+def copy_region(box):
+    if box is not None:
+        x1, y1, x2, y2 = box
+        display[y1:y2, x1:x2] = base[y1:y2, x1:x2]
+
+# Parkplatz speichern und nur seinen Bereich der Grundebene neu zeichnen (redraw=False: Aufrufer zeichnet)
+def add_parking(parking_id, coordinates, redraw=True):
+    parking = {
+        "id": parking_id,
+        "coordinates": [[int(x), int(y)] for x, y in coordinates],
+        "car": False,
+        "license_plate": "",
+    }
+    all_parkings.append(parking)
+    slot_index.add(parking["coordinates"])
+    if redraw:
+        redraw_region(parking_box(parking["coordinates"]))
+    return parking
+
+# Parkplatz im Speicher löschen (kein erneutes Laden von JSON und Bild)
+def remove_parking(index):
+    parking = all_parkings.pop(index)
+    slot_index.remove(index)
+    redraw_region(parking_box(parking["coordinates"]))
+    return parking
+
+# Vierecke einer Reihe (rows == 1) oder eines Rasters aus dem ersten und dem letzten Viereck.
+# In einer Reihe werden die Ecken linear interpoliert. Im Raster wird der Abstand jeder Ecke
+# in die Richtung der Oberkante (Spalten) und der linken Kante (Zeilen) des ersten Vierecks
+# zerlegt, sodass auch schräge Reihen und zur Ferne hin kleinere Parkplätze passen.
+def interpolate_quads(first, last, columns, rows=1):
+    first = np.array(first, np.float64).reshape(4, 2)
+    last = np.array(last, np.float64).reshape(4, 2)
+    if rows == 1 or columns == 1:
+        count = max(rows, columns)
+        steps = np.linspace(0.0, 1.0, count) if count > 1 else np.zeros(1)
+        return [first + (last - first) * step for step in steps]
+
+    across = first[1] - first[0]
+    down = first[3] - first[0]
+    basis = np.column_stack((across, down))
+    if abs(np.linalg.det(basis)) < 1e-6:
+        raise ValueError("Erstes Viereck ist entartet")
+    along_across, along_down = np.linalg.solve(basis, (last - first).T)  # je ein Wert pro Ecke
+    quads = []
+    for row in range(rows):
+        for column in range(columns):
+            u, v = column / (columns - 1), row / (rows - 1)
+            quads.append(first + np.outer(along_across * u, across) + np.outer(along_down * v, down))
+    return quads
+
+# Eingabe "Präfix Spalten[xZeilen]" (z. B. "A 12" oder "B 10x3") für Reihe/Raster anwenden
+def add_bulk(text, last):
+    match = re.fullmatch(r"(\w*)\s+(\d+)(?:x(\d+))?", text.strip())
+    if match is None:
+        print("Eingabe für Reihe/Raster: Präfix Anzahl oder Präfix SpaltenxZeilen, z. B. 'A 12' oder 'B 10x3'.")
+        return False
+    prefix, columns, rows = match.group(1), int(match.group(2)), int(match.group(3) or 1)
+    if columns < 1 or rows < 1:
+        print("Anzahl muss mindestens 1 sein.")
+        return False
+    ids = [f"{prefix}{number}" for number in range(1, columns * rows + 1)]
+    existing = {parking["id"] for parking in all_parkings}
+    duplicates = [parking_id for parking_id in ids if parking_id in existing]
+    if duplicates:
+        print(f"Parkplatz-IDs existieren bereits: {', '.join(duplicates[:5])}")
+        return False
+    try:
+        quads = interpolate_quads(first_quad, last, columns, rows)
+    except ValueError as error:
+        print(error)
+        return False
+    boxes = []
+    for parking_id, quad in zip(ids, quads):
+        parking = add_parking(parking_id, np.round(quad).astype(int).tolist(), redraw=False)
+        boxes.append(parking_box(parking["coordinates"]))
+    boxes = np.array([box for box in boxes if box is not None]).reshape(-1, 4)
+    if len(boxes):
+        redraw_region((*boxes[:, :2].min(axis=0).tolist(), *boxes[:, 2:].max(axis=0).tolist()))  # Einmal für alle
+    print(f"{len(ids)} Parkplätze {ids[0]} bis {ids[-1]} wurden gespeichert.")
+    update_json()
+    return True
+
+# Aktuelle Eingabe (Punkte, Vierecke, Eingabeaufforderung) über die Grundebene legen
+def draw_overlay():
+    global overlay_box
+    copy_region(overlay_box)  # Vorherige Eingabe entfernen
+    boxes = []
+    if first_quad is not None:
+        cv2.polylines(display, [np.array(first_quad, np.int32)], True, (255, 0, 255), 2)
+        boxes.append(np.array(first_quad))
+
+    # Zeichne alle Punkte aus der Liste
+    for point in points:
+        cv2.circle(display, point, 5, (255, 0, 0), -1)  # Blauer Punkt
+    if points:
+        boxes.append(np.array(points))
+
+    # Zeichne ein Rechteck, wenn genau 4 Punkte vorhanden sind
+    if len(points) == 4:
+        cv2.polylines(display, [np.array(points, np.int32)], isClosed=True, color=(0, 255, 0), thickness=2)
+
+        # Zeige grafische Eingabeaufforderung
+        prompt = "Prefix Anzahl[xZeilen]:" if first_quad is not None else "Enter Parking ID:"
+        cv2.putText(display, prompt, (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        cv2.putText(display, current_parking_id, (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        boxes.append(np.array([[40, 15], [700, 115]]))
+
+    if boxes:
+        corners = np.concatenate(boxes)
+        (x1, y1), (x2, y2) = corners.min(axis=0), corners.max(axis=0)
+        overlay_box = clip_box(x1 - 8, y1 - 8, x2 + 9, y2 + 9)
+    else:
+        overlay_box = None
 
 # Fenster und Mouse-Callback initialisieren
 cv2.namedWindow('Image', cv2.WINDOW_NORMAL)
@@ -69,73 +261,31 @@ if frame is None:
     print("Bild konnte nicht geladen werden. Bitte überprüfe den Pfad.")
     exit()
 
-# Vorhandene Parkplätze aus JSON laden
-def reload_parkings(frame):
-    global all_parkings
-    try:
-        with open("all_parkings.json", "r") as json_file:
-            data = json.load(json_file)
-            all_parkings = data.get("parkings", [])
-            print("JSON-Datei neu geladen.")
-            # Entferne alle Linien vom ursprünglichen Frame
-            frame[:] = cv2.imread(image_path)
-    except FileNotFoundError:
-        print("JSON-Datei nicht gefunden. Eine neue Datei wird erstellt.")
-
-# Funktion zum Aktualisieren der JSON-Datei
+# Funktion zum Aktualisieren der JSON-Datei (atomar, damit ein Absturz das Layout nicht zerstört)
 def update_json():
-    with open("all_parkings.json", "w") as json_file:
-        json.dump({
-            "global_coordinates": global_coordinates,
-            "parkings": all_parkings
-        }, json_file, indent=4)
+    atomic_write_json("all_parkings.json", {
+        "global_coordinates": global_coordinates,
+        "parkings": all_parkings
+    }, indent=4)
     print("JSON-Datei wurde aktualisiert.")
 
 # JSON initialisieren
 initialize_json()
+rebuild_index()
+build_base()
 
-# Hauptschleife
+# Hauptschleife: gezeichnet und angezeigt wird nur nach einer Eingabe
 while True:
-    # Kopiere das Bild, damit Punkte hinzugefügt werden können
-    display_frame = frame.copy()
-
-    # Bestehende Parkplätze zeichnen
-    for parking in all_parkings:
-        area = np.array(parking["coordinates"], np.int32)
-        cv2.polylines(display_frame, [area], True, (0, 255, 0), 2)
-        cv2.putText(display_frame, parking["id"], tuple(parking["coordinates"][0]), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-
-    # Zeichne alle Punkte aus der Liste
-    for point in points:
-        cv2.circle(display_frame, point, 5, (255, 0, 0), -1)  # Blauer Punkt
-
-    # Zeichne ein Rechteck, wenn genau 4 Punkte vorhanden sind
-    if len(points) == 4:
-        cv2.polylines(display_frame, [np.array(points, np.int32)], isClosed=True, color=(0, 255, 0), thickness=2)
-
-        # Zeige grafische Eingabeaufforderung
-        cv2.putText(display_frame, "Enter Parking ID:", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-        cv2.putText(display_frame, current_parking_id, (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-
-    # Zeige die Tastenanweisungen oben rechts im Frame
-    instructions = [
-        "Linksklick: Punkt setzen",
-        "Rechtsklick: Parkplatz entfernen",
-        "Enter: Parkplatz-ID speichern",
-        "Z: Letzten Punkt entfernen",
-        "Q: Beenden"
-    ]
-
-    x_offset = display_frame.shape[1] - 300
-    y_offset = 20
-    for i, text in enumerate(instructions):
-        cv2.putText(display_frame, text, (x_offset, y_offset + i * 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-
-    # Bild anzeigen
-    cv2.imshow("Image", display_frame)
+    if dirty:
+        draw_overlay()
+        cv2.imshow("Image", display)
+        dirty = False
 
     # Warte auf Benutzereingabe
-    key = cv2.waitKey(1) & 0xFF
+    key = cv2.waitKey(20) & 0xFF
+    if key == 255:  # Keine Taste gedrückt
+        continue
+    dirty = True
 
     if key == ord('q'):  # Taste Q für Beenden
         # Programm beenden und alle Parkplätze speichern
@@ -147,22 +297,27 @@ while True:
     elif key == ord('z') and points:  # Taste Z und es gibt Punkte
         removed_point = points.pop()  # Letzten Punkt entfernen
         print(f"Letzter Punkt gelöscht: {removed_point}")
+    elif key == 27 and first_quad is not None:  # Esc: Reihe/Raster abbrechen
+        first_quad = None
+        current_parking_id = ""
+        print("Reihe/Raster abgebrochen.")
+    elif key == 9 and len(points) == 4 and first_quad is None:  # Tab: erstes Eck-Viereck merken
+        first_quad = points
+        points = []
+        current_parking_id = ""
+        print("Erstes Eck-Viereck gespeichert. Jetzt das letzte Viereck der Reihe/des Rasters setzen.")
     elif len(points) == 4:  # Eingabe der Parkplatz-ID
         if key == 13:  # Enter-Taste
             if current_parking_id.strip() == "":
                 print("Parkplatz-ID darf nicht leer sein.")
+            elif first_quad is not None:
+                if add_bulk(current_parking_id, points):
+                    first_quad = None
+                    points = []
+                    current_parking_id = ""
             else:
-                parking_data = {
-                    "id": current_parking_id,
-                    "coordinates": points,
-                    "car": False,
-                    "license_plate": "",
-                }
-                all_parkings.append(parking_data)  # Parkplatz zur Liste hinzufügen
+                add_parking(current_parking_id, points)  # Parkplatz zur Liste hinzufügen und einzeichnen
                 print(f"Parkplatz-ID {current_parking_id} mit Koordinaten {points} wurde gespeichert.")
-
-                # Rechteck dauerhaft zeichnen und Punkte zurücksetzen
-                cv2.polylines(frame, [np.array(points, np.int32)], isClosed=True, color=(0, 255, 0), thickness=2)
                 points = []  # Punkte zurücksetzen
                 current_parking_id = ""  # ID zurücksetzen
 
@@ -170,6 +325,8 @@ while True:
                 update_json()
         elif 48 <= key <= 57 or 65 <= key <= 90 or 97 <= key <= 122:  # Alphanumerische Zeichen
             current_parking_id += chr(key)  # Zeichen zur ID hinzufügen
+        elif key == 32 and first_quad is not None:  # Leerzeichen trennt Präfix und Anzahl
+            current_parking_id += " "
         elif key in (8, 127):  # Backspace auf verschiedenen Systemen
             current_parking_id = current_parking_id[:-1]  # Letztes Zeichen entfernen
 
@@ -1,157 +1,115 @@
-import cv2
-import pandas as pd
-import numpy as np
-import json
-import time
-from ultralytics import YOLO
 import asyncio
-import uuid
-from azure.iot.device.aio import IoTHubDeviceClient
-from azure.iot.device import Message
-
-# YOLOv8 Model laden
-model = YOLO('yolov8s.pt')
-
-# Azure IoT Hub-Konfiguration
-CONNECTION_STRING = "HostName=ProjektLabor.azure-devices.net;DeviceId=OnlineSimulator;SharedAccessKey=Lfp1qcai6gyHk1XTGMC3HO2O0lmB7kUy4eajDG+/Ajw="
-MQTT_TOPIC_PUBLISH = "devices/OnlineSimulator/messages/events/"
-
-# JSON-Datei laden
-with open("all_parkings.json", "r") as json_file:
-    data = json.load(json_file)
-
-global_coordinates = data["global_coordinates"]
-parkings = data["parkings"]
-
-# COCO-Klassen laden
-with open("coco.txt", "r") as my_file:
-    class_list = my_file.read().split("\n")
-
-# Screenshot Zähler
-screenshot_counter = 0
-paused = False
-
-async def send_to_azure(payload):
-    client = IoTHubDeviceClient.create_from_connection_string(CONNECTION_STRING)
-    await client.connect()
-    try:
-        message = Message(payload)
-        message.message_id = uuid.uuid4()
-        message.content_encoding = "utf-8"
-        message.content_type = "application/json"
-        await client.send_message(message)
-        print("Nachricht erfolgreich an Azure IoT Hub gesendet.")
-    except Exception as ex:
-        print(f"Fehler beim Senden der Nachricht an Azure IoT Hub: {ex}")
-    finally:
-        await client.shutdown()
-
-# Funktion zur Aktualisierung der JSON-Datei und Senden an Azure
-async def update_json():
-    with open("all_parkings.json", "w") as json_file:
-        json.dump({
-            "global_coordinates": global_coordinates,
-            "parkings": parkings
-        }, json_file, indent=4)
-    print("JSON-Datei wurde aktualisiert.")
-
-    with open("all_parkings.json", "r") as json_file:
-        data = json.load(json_file)
-        data["timestamp"] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
-        payload = json.dumps(data)
-        print(f"Sende JSON-Daten an Azure: {payload}")
-        await send_to_azure(payload)
-
-# OpenCV-Fenster initialisieren
-cv2.namedWindow('RGB')
-cap = cv2.VideoCapture("parking1.mp4")
-
-# Hauptschleife
-async def main():
-    global paused, screenshot_counter
+import json
+import queue
+from config import load_config
+from metrics import Metrics, log, setup_logging, start_server
+from monitor import ParkingMonitor, Viewer, load_class_list, load_model, open_slots, open_stream
+from pipeline import STOP
+from spool import PublishSpool, watch_spool
+from startup import StartupTimer
+
+# Parkplatz-Erkennung mit Versand an den Azure IoT Hub. Einstellungen siehe config.py, z. B.
+#   python azure_basic.py --video parking1.mp4 --connection-string "HostName=...;DeviceId=...;SharedAccessKey=..."
+#
+# Modell laden (inkl. Warm-up), Videoquelle öffnen und Parkplätze rastern laufen in Threads,
+# gleichzeitig baut der Event-Loop die Verbindung zum IoT Hub auf; nach dem ersten Frame wird
+# die Dauer jeder Phase ausgegeben. Laufzeiten, Warteschlangen und Sendeergebnisse:
+#   curl http://127.0.0.1:9108/metrics
+# Nachrichten warten im Spool (--spool) auf der Festplatte, bis der Hub sie angenommen hat.
+
+
+# Stufe 3 (asyncio-Task): Belegung speichern und an Azure senden, ohne die Anzeige zu blockieren
+async def publisher(monitor, update_state):
     while True:
-        if not paused:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            frame = cv2.resize(frame, (1020, 500))
-
-            # YOLO-Vorhersagen
-            results = model.predict(frame)
-            detections = results[0].boxes.data
-            px = pd.DataFrame(detections).astype("float")
-
-            # Parkplätze überprüfen
-            for parking in parkings:
-                parking_id = parking["id"]
-                area = parking["coordinates"]
-                area_np = np.array(area, np.int32)
-
-                list_objects = []
-
-                for index, row in px.iterrows():
-                    x1, y1, x2, y2 = map(int, row[:4])
-                    class_id = int(row[5])
-                    class_name = class_list[class_id]
-
-                    if 'car' in class_name:
-                        cx = (x1 + x2) // 2
-                        cy = (y1 + y2) // 2
-
-                        if cv2.pointPolygonTest(area_np, (cx, cy), False) >= 0:
-                            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                            cv2.circle(frame, (cx, cy), 3, (0, 0, 255), -1)
-                            list_objects.append(class_name)
-                            print(f"Auto erkannt in Parkplatz ID: {parking_id}, Klasse: {class_name}")
-
-                if len(list_objects) > 0:
-                    cv2.polylines(frame, [area_np], True, (0, 0, 255), 2)
-                    cv2.putText(frame, f"{parking_id}", tuple(area[0]), cv2.FONT_HERSHEY_COMPLEX, 0.5, (0, 0, 255), 1)
-
-                    if not parking["car"]:
-                        parking["car"] = True
-                        print(f"Parkplatz {parking_id} wurde auf 'belegt' gesetzt.")
-                        await update_json()
-                else:
-                    cv2.polylines(frame, [area_np], True, (0, 255, 0), 2)
-                    cv2.putText(frame, f"{parking_id}", tuple(area[0]), cv2.FONT_HERSHEY_COMPLEX, 0.5, (255, 255, 255), 1)
-
-                    if parking["car"]:
-                        parking["car"] = False
-                        print(f"Parkplatz {parking_id} wurde auf 'frei' gesetzt.")
-                        await update_json()
-
-        instructions = [
-            "Leertaste: Pause/Weiter",
-            "S: Screenshot speichern",
-            "Q: Beenden"
-        ]
+        try:
+            item = await asyncio.to_thread(monitor.publish_queue.get, 0.1)
+        except queue.Empty:
+            continue
+        if item is STOP:
+            break
+        update_state(*item)
 
-        x_offset = frame.shape[1] - 300
-        y_offset = 20
-        for i, text in enumerate(instructions):
-            cv2.putText(frame, text, (x_offset, y_offset + i * 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
 
-        cv2.imshow("RGB", frame)
+# Hauptschleife
+async def main(config, timer, viewer):
+    from azure_sender import AzureSender
+
+    class_list = load_class_list()
+    metrics = Metrics()
+    server = start_server(metrics, config.metrics_port, config.metrics_host) if config.metrics_port else None
+
+    # Dauerhafte Verbindung zum IoT Hub; der Sender verbindet sofort im Hintergrund, sodass ein
+    # nicht erreichbarer Hub den Start nicht aufhält (Nachrichten warten im Spool)
+    spool = None
+    if config.spool:
+        spool = PublishSpool(config.spool, config.spool_capacity, config.spool_size * 1024 * 1024)
+        watch_spool(metrics, spool)
+    sender = AzureSender(config.connection_string, max_batch=config.spool_batch, metrics=metrics, spool=spool,
+                         rate=config.spool_rate)
+    metrics.collect("publish_total", "counter", "Nachrichten an den IoT Hub nach Ergebnis",
+                    lambda: [({"result": "ok"}, sender.sent), ({"result": "error"}, sender.failed),
+                             ({"result": "dropped"}, sender.dropped)])
+    metrics.collect("publish_queue_depth", "gauge", "Nachrichten in der Warteschlange des Senders",
+                    lambda: [({}, sender.backlog)])
+    sender.start()
+    broker = asyncio.create_task(timer.measure("broker", sender.connected.wait()))
+    detector, cap, (engine, store, history) = await asyncio.gather(
+        timer.measure("modell", asyncio.to_thread(load_model, config, class_list)),
+        timer.measure("stream", asyncio.to_thread(open_stream, config.video)),
+        timer.measure("parkplaetze", asyncio.to_thread(open_slots, config, class_list)),
+    )
+    monitor = ParkingMonitor(config, class_list, detector, cap, engine, store, history, timer, viewer.paused, metrics)
+    if spool is not None:
+        spool.on_drop = monitor.delta.request_snapshot  # Verworfene Deltas durch Snapshot ersetzen
+
+    # Belegung speichern und an Azure senden
+    def update_state(payload, message):
+        monitor.persist(message)
+        log.debug("Sende JSON-Daten an Azure: %s", payload)
+        sender.enqueue(payload)  # Nur einreihen, der Sender-Task überträgt asynchron
+
+    monitor.pipeline.start()
+    publish_task = asyncio.create_task(publisher(monitor, update_state))
 
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q'):
+    while True:
+        try:
+            item = monitor.render_queue.get_nowait()
+        except queue.Empty:
+            item = None
+            await asyncio.sleep(0.05 if config.headless else 0.005)  # Event-Loop für den Publish-Task freigeben
+        if not viewer.step(item, monitor):
             break
-        elif key == 32:
-            paused = not paused
-        elif key == ord('s'):
-            screenshot_filename = f"screenshot_{screenshot_counter}.jpg"
-            cv2.imwrite(screenshot_filename, frame)
-            print(f"Screenshot gespeichert: {screenshot_filename}")
-            screenshot_counter += 1
 
-    cap.release()
-    cv2.destroyAllWindows()
+    # Stufen anhalten und ausstehende Nachrichten noch senden
+    await asyncio.to_thread(monitor.pipeline.stop)
+    monitor.publish_queue.put(STOP)
+    await publish_task
+    message = monitor.final_message()
+    if message is not None:
+        update_state(json.dumps(message), message)
+    broker.cancel()
+    await sender.stop()
+    monitor.close()
+    print(f"Azure: {sender.sent} gesendet, {sender.failed} fehlgeschlagen, {sender.dropped} verworfen")
+    if spool is not None:
+        print(f"Spool: {len(spool)} noch zu senden, {spool.dropped} verworfen")
+        spool.close()
+    viewer.close()
+    if server is not None:
+        server.shutdown()
+    return monitor.pipeline
+
 
 if __name__ == '__main__':
     print("IoT Hub Device")
+    timer = StartupTimer()
+    config = load_config("Parkplatz-Erkennung mit Versand an den Azure IoT Hub")
+    setup_logging(config.log_level)
+    # Fenster bzw. Signal-Handler vor asyncio.run, damit asyncio SIGINT nicht übernimmt
+    viewer = Viewer(config)
     try:
-        asyncio.run(main())
+        pipeline = asyncio.run(main(config, timer, viewer))
     except KeyboardInterrupt:
         print("Beendet")
+    else:
+        pipeline.raise_if_failed()  # Abbruch durch eine fehlerhafte Stufe: Exit-Code 1
@@ -0,0 +1,196 @@
+import asyncio
+import time
+import uuid
+from azure.iot.device.aio import IoTHubDeviceClient
+from azure.iot.device import Message
+from metrics import log
+from spool import MAX_BATCH_BYTES, RateLimiter, batch_payload
+
+
+class AzureSender:
+    """Eine dauerhafte Verbindung zum IoT Hub mit Hintergrund-Task zum Senden.
+
+    Die Frame-Schleife ruft nur enqueue() auf. Der Task leert die Warteschlange und fasst
+    Nachrichten, die sich bei langsamer Verbindung angesammelt haben, zu einem Batch
+    (JSON-Array) zusammen. Bei Fehlern wird mit exponentiellem Backoff neu verbunden.
+    Mit metrics wird die Dauer jedes send_message als Stufe "publish" erfasst.
+
+    Mit spool (spool.py) liegen die Nachrichten statt in der Warteschlange im Speicher auf
+    der Festplatte: nichts wird verworfen, solange der Spool Platz hat, ein Ausfall des
+    Hubs übersteht auch einen Neustart, und der Rückstand wird danach in Batches mit
+    höchstens rate Nachrichten pro Sekunde nachgesendet.
+    """
+
+    def __init__(self, connection_string, max_queue=1000, max_batch=50,
+                 backoff_min=1.0, backoff_max=60.0, metrics=None, spool=None, rate=200.0):
+        self.connection_string = connection_string
+        self.metrics = metrics
+        self.spool = spool
+        self.limiter = RateLimiter(rate, burst=max_batch)
+        self.max_batch = max_batch
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.client = None
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue = asyncio.Queue(max_queue)
+        self._task = None
+        self._stopping = False
+        self._pending = None  # Bereits entnommene, noch nicht gesendete Nachricht
+        self.connected = asyncio.Event()  # Gesetzt, solange eine Verbindung besteht
+        self._wake = asyncio.Event()  # Neue Nachricht im Spool
+
+    # Anzahl noch nicht gesendeter Nachrichten
+    @property
+    def backlog(self):
+        return len(self.spool) if self.spool is not None else self._queue.qsize()
+
+    # Nachricht einreihen, ohne zu warten; bei voller Warteschlange die älteste verwerfen
+    def enqueue(self, payload):
+        if self.spool is not None:
+            self.spool.append(payload)
+            self._wake.set()
+            return
+        while True:
+            try:
+                self._queue.put_nowait(payload)
+                return
+            except asyncio.QueueFull:
+                self._queue.get_nowait()
+                self.dropped += 1
+                log.warning("Warteschlange für Azure voll, älteste Nachricht verworfen.")
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    # Ausstehende Nachrichten noch senden und die Verbindung schließen
+    async def stop(self):
+        self._stopping = True
+        if self.spool is not None:
+            self._wake.set()
+        else:
+            await self._queue.put(None)
+        if self._task is not None:
+            await self._task
+
+    async def _connect(self):
+        backoff = self.backoff_min
+        while self.client is None:
+            client = IoTHubDeviceClient.create_from_connection_string(self.connection_string)
+            try:
+                await client.connect()
+                self.client = client
+                self.connected.set()
+                log.info("Verbindung zum Azure IoT Hub hergestellt.")
+            except Exception as ex:
+                log.warning("Verbindung zum Azure IoT Hub fehlgeschlagen, neuer Versuch in %.0f s: %s", backoff, ex)
+                await client.shutdown()
+                if self._stopping:
+                    return
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+
+    async def _disconnect(self):
+        self.connected.clear()
+        if self.client is not None:
+            try:
+                await self.client.shutdown()
+            except Exception as ex:
+                log.warning("Fehler beim Trennen vom Azure IoT Hub: %s", ex)
+            self.client = None
+
+    # Weitere bereits wartende Nachrichten zu einem Batch hinzufügen
+    def _collect_batch(self, first):
+        batch = [first]
+        size = len(first)
+        while len(batch) < self.max_batch and not self._queue.empty():
+            payload = self._queue.get_nowait()
+            if payload is None:
+                self._stopping = True
+                break
+            if size + len(payload) > MAX_BATCH_BYTES:
+                self._pending = payload
+                break
+            batch.append(payload)
+            size += len(payload)
+        return batch
+
+    def _build_message(self, batch):
+        message = Message(batch_payload(batch))
+        if len(batch) > 1:
+            message.custom_properties["batch_size"] = str(len(batch))
+        message.message_id = uuid.uuid4()
+        message.content_encoding = "utf-8"
+        message.content_type = "application/json"
+        return message
+
+    async def _send(self, batch):
+        backoff = self.backoff_min
+        attempts = 0
+        while True:
+            await self._connect()
+            if self.client is None:
+                break
+            start = time.perf_counter()
+            try:
+                await self.client.send_message(self._build_message(batch))
+                self.sent += len(batch)
+                log.debug("%d Nachricht(en) erfolgreich an Azure IoT Hub gesendet.", len(batch))
+                return True
+            except Exception as ex:
+                log.warning("Fehler beim Senden der Nachricht an Azure IoT Hub: %s", ex)
+                await self._disconnect()
+            finally:
+                if self.metrics is not None:
+                    self.metrics.observe("stage_seconds", time.perf_counter() - start, stage="publish")
+            attempts += 1
+            if self._stopping and attempts >= 3:
+                break
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.backoff_max)
+
+        if self.spool is None:
+            self.failed += len(batch)
+            log.warning("%d Nachricht(en) konnten nicht gesendet werden.", len(batch))
+        return False
+
+    # Mit Spool: Nachrichten erst nach erfolgreichem Senden freigeben
+    async def _run_spool(self):
+        while True:
+            self._wake.clear()
+            start, batch = self.spool.peek(self.max_batch, MAX_BATCH_BYTES)
+            if not batch:
+                if self._stopping:
+                    break
+                await self._wake.wait()
+                continue
+            await asyncio.sleep(self.limiter.delay(len(batch)))
+            if await self._send(batch):
+                self.spool.ack(start, len(batch))
+            elif self._stopping:
+                log.info("%d Nachricht(en) bleiben im Spool für den nächsten Start.", len(self.spool))
+                break
+
+    async def run(self):
+        try:
+            await self._connect()  # Sofort verbinden (parallel zum Programmstart), nicht erst beim ersten Senden
+            if self.spool is not None:
+                await self._run_spool()
+                return
+            while True:
+                if self._pending is not None:
+                    payload, self._pending = self._pending, None
+                elif self._stopping and self._queue.empty():
+                    break
+                else:
+                    payload = await self._queue.get()
+                if payload is None:
+                    if self._queue.empty():
+                        break
+                    self._stopping = True
+                    continue
+                await self._send(self._collect_batch(payload))
+        finally:
+            await self._disconnect()
@@ -0,0 +1,224 @@
+import argparse
+import csv
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from detector import BACKENDS, load_detector
+from hysteresis import SlotHysteresis
+from monitor import FRAME_SIZE, load_class_list
+from motion_gate import MotionGate
+from roi import RoiDetector
+from slot_engine import SlotEngine
+
+# Archivierte Aufnahmen ohne Anzeige auswerten: jedes Video wird in Zeitabschnitte zerlegt,
+# die Abschnitte laufen parallel in einem Prozess-Pool mit voller Dekodiergeschwindigkeit.
+# Erkennung, Zuordnung und Entprellung sind dieselben wie im Live-Betrieb (basic.py).
+# Ergebnis ist eine Zeitleiste pro Parkplatz (CSV oder Parquet).
+#
+# Beispiel:
+#   python batch_analysis.py --videos archiv/ --slots all_parkings.json --fps 1 --workers 4 --output timeline.csv
+#
+# Liegt neben einem Video eine gleichnamige .json-Datei, wird sie statt --slots verwendet.
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov")
+COLUMNS = ("video", "slot_id", "start_s", "end_s", "duration_s", "occupied")
+
+# Zustand eines Worker-Prozesses (Modell und Parkplätze werden nur einmal geladen)
+_worker = {}
+
+
+def find_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            videos.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(VIDEO_EXTENSIONS)
+            ))
+        else:
+            videos.extend(sorted(glob.glob(path)) or [path])
+    return videos
+
+
+def slot_file_for(video, default):
+    candidate = os.path.splitext(video)[0] + ".json"
+    return candidate if os.path.exists(candidate) else default
+
+
+# Abschnitte (Video, Slot-Datei, erster Frame, Ende, FPS, Schrittweite) für alle Videos
+def plan_segments(videos, default_slots, segment_seconds, sample_fps):
+    tasks = []
+    for video in videos:
+        cap = cv2.VideoCapture(video)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if frames <= 0:
+            print(f"{video}: keine Frames, übersprungen")
+            continue
+        stride = max(1, round(fps / sample_fps)) if sample_fps > 0 else 1
+        length = max(stride, int(segment_seconds * fps) // stride * stride)  # Abschnitte auf dem Raster der Schrittweite
+        slot_path = slot_file_for(video, default_slots)
+        for start in range(0, frames, length):
+            tasks.append((video, slot_path, start, min(start + length, frames), fps, stride))
+    return tasks
+
+
+def _init_worker(args, threads):
+    cv2.setNumThreads(1)
+    class_list = load_class_list()
+    _worker["args"] = args
+    _worker["class_list"] = class_list
+    _worker["detector"] = load_detector(args.backend, args.model, class_list, args.classes, threads=threads)
+    _worker["engines"] = {}
+
+
+def _engine(slot_path):
+    engines = _worker["engines"]
+    if slot_path not in engines:
+        engine = SlotEngine(slot_path, _worker["class_list"], _worker["args"].classes)
+        roi = RoiDetector(engine.index) if _worker["args"].roi else None
+        engines[slot_path] = (engine, roi)
+    return engines[slot_path]
+
+
+# Einen Abschnitt auswerten; liefert (Video, erster Frame, Parkplatz-IDs, Zeiten, Zustände (T, N), Ende in s)
+def analyze_segment(task):
+    video, slot_path, start, end, fps, stride = task
+    args = _worker["args"]
+    detector = _worker["detector"]
+    engine, roi = _engine(slot_path)
+    gate = MotionGate(engine.index.raster, force_every=args.force_every) if args.motion_gate else None
+    hysteresis = SlotHysteresis(np.zeros(len(engine.parkings), bool), args.window, args.on_votes, args.off_votes)
+
+    # Etwas früher beginnen, damit die Entprellung am Abschnittsanfang schon eingeschwungen ist
+    begin = max(0, start - args.window * stride)
+    cap = cv2.VideoCapture(video)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, begin)
+    times, states = [], []
+    detections = None
+    primed = False
+    for index in range(begin, end):
+        if index % stride:
+            if not cap.grab():  # Übersprungene Frames nicht in ein Bild umwandeln
+                break
+            continue
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame = cv2.resize(frame, FRAME_SIZE)
+        if gate is None or gate.should_run(frame) or detections is None:
+            detections = roi.predict(detector, frame) if roi is not None else detector.detect(frame)
+        occupied = engine.occupancy(engine.assign(detections))
+        if primed:
+            hysteresis.update(occupied, index / fps)
+        else:
+            hysteresis.reset(occupied, index / fps)
+            primed = True
+        if index >= start:
+            times.append(index / fps)
+            states.append(hysteresis.state.copy())
+    cap.release()
+
+    matrix = np.array(states, bool).reshape(len(states), len(engine.parkings))
+    return video, start, list(engine.ids), np.array(times), matrix, end / fps
+
+
+# Zustandsmatrix eines Abschnitts in Intervalle (Parkplatz-ID, Beginn, Ende, belegt) umwandeln
+def segment_intervals(ids, times, matrix, end_time):
+    if len(times) == 0:
+        return []
+    intervals = []
+    for column, slot_id in enumerate(ids):
+        values = matrix[:, column]
+        starts = np.concatenate(([0], np.flatnonzero(values[1:] != values[:-1]) + 1))
+        ends = np.append(times[starts[1:]], end_time)
+        for first, finish in zip(starts.tolist(), ends.tolist()):
+            intervals.append((slot_id, float(times[first]), finish, bool(values[first])))
+    return intervals
+
+
+# Intervalle aller Abschnitte pro Video und Parkplatz zu einer Zeitleiste zusammenführen
+def merge_timeline(results):
+    rows = []
+    by_slot = {}
+    for video, _, intervals in sorted(results, key=lambda result: (result[0], result[1])):
+        for slot_id, start, end, occupied in intervals:
+            by_slot.setdefault((video, slot_id), []).append([start, end, occupied])
+    for (video, slot_id), intervals in by_slot.items():
+        merged = [intervals[0]]
+        for start, end, occupied in intervals[1:]:
+            last = merged[-1]
+            if occupied == last[2] and start <= last[1] + 1e-6:
+                last[1] = max(last[1], end)  # Gleicher Zustand über die Abschnittsgrenze hinweg
+            else:
+                merged.append([start, end, occupied])
+        for start, end, occupied in merged:
+            rows.append((video, slot_id, round(start, 3), round(end, 3), round(end - start, 3), int(occupied)))
+    rows.sort(key=lambda row: (row[0], str(row[1]), row[2]))
+    return rows
+
+
+def write_timeline(rows, path):
+    if path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = {name: [row[i] for row in rows] for i, name in enumerate(COLUMNS)}
+        columns["slot_id"] = [str(value) for value in columns["slot_id"]]
+        pq.write_table(pa.table(columns), path)
+        return
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Archivierte Videos parallel und ohne Anzeige auswerten")
+    parser.add_argument("--videos", nargs="+", required=True, help="Videodateien, Verzeichnisse oder Muster")
+    parser.add_argument("--slots", default="all_parkings.json", help="Parkplatz-Datei (falls kein <video>.json existiert)")
+    parser.add_argument("--output", default="timeline.csv", help="Ergebnis als .csv oder .parquet")
+    parser.add_argument("--segment", type=float, default=300.0, help="Länge eines Abschnitts in Sekunden")
+    parser.add_argument("--fps", type=float, default=1.0, help="ausgewertete Frames pro Sekunde Video (0 = alle)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Anzahl Prozesse")
+    parser.add_argument("--model", default="yolov8s.pt", help="YOLO-Modell (.pt, .onnx oder OpenVINO-Ordner)")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto", help="Inferenz-Backend")
+    parser.add_argument("--classes", nargs="+", default=["car"], help="ausgewertete Klassen aus coco.txt")
+    parser.add_argument("--no-roi", dest="roi", action="store_false", help="ganzes Bild statt Ausschnitten erkennen")
+    parser.add_argument("--no-motion-gate", dest="motion_gate", action="store_false", help="Bewegungsfilter aus")
+    parser.add_argument("--force-every", type=int, default=30, help="spätestens nach so vielen Frames neu erkennen")
+    parser.add_argument("--window", type=int, default=5, help="Entprellung: Anzahl betrachteter Frames pro Parkplatz")
+    parser.add_argument("--on-votes", type=int, default=3, help="Entprellung: belegte Frames bis 'belegt'")
+    parser.add_argument("--off-votes", type=int, default=1, help="Entprellung: höchstens so viele belegte Frames bis 'frei'")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    videos = find_videos(args.videos)
+    tasks = plan_segments(videos, args.slots, args.segment, args.fps)
+    print(f"{len(videos)} Videos, {len(tasks)} Abschnitte, {args.workers} Prozesse")
+
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(args, threads)) as pool:
+        futures = [pool.submit(analyze_segment, task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            video, first, ids, times, matrix, end_time = future.result()
+            results.append((video, first, segment_intervals(ids, times, matrix, end_time)))
+            offset = times[0] if len(times) else 0.0
+            print(f"[{done}/{len(tasks)}] {os.path.basename(video)} ab {offset:.0f} s: {len(times)} Frames ausgewertet")
+
+    rows = merge_timeline(results)
+    write_timeline(rows, args.output)
+    print(f"{len(rows)} Intervalle in {args.output} geschrieben ({time.perf_counter() - start:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+import argparse
+import collections
+import importlib.util
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from config import load_config
+from delta_publisher import DeltaPublisher
+from heatmap import generate_heatmap
+from local_broker import LocalBroker
+from metrics import Metrics
+from monitor import FRAME_SIZE, ParkingMonitor, load_class_list, open_slots
+from mqtt_publisher import MqttPublisher
+from pipeline import STOP
+
+# Messungen ohne Kamera, Modell und externen Broker: ein Detektor mit vorbereiteten Boxen ersetzt
+# YOLO, Parkplatz-Layouts mit 10 bis 10.000 Plätzen werden erzeugt. Gemessen werden die Stufen
+# von ParkingMonitor aus basic.py (nacheinander, ohne Pipeline-Threads, mit Bewegungsfilter und
+# ROI wie im Betrieb), der Versand über MqttPublisher an einen LocalBroker, generate_heatmap und
+# der DeltaPublisher. Die Ergebnisse landen als JSON-Datei und lassen sich mit --compare vergleichen.
+#
+#   python benchmark.py --slots 10 100 1000 10000 --output benchmark.json
+#   python benchmark.py --slots 10 100 1000 10000 --output neu.json --compare benchmark.json
+
+CAR_CLASS = 2  # Index von "car" in coco.txt
+LOOP_STAGES = ("decode", "resize", "inference", "assign", "persist", "publish", "render")
+
+
+# Layout im Format von all_parkings.json: Raster aus leicht schrägen Vierecken über das ganze Bild
+def synthetic_layout(slots, width=FRAME_SIZE[0], height=FRAME_SIZE[1]):
+    columns = int(np.ceil(np.sqrt(slots * width / height)))
+    rows = int(np.ceil(slots / columns))
+    cell_w, cell_h = width / columns, height / rows
+    parkings = []
+    for number in range(slots):
+        row, column = divmod(number, columns)
+        x1, y1 = column * cell_w + cell_w * 0.1, row * cell_h + cell_h * 0.1
+        x2, y2 = (column + 1) * cell_w - cell_w * 0.1, (row + 1) * cell_h - cell_h * 0.1
+        skew = cell_w * 0.1
+        coordinates = [[x1 + skew, y1], [x2, y1], [x2 - skew, y2], [x1, y2]]
+        parkings.append({
+            "id": f"P{number}",
+            "coordinates": [[int(round(x)), int(round(y))] for x, y in coordinates],
+            "car": False,
+            "license_plate": "",
+        })
+    return {
+        "global_coordinates": {"ul": [0, height], "ur": [width, height], "ol": [0, 0], "or": [width, 0]},
+        "parkings": parkings,
+    }
+
+
+# Kurzes Video (MJPG) mit Rauschen, damit Dekodieren und Skalieren echte Arbeit sind
+def synthetic_video(path, frames, size=(1280, 720), fps=25):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (size[1], size[0], 3), np.uint8)
+    for index in range(frames):
+        writer.write(np.roll(base, index * 4, axis=1))
+    writer.release()
+    return path
+
+
+class CannedDetector:
+    """Ersatz für detector.Detector: liefert vorbereitete Boxen in den Parkplätzen.
+
+    Anfangs stehen cars Fahrzeuge auf zufälligen Parkplätzen; alle churn_every Aufrufe
+    parken churn davon um, damit Statuswechsel, Deltas und Journal tatsächlich anfallen.
+    Mit roi (RoiDetector) liefert predict() für jeden Ausschnitt nur die Boxen, die ganz
+    darin liegen, in dessen Koordinaten, wie YOLO auf dem Ausschnitt.
+    """
+
+    def __init__(self, bboxes, cars, churn=1, churn_every=10, seed=0):
+        bboxes = np.asarray(bboxes, np.float32)
+        inset = (bboxes[:, 2:] - bboxes[:, :2]) * 0.2
+        self.boxes = np.column_stack((bboxes[:, :2] + inset, bboxes[:, 2:] - inset))
+        self.rng = np.random.default_rng(seed)
+        self.occupied = self.rng.choice(len(bboxes), min(cars, len(bboxes)), replace=False)
+        self.churn = churn
+        self.churn_every = churn_every
+        self.roi = None
+        self.calls = 0
+
+    def detect(self, frame):
+        self.calls += 1
+        if self.churn and self.calls % self.churn_every == 0 and len(self.occupied):
+            free = np.setdiff1d(np.arange(len(self.boxes)), self.occupied)
+            count = min(self.churn, len(free), len(self.occupied))
+            leaving = self.rng.choice(len(self.occupied), count, replace=False)
+            self.occupied[leaving] = self.rng.choice(free, count, replace=False)
+        count = len(self.occupied)
+        return np.column_stack((
+            self.boxes[self.occupied], np.full(count, 0.9, np.float32), np.full(count, CAR_CLASS, np.float32),
+        )).astype(np.float32)
+
+    # RoiDetector ruft predict() pro imgsz mit den Ausschnitten in der Reihenfolge von roi.crops auf
+    def predict(self, frames, imgsz=None):
+        if self.roi is None:
+            return [self.detect(frame) for frame in frames]
+        detections = self.detect(None)
+        tiles = [tile for tile, size in self.roi.crops if size == imgsz]
+        results = []
+        for (x1, y1, x2, y2), _ in zip(tiles, frames):
+            inside = ((detections[:, 0] >= x1) & (detections[:, 1] >= y1)
+                      & (detections[:, 2] <= x2) & (detections[:, 3] <= y2))
+            part = detections[inside]
+            part[:, [0, 2]] -= x1
+            part[:, [1, 3]] -= y1
+            results.append(part)
+        return results
+
+
+class SampleMetrics(Metrics):
+    """Metrics, das die Dauern aus stage_seconds zusätzlich einzeln aufhebt (für Perzentile)."""
+
+    def __init__(self):
+        super().__init__()
+        self.samples = collections.defaultdict(list)
+
+    def observe(self, name, value, **labels):
+        super().observe(name, value, **labels)
+        if name == "stage_seconds":
+            self.samples[labels["stage"]].append(value)
+
+
+# Kennzahlen einer Liste von Dauern in Sekunden (Angaben in Millisekunden)
+def timing_stats(samples):
+    samples = np.asarray(samples, np.float64) * 1000
+    if len(samples) == 0:
+        return {"count": 0}
+    return {
+        "count": int(len(samples)),
+        "mean_ms": round(float(samples.mean()), 4),
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p95_ms": round(float(np.percentile(samples, 95)), 4),
+        "p99_ms": round(float(np.percentile(samples, 99)), 4),
+        "max_ms": round(float(samples.max()), 4),
+        "total_ms": round(float(samples.sum()), 3),
+    }
+
+
+# func einmal unter tracemalloc ausführen; liefert den Spitzenwert der Python-/NumPy-Allokationen in MB
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 3)
+    finally:
+        tracemalloc.stop()
+
+
+def paho_available():
+    return importlib.util.find_spec("paho") is not None
+
+
+# MqttPublisher an einen LocalBroker (ohne TLS und Spool); (None, None), wenn paho nicht installiert ist
+def local_publisher(metrics):
+    if not paho_available():
+        return None, None
+    broker = LocalBroker(port=0).start()
+    publisher = MqttPublisher(broker.host, broker.port, "benchmark", tls=False, metrics=metrics).connect()
+    return broker, publisher
+
+
+# ParkingMonitor aus basic.py Frame für Frame: capture, inference, persist, Versand und render
+def bench_loop(video, layout_path, cars, frames, detect_every, tracking, render_frames, workdir,
+               motion_gate=True, roi=True):
+    argv = ["--video", video, "--slots", layout_path, "--headless", "--spool", "",
+            "--state", os.path.join(workdir, "state.json"), "--journal", os.path.join(workdir, "state.journal"),
+            "--history", os.path.join(workdir, "history"), "--detect-every", str(detect_every)]
+    argv += [] if tracking else ["--no-tracking"]
+    argv += [] if motion_gate else ["--no-motion-gate"]
+    argv += [] if roi else ["--no-roi"]
+    config = load_config("Benchmark", argv)
+    class_list = load_class_list()
+    engine, store, history = open_slots(config, class_list)
+    detector = CannedDetector(engine.index.bboxes, cars)
+    cap = cv2.VideoCapture(video)
+    metrics = SampleMetrics()
+    monitor = ParkingMonitor(config, class_list, detector, cap, engine, store, history, metrics=metrics)
+    if config.roi:
+        detector.roi = monitor.roi
+    broker, publisher = local_publisher(metrics)
+
+    messages = 0
+    payload_bytes = 0
+    start = time.perf_counter()
+    for index in range(frames):
+        frame = monitor.capture()
+        if frame is STOP:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Kurze Videos wiederholen
+            frame = monitor.capture()
+            if frame is STOP:
+                raise RuntimeError(f"Keine lesbaren Frames in {video}")
+        result = monitor.inference(frame)
+        while not monitor.publish_queue.empty():
+            payload, message = monitor.publish_queue.get_nowait()
+            monitor.persist(message)
+            if publisher is not None:
+                publisher.publish(payload)
+            messages += 1
+            payload_bytes += len(payload)
+        if render_frames:
+            with metrics.time("stage_seconds", stage="render"):
+                monitor.render(*result)
+    elapsed = time.perf_counter() - start
+    if publisher is not None:
+        publisher.close()
+        broker.stop()
+    store.close()
+    if history is not None:
+        history.close()
+    cap.release()
+
+    return {
+        "frames": frames,
+        "fps": round(frames / elapsed, 2),
+        "messages": messages,
+        "payload_bytes": payload_bytes,
+        "published": publisher is not None,
+        "detector_calls": detector.calls,
+        "motion_skipped": monitor.gate.skipped,
+        "stages": {stage: timing_stats(metrics.samples[stage]) for stage in LOOP_STAGES},
+    }
+
+
+def bench_heatmap(data, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        generate_heatmap(data)
+        samples.append(time.perf_counter() - start)
+    return {"repeats": repeats, "generate_heatmap": timing_stats(samples)}
+
+
+# DeltaPublisher mit churn Änderungen pro Nachricht plus ein Snapshot; Serialisierung inklusive
+def bench_publisher(data, repeats, churn):
+    parkings = [dict(p) for p in data["parkings"]]
+    delta = DeltaPublisher(data["global_coordinates"], snapshot_interval=float("inf"))
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    snapshot = json.dumps(delta.flush(parkings, now=0.0))
+    snapshot_time = time.perf_counter() - start
+
+    samples = []
+    sizes = []
+    for index in range(repeats):
+        changed = rng.choice(len(parkings), min(churn, len(parkings)), replace=False)
+        start = time.perf_counter()
+        for slot in changed.tolist():
+            parking = parkings[slot]
+            parking["car"] = not parking["car"]
+            delta.record(parking, now=float(index))
+        message = delta.flush(parkings, now=float(index))
+        payload = json.dumps(message) if message is not None else ""
+        samples.append(time.perf_counter() - start)
+        sizes.append(len(payload))
+    stats = timing_stats(samples)
+    return {
+        "repeats": repeats,
+        "changes_per_message": int(min(churn, len(parkings))),
+        "delta": stats,
+        "messages_per_s": round(1000 / stats["mean_ms"], 1) if stats["mean_ms"] else None,
+        "delta_bytes": int(np.mean(sizes)),
+        "snapshot_ms": round(snapshot_time * 1000, 4),
+        "snapshot_bytes": len(snapshot),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        video = args.video
+        if video is None or not os.path.exists(video):
+            video = synthetic_video(os.path.join(workdir, "synthetic.avi"), min(args.frames, 100))
+        for slots in args.slots:
+            cars = args.cars if args.cars is not None else slots // 2
+            data = synthetic_layout(slots)
+            layout_path = os.path.join(workdir, f"layout_{slots}.json")
+            with open(layout_path, "w") as layout_file:
+                json.dump(data, layout_file)
+            print(f"{slots} Parkplätze, {cars} Autos")
+
+            for name in args.benchmarks:
+                if name == "loop":
+                    # Jeder Lauf (auch die Speichermessung) beginnt ohne Zustand, Journal und Verlauf
+                    run_once = lambda: bench_loop(video, layout_path, cars, args.frames, args.detect_every,
+                                                  args.tracking, args.render, tempfile.mkdtemp(dir=workdir),
+                                                  args.motion_gate, args.roi)
+                elif name == "heatmap":
+                    run_once = lambda: bench_heatmap(data, args.repeats)
+                else:
+                    run_once = lambda: bench_publisher(data, args.repeats, max(1, cars // 20))
+                result = run_once()
+                if args.memory:
+                    result["peak_mb"] = peak_memory(run_once)
+                result.update(benchmark=name, slots=slots, cars=cars)
+                results.append(result)
+                print(f"  {name}: {summary_line(result)}")
+    return results
+
+
+# Kurzfassung eines Ergebnisses für die Konsole
+def summary_line(result):
+    if result["benchmark"] == "loop":
+        stages = ", ".join(f"{stage} {stats['mean_ms']:.2f}" for stage, stats in result["stages"].items()
+                           if stats["count"])
+        return f"{result['fps']} FPS ({stages} ms)"
+    if result["benchmark"] == "heatmap":
+        return f"{result['generate_heatmap']['mean_ms']:.2f} ms"
+    return f"{result['delta']['mean_ms']:.3f} ms/Delta, Snapshot {result['snapshot_ms']:.2f} ms"
+
+
+# Vergleichbare Kennzahl (kleiner ist besser) pro Benchmark, Layout und Stufe
+def metrics(results):
+    values = {}
+    for result in results:
+        key = f"{result['benchmark']}/{result['slots']}"
+        if result["benchmark"] == "loop":
+            for stage, stats in result["stages"].items():
+                values[f"{key}/{stage}"] = stats.get("mean_ms")
+        elif result["benchmark"] == "heatmap":
+            values[f"{key}/generate_heatmap"] = result["generate_heatmap"]["mean_ms"]
+        else:
+            values[f"{key}/delta"] = result["delta"]["mean_ms"]
+            values[f"{key}/snapshot"] = result["snapshot_ms"]
+        if "peak_mb" in result:
+            values[f"{key}/peak_mb"] = result["peak_mb"]
+    return values
+
+
+# Abweichungen gegenüber einem früheren Lauf ausgeben; liefert die Anzahl der Verschlechterungen
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, "r") as baseline_file:
+        baseline = metrics(json.load(baseline_file)["results"])
+    regressions = 0
+    for key, value in metrics(results).items():
+        old = baseline.get(key)
+        if not old or value is None:
+            continue
+        ratio = value / old
+        if ratio > 1 + threshold:
+            regressions += 1
+            print(f"LANGSAMER  {key}: {old:.3f} -> {value:.3f} ({ratio:.2f}x)")
+        elif ratio < 1 - threshold:
+            print(f"schneller  {key}: {old:.3f} -> {value:.3f} ({ratio:.2f}x)")
+    print(f"{regressions} Verschlechterungen über {threshold:.0%}")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark der Parkplatz-Erkennung mit synthetischen Daten")
+    parser.add_argument("--slots", type=int, nargs="+", default=[10, 100, 1000, 10000], help="Anzahl Parkplätze")
+    parser.add_argument("--cars", type=int, default=None, help="Anzahl Autos (Standard: halb so viele wie Parkplätze)")
+    parser.add_argument("--benchmarks", nargs="+", choices=("loop", "heatmap", "publisher"),
+                        default=["loop", "heatmap", "publisher"])
+    parser.add_argument("--video", default="parking1.mp4", help="Aufnahme für die Schleife (sonst synthetisch)")
+    parser.add_argument("--frames", type=int, default=300, help="Frames pro Schleifen-Messung")
+    parser.add_argument("--repeats", type=int, default=20, help="Wiederholungen für Heatmap und Publisher")
+    parser.add_argument("--detect-every", type=int, default=5, help="Detektor nur jedes n-te Frame (wie DETECT_EVERY)")
+    parser.add_argument("--no-tracking", dest="tracking", action="store_false", help="ohne Tracker messen")
+    parser.add_argument("--no-motion-gate", dest="motion_gate", action="store_false", help="ohne Bewegungsfilter messen")
+    parser.add_argument("--no-roi", dest="roi", action="store_false", help="ganzes Bild erkennen")
+    parser.add_argument("--no-render", dest="render", action="store_false", help="ohne Zeichnen messen")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Spitzenspeicher nicht messen")
+    parser.add_argument("--output", default="benchmark.json", help="Ergebnisdatei (JSON)")
+    parser.add_argument("--compare", help="früheres Ergebnis zum Vergleich")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Toleranz beim Vergleich (0.1 = 10 %%)")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    if "loop" in args.benchmarks and not paho_available():
+        print("paho-mqtt nicht installiert: die Stufe publish wird nicht gemessen.")
+    results = run(args)
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+        "commit": git_commit(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "cpu_count": os.cpu_count(),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "args": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Ergebnisse gespeichert: {args.output}")
+    if args.compare:
+        raise SystemExit(1 if compare(results, args.compare, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
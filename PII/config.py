@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+
+from detector import BACKENDS
+
+# Einstellungen für basic.py und azure_basic.py. Standardwerte stehen hier, eine JSON-Datei
+# (--config) überschreibt sie, Kommandozeilen-Optionen überschreiben beides. Schlüssel in der
+# Datei heißen wie die Optionen (mit "-" oder "_"), z. B.
+#   {"video": "rtsp://kamera1/stream", "slots": "lot1.json", "model": "yolov8s_openvino_model"}
+
+# MQTT-Setup
+CONNECTION_STRING = "HostName=ProjektLabor.azure-devices.net;DeviceId=OnlineSimulator;SharedAccessKey=Lfp1qcai6gyHk1XTGMC3HO2O0lmB7kUy4eajDG+/Ajw="
+MQTT_HOST = "ProjektLabor.azure-devices.net"
+MQTT_PORT = 8883
+MQTT_TOPIC_PUBLISH = "devices/OnlineSimulator/messages/events/"
+
+
+# Broker und Spool (auch für multi_camera.py und supervisor.py, siehe mqtt_publisher.connect_broker)
+def add_broker_arguments(parser):
+    # Broker (MQTT für basic.py, IoT Hub über den Connection String für azure_basic.py)
+    parser.add_argument("--broker-host", default=MQTT_HOST, help="MQTT-Broker")
+    parser.add_argument("--broker-port", type=int, default=MQTT_PORT, help="Port des MQTT-Brokers")
+    parser.add_argument("--no-tls", dest="tls", action="store_false", help="MQTT ohne TLS (lokaler Broker)")
+    parser.add_argument("--topic", default=MQTT_TOPIC_PUBLISH, help="MQTT-Topic für Nachrichten")
+    parser.add_argument("--connection-string", default=CONNECTION_STRING, help="IoT-Hub-Connection-String")
+
+    # Spool für Ausfälle des Brokers (siehe spool.py, leerer Pfad = aus)
+    parser.add_argument("--spool", default="spool", help="Verzeichnis für noch nicht gesendete Nachrichten")
+    parser.add_argument("--spool-capacity", type=int, default=100_000, help="höchstens so viele Nachrichten")
+    parser.add_argument("--spool-size", type=int, default=64, help="Größe der Segmentdatei in MB")
+    parser.add_argument("--spool-batch", type=int, default=100, help="Nachrichten pro Batch beim Nachsenden")
+    parser.add_argument("--spool-rate", type=float, default=200.0, help="Nachrichten pro Sekunde beim Nachsenden")
+
+
+def build_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--config", help="JSON-Datei mit Einstellungen")
+
+    # Quelle und Parkplätze
+    parser.add_argument("--video", default="parking1.mp4", help="Videodatei, Stream-URL oder Kamera-Index")
+    parser.add_argument("--slots", default="all_parkings.json", help="Parkplatz-Datei aus SetParkingSlots.py")
+
+    # Inferenz-Backend: "auto" wählt anhand der Modelldatei (.pt, .onnx, OpenVINO-Ordner/.xml)
+    parser.add_argument("--model", default="yolov8s.pt", help="YOLO-Modell (Export siehe detector.py)")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto", help="Inferenz-Backend")
+    parser.add_argument("--classes", nargs="+", default=["car"], help="ausgewertete Klassen aus coco.txt")
+
+    add_broker_arguments(parser)
+
+    # Laufzeit-Belegung, Journal und Verlauf (leerer Pfad = kein Verlauf)
+    parser.add_argument("--state", default="occupancy_state.json", help="Snapshot der Belegung")
+    parser.add_argument("--journal", default="occupancy.journal", help="Journal der Belegung")
+    parser.add_argument("--history", default="history", help="Verzeichnis für den Verlauf (siehe history.py)")
+
+    # Betrieb ohne Fenster: Steuerung über Signale, optional ein Vorschaubild (0 = aus)
+    parser.add_argument("--headless", action="store_true", default=os.environ.get("HEADLESS") == "1",
+                        help="ohne Fenster laufen (auch HEADLESS=1)")
+    parser.add_argument("--preview-interval", type=float, default=0.0, help="Sekunden zwischen Vorschaubildern")
+    parser.add_argument("--preview-path", default="preview.jpg", help="Datei für das Vorschaubild")
+
+    # Pipeline: Größe der Warteschlangen; ohne --no-drop werden bei Überlast alte Frames verworfen
+    parser.add_argument("--queue-size", type=int, default=2, help="Frames zwischen den Stufen")
+    parser.add_argument("--no-drop", action="store_true", help="auf die Inferenz warten (Videodateien)")
+    parser.add_argument("--publish-queue-size", type=int, default=64, help="Nachrichten vor der Publish-Stufe")
+
+    # Bewegungsfilter und Tracking: YOLO nur, wenn sich etwas bewegt, und nur jedes n-te Frame
+    parser.add_argument("--no-motion-gate", dest="motion_gate", action="store_false", help="Bewegungsfilter aus")
+    parser.add_argument("--force-every", type=int, default=30, help="spätestens nach so vielen Frames neu erkennen")
+    parser.add_argument("--no-tracking", dest="tracking", action="store_false", help="Tracker aus")
+    parser.add_argument("--detect-every", type=int, default=5, help="Detektor nur jedes n-te Frame (mit Tracking)")
+
+    # Nur Ausschnitte um die Parkplätze erkennen (Parkplatz im Ausschnitt mindestens roi-target-px groß)
+    parser.add_argument("--no-roi", dest="roi", action="store_false", help="ganzes Bild erkennen")
+    parser.add_argument("--roi-target-px", type=int, default=32, help="Mindestgröße eines Parkplatzes in Pixeln")
+
+    # Kennzeichenerkennung (siehe lpr.py)
+    parser.add_argument("--lpr", choices=("stub", "easyocr"), default=None, help="Kennzeichen lesen")
+    parser.add_argument("--lpr-queue-size", type=int, default=4, help="Plätze in der Kennzeichen-Stufe")
+
+    # Entprellung pro Parkplatz (siehe hysteresis.py)
+    parser.add_argument("--window", type=int, default=5, help="Anzahl betrachteter Frames pro Parkplatz")
+    parser.add_argument("--on-votes", type=int, default=3, help="belegte Frames bis 'belegt'")
+    parser.add_argument("--off-votes", type=int, default=1, help="höchstens so viele belegte Frames bis 'frei'")
+    parser.add_argument("--hold", type=float, default=0.0, help="Sekunden ohne erneuten Wechsel")
+
+    # Veröffentlichung (siehe delta_publisher.py)
+    parser.add_argument("--snapshot-interval", type=float, default=300.0, help="Sekunden zwischen Snapshots")
+    parser.add_argument("--debounce", type=float, default=0.0, help="Änderungen so lange sammeln (s)")
+
+    # Betrieb: Metrik-Endpunkt (Prometheus) und Umfang der Ausgaben pro Ereignis
+    parser.add_argument("--metrics-port", type=int, default=9108, help="Port für /metrics (0 = aus)")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="Adresse für /metrics (Standard: nur lokal)")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="DEBUG zeigt jedes erkannte Auto und jede Nachricht")
+    return parser
+
+
+# Einstellungen aus Standardwerten, optionaler JSON-Datei und Kommandozeile
+def load_config(description, argv=None):
+    parser = build_parser(description)
+    known, _ = parser.parse_known_args(argv)
+    if known.config:
+        with open(known.config, "r") as config_file:
+            values = {key.replace("-", "_"): value for key, value in json.load(config_file).items()}
+        unknown = sorted(key for key in values if not hasattr(known, key))
+        if unknown:
+            parser.error(f"Unbekannte Einstellungen in {known.config}: {', '.join(unknown)}")
+        parser.set_defaults(**values)
+    config = parser.parse_args(argv)
+    if isinstance(config.video, str) and config.video.isdigit():
+        config.video = int(config.video)  # Kamera-Index wie cv2.VideoCapture(0)
+    return config
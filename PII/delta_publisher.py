@@ -0,0 +1,78 @@
+import time
+
+
+# Öffentlicher Zustand eines Parkplatzes (ohne Koordinaten)
+def slot_state(parking):
+    return {"id": parking["id"], "car": parking["car"], "license_plate": parking.get("license_plate", "")}
+
+
+class DeltaPublisher:
+    """Sammelt Statusänderungen und erzeugt daraus höchstens eine Nachricht pro Frame.
+
+    Nachrichten haben eine fortlaufende Sequenznummer "seq". Eine "delta"-Nachricht enthält
+    nur die geänderten Parkplätze, eine "snapshot"-Nachricht den kompletten Zustand im
+    bisherigen Format (global_coordinates + parkings). Snapshots werden beim Start und
+    danach alle snapshot_interval Sekunden gesendet, damit Empfänger nach einer Lücke in
+    den Sequenznummern wieder aufsetzen können. Mit debounce > 0 werden Änderungen so
+    lange gesammelt, bis seit der ersten ungesendeten Änderung debounce Sekunden vergangen sind.
+    """
+
+    def __init__(self, global_coordinates, snapshot_interval=300.0, debounce=0.0):
+        self.global_coordinates = global_coordinates
+        self.snapshot_interval = snapshot_interval
+        self.debounce = debounce
+        self.seq = 0
+        self._pending = {}
+        self._published = {}
+        self._first_change = None
+        self._last_snapshot = None
+
+    # Statusänderung eines Parkplatzes vormerken (spätere Änderungen überschreiben frühere)
+    def record(self, parking, now=None):
+        if not self._pending:
+            self._first_change = time.monotonic() if now is None else now
+        self._pending[parking["id"]] = slot_state(parking)
+
+    # Nächster flush() liefert einen Snapshot (z. B. nach geänderter Parkplatz-Geometrie)
+    def request_snapshot(self):
+        self._last_snapshot = None
+
+    def _next_seq(self):
+        self.seq += 1
+        return self.seq
+
+    def snapshot(self, parkings, now=None):
+        self._last_snapshot = time.monotonic() if now is None else now
+        self._pending.clear()
+        self._published = {p["id"]: slot_state(p) for p in parkings}
+        return {
+            "type": "snapshot",
+            "seq": self._next_seq(),
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+            "global_coordinates": self.global_coordinates,
+            "parkings": [dict(p) for p in parkings],
+        }
+
+    # Einmal pro Frame aufrufen; liefert die zu sendende Nachricht oder None
+    def flush(self, parkings, now=None, force=False):
+        now = time.monotonic() if now is None else now
+        if self._last_snapshot is None or now - self._last_snapshot >= self.snapshot_interval:
+            return self.snapshot(parkings, now)
+        if not self._pending:
+            return None
+        if not force and now - self._first_change < self.debounce:
+            return None
+
+        # Parkplätze, die innerhalb des Fensters hin und zurück gewechselt sind, weglassen
+        changes = [state for slot_id, state in self._pending.items() if self._published.get(slot_id) != state]
+        self._pending.clear()
+        if not changes:
+            return None
+        for state in changes:
+            self._published[state["id"]] = state
+        return {
+            "type": "delta",
+            "seq": self._next_seq(),
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+            "changes": changes,
+        }
@@ -0,0 +1,297 @@
+import argparse
+import glob
+import os
+import re
+
+import cv2
+import numpy as np
+
+from monitor import FRAME_SIZE  # Wie im Betrieb, damit die Kalibrierung dieselben Bilder sieht
+from slot_engine import to_numpy
+
+# Austauschbare Inferenz-Backends hinter einer Schnittstelle. Für CPU-Rechner ohne GPU ist
+# ein exportiertes ONNX- oder OpenVINO-Modell (optional INT8) deutlich schneller als PyTorch.
+#
+# Einmaliger Export mit Kalibrierung auf eigenen Aufnahmen:
+#   python detector.py --model yolov8s.pt --format openvino --int8 --video parking1.mp4 --slots all_parkings.json
+
+BACKENDS = ("auto", "ultralytics", "onnx", "openvino")
+
+
+# Klassen-IDs zu Namen aus coco.txt (z. B. ("car", "truck", "bus"))
+def class_ids_for(class_list, classes):
+    missing = [name for name in classes if name not in class_list]
+    if missing:
+        raise ValueError(f"Unbekannte Klassen: {', '.join(missing)}")
+    return np.array([class_list.index(name) for name in classes], np.int64)
+
+
+# Bild mit Rand auf size (Breite, Höhe) skalieren wie YOLO; liefert Tensor (1, 3, H, W), Faktor und Rand
+def letterbox(image, size):
+    width, height = size
+    scale = min(width / image.shape[1], height / image.shape[0])
+    new_w, new_h = round(image.shape[1] * scale), round(image.shape[0] * scale)
+    pad_x, pad_y = (width - new_w) // 2, (height - new_h) // 2
+    canvas = np.full((height, width, 3), 114, np.uint8)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    blob = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0  # BGR -> RGB, HWC -> CHW
+    return np.ascontiguousarray(blob), scale, (pad_x, pad_y)
+
+
+# Rohausgabe eines YOLOv8-Exports (1, 4 + Klassen, Anker) in ein Array (N, 6) wie boxes.data umwandeln
+def decode_yolo(output, class_ids, conf, iou, scale, pad, image_shape, max_det=300):
+    predictions = output[0].T
+    scores = predictions[:, 4:][:, class_ids]  # Nur die gewünschten Klassen betrachten
+    best = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), best]
+    keep = confidences >= conf
+    if not keep.any():
+        return np.zeros((0, 6), np.float32)
+
+    xywh = predictions[keep, :4]
+    confidences = confidences[keep]
+    classes = class_ids[best[keep]]
+    boxes = np.column_stack((xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, 2:]))
+
+    # NMS pro Klasse: Boxen verschiedener Klassen werden gegeneinander verschoben
+    shifted = boxes.copy()
+    shifted[:, :2] += classes[:, None] * 4096
+    kept = np.asarray(cv2.dnn.NMSBoxes(shifted.tolist(), confidences.tolist(), conf, iou), np.int64).reshape(-1)
+    kept = kept[:max_det]
+
+    # Rand und Skalierung rückgängig machen
+    xyxy = np.column_stack((boxes[kept, :2], boxes[kept, :2] + boxes[kept, 2:]))
+    xyxy[:, [0, 2]] = np.clip((xyxy[:, [0, 2]] - pad[0]) / scale, 0, image_shape[1])
+    xyxy[:, [1, 3]] = np.clip((xyxy[:, [1, 3]] - pad[1]) / scale, 0, image_shape[0])
+    return np.column_stack((xyxy, confidences[kept], classes[kept])).astype(np.float32)
+
+
+class Detector:
+    """Gemeinsame Schnittstelle der Backends.
+
+    predict() liefert pro Bild ein Array (N, 6) im Format von results[0].boxes.data
+    (x1, y1, x2, y2, conf, cls), bereits auf die Klassen in classes gefiltert.
+    """
+
+    def __init__(self, class_list, classes=("car",), conf=0.25, iou=0.7):
+        self.class_ids = class_ids_for(list(class_list), classes)
+        self.conf = conf
+        self.iou = iou
+
+    def predict(self, frames, imgsz=None):
+        raise NotImplementedError
+
+    def detect(self, frame, imgsz=None):
+        return self.predict([frame], imgsz)[0]
+
+    # Einmal mit einem leeren Bild rechnen, damit der erste echte Frame nicht langsamer ist
+    def warmup(self, shape=(FRAME_SIZE[1], FRAME_SIZE[0], 3)):
+        self.detect(np.zeros(shape, np.uint8))
+
+
+class UltralyticsDetector(Detector):
+    """PyTorch über ultralytics (bisheriges Verhalten, unterstützt Batches und beliebige imgsz)."""
+
+    def __init__(self, weights, class_list, classes=("car",), conf=0.25, iou=0.7, threads=0):
+        super().__init__(class_list, classes, conf, iou)
+        from ultralytics import YOLO
+
+        if threads:
+            import torch
+
+            torch.set_num_threads(threads)
+        self.model = YOLO(weights)
+
+    def predict(self, frames, imgsz=None):
+        kwargs = {"imgsz": imgsz} if imgsz else {}
+        results = self.model.predict(list(frames), conf=self.conf, iou=self.iou, classes=self.class_ids.tolist(),
+                                     verbose=False, **kwargs)
+        return [to_numpy(result.boxes.data)[:, :6] for result in results]
+
+
+class _ExportedDetector(Detector):
+    """Vor- und Nachverarbeitung für exportierte Modelle; input_size ist None bei dynamischer Eingabe."""
+
+    input_size = None
+
+    def predict(self, frames, imgsz=None):
+        size = self.input_size or (imgsz or 640,) * 2
+        detections = []
+        for frame in frames:
+            blob, scale, pad = letterbox(frame, size)
+            output = self._infer(blob)
+            detections.append(decode_yolo(output, self.class_ids, self.conf, self.iou, scale, pad, frame.shape))
+        return detections
+
+    def _infer(self, blob):
+        raise NotImplementedError
+
+
+class OnnxDetector(_ExportedDetector):
+    """ONNX Runtime auf der CPU (auch für INT8-Modelle aus export_model)."""
+
+    def __init__(self, path, class_list, classes=("car",), conf=0.25, iou=0.7, threads=0):
+        super().__init__(class_list, classes, conf, iou)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        height, width = model_input.shape[2:4]
+        if isinstance(height, int) and isinstance(width, int):
+            self.input_size = (width, height)
+
+    def _infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoDetector(_ExportedDetector):
+    """OpenVINO auf der CPU; path ist die .xml-Datei oder der Export-Ordner."""
+
+    def __init__(self, path, class_list, classes=("car",), conf=0.25, iou=0.7, threads=0):
+        super().__init__(class_list, classes, conf, iou)
+        import openvino as ov
+
+        core = ov.Core()
+        model = core.read_model(_openvino_xml(path))
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.output = self.compiled.output(0)
+        shape = model.input(0).get_partial_shape()
+        if shape.is_static:
+            self.input_size = (shape[3].get_length(), shape[2].get_length())
+
+    def _infer(self, blob):
+        return self.compiled([blob])[self.output]
+
+
+def _openvino_xml(path):
+    if os.path.isdir(path):
+        return glob.glob(os.path.join(path, "*.xml"))[0]
+    return path
+
+
+# Backend anhand des Namens oder (bei "auto") der Dateiendung wählen
+def load_detector(backend, path, class_list, classes=("car",), **kwargs):
+    if backend == "auto":
+        if path.endswith(".onnx"):
+            backend = "onnx"
+        elif path.endswith(".xml") or os.path.isdir(path):
+            backend = "openvino"
+        else:
+            backend = "ultralytics"
+    if backend == "onnx":
+        return OnnxDetector(path, class_list, classes, **kwargs)
+    if backend == "openvino":
+        return OpenVinoDetector(path, class_list, classes, **kwargs)
+    if backend == "ultralytics":
+        return UltralyticsDetector(path, class_list, classes, **kwargs)
+    raise ValueError(f"Unbekanntes Backend: {backend}")
+
+
+# Gleichmäßig verteilte Frames aus den Aufnahmen als Kalibrierdaten; mit slot_path nur die
+# Ausschnitte, die RoiDetector zur Laufzeit an das Modell gibt
+def calibration_images(videos, count, slot_path=None):
+    crops = None
+    if slot_path:
+        from roi import RoiDetector
+        from slot_engine import SlotEngine
+
+        crops = [tile for tile, _ in RoiDetector(SlotEngine(slot_path).index).crops]
+
+    images = []
+    per_video = max(1, count // len(videos))
+    for video in videos:
+        cap = cv2.VideoCapture(video)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        for position in np.linspace(0, max(total - 1, 0), per_video).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(position))
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            frame = cv2.resize(frame, FRAME_SIZE)
+            if crops:
+                images.extend(frame[y1:y2 + 1, x1:x2 + 1] for x1, y1, x2, y2 in crops)
+            else:
+                images.append(frame)
+        cap.release()
+    return images
+
+
+# Statische INT8-Quantisierung mit ONNX Runtime; der Detect-Kopf bleibt in float
+def quantize_onnx(path, blobs):
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    graph = onnx.load(path).graph
+    input_name = graph.input[0].name
+    layers = [int(m.group(1)) for m in (re.match(r"/model\.(\d+)/", node.name) for node in graph.node) if m]
+    head = f"/model.{max(layers)}/" if layers else None
+    exclude = [node.name for node in graph.node if head and node.name.startswith(head)]
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._blobs = iter(blobs)
+
+        def get_next(self):
+            blob = next(self._blobs, None)
+            return None if blob is None else {input_name: blob}
+
+    output = path[:-len(".onnx")] + "_int8.onnx"
+    quantize_static(path, output, Reader(), quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, nodes_to_exclude=exclude)
+    return output
+
+
+# INT8-Quantisierung mit NNCF; Nachverarbeitung des Detect-Kopfs bleibt in float
+def quantize_openvino(path, blobs):
+    import nncf
+    import openvino as ov
+
+    xml = _openvino_xml(path)
+    model = ov.Core().read_model(xml)
+    quantized = nncf.quantize(model, nncf.Dataset(blobs), preset=nncf.QuantizationPreset.MIXED,
+                              subset_size=len(blobs),
+                              ignored_scope=nncf.IgnoredScope(types=["Multiply", "Subtract", "Sigmoid"]))
+    output_dir = os.path.dirname(os.path.abspath(xml)).rstrip(os.sep) + "_int8"
+    os.makedirs(output_dir, exist_ok=True)
+    output = os.path.join(output_dir, os.path.basename(xml))
+    ov.save_model(quantized, output)
+    return output
+
+
+# Modell exportieren und optional mit Frames der eigenen Aufnahmen auf INT8 kalibrieren
+def export_model(weights, fmt, imgsz=640, int8=False, videos=(), frames=300, slot_path=None):
+    from ultralytics import YOLO
+
+    path = str(YOLO(weights).export(format=fmt, imgsz=imgsz))
+    print(f"Exportiert: {path}")
+    if not int8:
+        return path
+    if not videos:
+        raise ValueError("Für --int8 wird mindestens ein --video zur Kalibrierung benötigt")
+
+    images = calibration_images(videos, frames, slot_path)
+    blobs = [letterbox(image, (imgsz, imgsz))[0] for image in images]
+    print(f"Kalibriere mit {len(blobs)} Bildern ...")
+    output = quantize_onnx(path, blobs) if fmt == "onnx" else quantize_openvino(path, blobs)
+    print(f"INT8-Modell: {output}")
+    return output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="YOLO-Modell für die CPU exportieren (ONNX/OpenVINO, optional INT8)")
+    parser.add_argument("--model", default="yolov8s.pt", help="PyTorch-Gewichte")
+    parser.add_argument("--format", choices=("onnx", "openvino"), default="openvino", help="Zielformat")
+    parser.add_argument("--imgsz", type=int, default=640, help="feste Eingabegröße des exportierten Modells")
+    parser.add_argument("--int8", action="store_true", help="auf INT8 quantisieren")
+    parser.add_argument("--video", action="append", default=[], help="Aufnahme für die Kalibrierung (mehrfach möglich)")
+    parser.add_argument("--frames", type=int, default=300, help="Anzahl Kalibrier-Frames")
+    parser.add_argument("--slots", help="Parkplatz-Datei: nur die ROI-Ausschnitte zur Kalibrierung verwenden")
+    args = parser.parse_args()
+
+    export_model(args.model, args.format, args.imgsz, args.int8, args.video, args.frames, args.slots)
@@ -0,0 +1,75 @@
+import os
+import signal
+import threading
+import time
+
+import cv2
+
+
+class SignalControl:
+    """Steuerung ohne Fenster und Tastatur über Signale.
+
+    SIGINT/SIGTERM beenden, SIGUSR1 schaltet Pause um, SIGUSR2 fordert einen Screenshot
+    an (SIGUSR1/2 gibt es unter Windows nicht, dort nur Beenden).
+    """
+
+    def __init__(self, paused):
+        self.paused = paused
+        self.stop_event = threading.Event()
+        self._screenshot = threading.Event()
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, self._on_pause)
+            signal.signal(signal.SIGUSR2, self._on_screenshot)
+
+    def _on_stop(self, signum, frame):
+        print(f"Signal {signum} empfangen, beende ...")
+        self.stop_event.set()
+
+    def _on_pause(self, signum, frame):
+        if self.paused.is_set():
+            self.paused.clear()
+            print("Weiter.")
+        else:
+            self.paused.set()
+            print("Pausiert.")
+
+    def _on_screenshot(self, signum, frame):
+        self._screenshot.set()
+
+    def stop_requested(self):
+        return self.stop_event.is_set()
+
+    # True, wenn seit dem letzten Aufruf ein Screenshot angefordert wurde
+    def screenshot_requested(self):
+        if self._screenshot.is_set():
+            self._screenshot.clear()
+            return True
+        return False
+
+
+class PreviewWriter:
+    """Schreibt höchstens alle interval Sekunden ein JPEG als Vorschau (0 = aus).
+
+    Die Datei wird atomar ersetzt, damit ein Betrachter nie ein halbes Bild liest.
+    """
+
+    def __init__(self, interval=0.0, path="preview.jpg", quality=70):
+        self.interval = interval
+        self.path = path
+        self.quality = quality
+        self._next = 0.0
+
+    def due(self):
+        return self.interval > 0 and time.monotonic() >= self._next
+
+    def write(self, frame):
+        self._next = time.monotonic() + self.interval
+        ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as preview_file:
+            preview_file.write(data.tobytes())
+        os.replace(tmp_path, self.path)
@@ -1,5 +1,7 @@
+import json
 import numpy as np
 import matplotlib.pyplot as plt
+from slot_geometry import NO_SLOT, SlotIndex
 
 # Define constants for the heatmap states
 BLACK = -1  # No parking ID (not defined field)
@@ -24,55 +26,93 @@ def point_in_polygon(x, y, polygon):
         p1x, p1y = p2x, p2y
     return inside
 
-# Prepare the heatmap grid
-def generate_heatmap(data):
-    frame_width = data["global_coordinates"]["ur"][0]
-    frame_height = data["global_coordinates"]["ul"][1]
+# Heatmap state of a single parking spot
+def slot_value(park):
+    if park["car"]:
+        return GREEN_LP if park["license_plate"] else RED_1
+    return WHITE
 
-    heatmap = np.full((frame_height, frame_width), BLACK)
+# Spatial index over all parking spots; its label raster is used both for painting and for click lookups
+def build_index(data):
+    return SlotIndex(
+        [park["coordinates"] for park in data["parkings"]],
+        data["global_coordinates"]["ur"][0],
+        data["global_coordinates"]["ul"][1],
+    )
 
-    # Iterate over all grid cells and assign values based on parking data
-    for park in data["parkings"]:
-        polygon = park["coordinates"]
-        car = park["car"]
-        license_plate = park["license_plate"]
-        min_x = min(p[0] for p in polygon)
-        max_x = max(p[0] for p in polygon)
-        min_y = min(p[1] for p in polygon)
-        max_y = max(p[1] for p in polygon)
+# Paint a grid from the index's label raster: every pixel gets the value of the slot it belongs to,
+# pixels outside of all slots (NO_SLOT = -1) get the last entry of the lookup table
+def paint(index, values, outside, dtype):
+    lookup = np.append(np.asarray(values, dtype), np.array(outside, dtype))
+    return lookup[index.raster]
 
-        for x in range(min_x, max_x + 1):
-            for y in range(min_y, max_y + 1):
-                if point_in_polygon(x, y, polygon):
-                    if car:
-                        heatmap[y, x] = GREEN_LP if license_plate else RED_1
-                    else:
-                        heatmap[y, x] = WHITE
+# Prepare the heatmap grid (states range from -1 to 2, so one byte per pixel is enough)
+def generate_heatmap(data, index=None):
+    index = build_index(data) if index is None else index
+    return paint(index, [slot_value(park) for park in data["parkings"]], BLACK, np.int8)
 
-    return heatmap
+# Pixels of one slot in the label raster: (row, column) slices of its bounding box and the mask inside
+def slot_region(index, slot):
+    x1, y1, x2, y2 = index.bboxes[slot].tolist()
+    x1, y1 = max(x1, 0), max(y1, 0)
+    window = (slice(y1, y2 + 1), slice(x1, x2 + 1))
+    return window, index.raster[window] == slot
 
 # Function to handle clicks on the heatmap
-def on_click(event, data):
-    x, y = int(event.xdata), int(event.ydata)
-    for park in data["parkings"]:
-        polygon = park["coordinates"]
-        if point_in_polygon(x, y, polygon):
-            parking_id = park["id"]
-            license_plate = park["license_plate"]
-            print(f"Clicked on Parking ID: {parking_id}")
-            if license_plate:
-                print(f"License Plate: {license_plate}")
-            else:
-                print("No License Plate")
-            return
-    print("Clicked on an undefined area")
+def on_click(event, data, index):
+    if event.xdata is None or event.ydata is None:
+        return  # Click outside the axes
+    slot = index.query_point(event.xdata, event.ydata)
+    if slot == NO_SLOT:
+        print("Clicked on an undefined area")
+        return
+    park = data["parkings"][slot]
+    print(f"Clicked on Parking ID: {park['id']}")
+    if park["license_plate"]:
+        print(f"License Plate: {park['license_plate']}")
+    else:
+        print("No License Plate")
 
-# Plotting the heatmap
-def plot_heatmap(data, heatmap):
-    fig, ax = plt.subplots(figsize=(10, 10))
+# Colormap and norm shared by the static and the live heatmap
+def heatmap_colormap():
     cmap = plt.cm.colors.ListedColormap(['black', 'white', 'red', 'green'])
     bounds = [-1.5, -0.5, 0.5, 1.5, 2.5]
     norm = plt.cm.colors.BoundaryNorm(bounds, cmap.N)
+    return cmap, norm
+
+# Continuous variant for historical values (e.g. utilization 0..1): free-white to occupied-red,
+# undefined pixels (NaN) stay black like in the state colormap
+def value_colormap():
+    cmap = plt.cm.colors.LinearSegmentedColormap.from_list("occupancy", ['white', 'red'])
+    cmap.set_bad('black')
+    return cmap
+
+# Grid with one value per parking spot (NaN outside of all spots); values are in data["parkings"] order
+def value_heatmap(data, values, index=None):
+    index = build_index(data) if index is None else index
+    return paint(index, values, np.nan, np.float32)
+
+# Plot a value grid with the parking IDs and a formatted value at each spot's centroid
+def plot_value_heatmap(data, heatmap, values, title, label, fmt="{:.0%}", vmax=None):
+    fig, ax = plt.subplots(figsize=(10, 10))
+    image = ax.imshow(np.ma.masked_invalid(heatmap), cmap=value_colormap(), vmin=0, vmax=vmax, origin="upper")
+    for park, value in zip(data["parkings"], values):
+        polygon = np.array(park["coordinates"])
+        text = f"{park['id']}\n{fmt.format(value)}" if np.isfinite(value) else str(park["id"])
+        ax.text(np.mean(polygon[:, 0]), np.mean(polygon[:, 1]), text, color="black", fontsize=8, ha="center", va="center")
+
+    index = build_index(data)
+    fig.canvas.mpl_connect('button_press_event', lambda event: on_click(event, data, index))
+    ax.set_title(title)
+    ax.set_xlabel("X-axis")
+    ax.set_ylabel("Y-axis")
+    fig.colorbar(image, ax=ax, label=label)
+    return fig
+
+# Plotting the heatmap
+def plot_heatmap(data, heatmap):
+    fig, ax = plt.subplots(figsize=(10, 10))
+    cmap, norm = heatmap_colormap()
 
     ax.imshow(heatmap, cmap=cmap, norm=norm, origin="upper")
 
@@ -89,13 +129,81 @@ def plot_heatmap(data, heatmap):
                 centroid_x, centroid_y, license_plate, color="black", fontsize=8, ha="center", va="center"
             )
 
-    fig.canvas.mpl_connect('button_press_event', lambda event: on_click(event, data))
+    index = build_index(data)
+    fig.canvas.mpl_connect('button_press_event', lambda event: on_click(event, data, index))
     plt.title("Parking Heatmap with Origin at Top-Left")
     plt.xlabel("X-axis")
     plt.ylabel("Y-axis")
     plt.colorbar(ax.imshow(heatmap, cmap=cmap, norm=norm), label="State")
     plt.show()
 
+# Live heatmap: the image and colorbar are created once, occupancy changes only
+# repaint the pixels of the affected parking spots and update the image artist in place
+class LiveHeatmap:
+    def __init__(self, data):
+        self.data = data
+        self.index = build_index(data)  # One raster for painting and for clicks
+
+        self.heatmap = generate_heatmap(data, self.index)
+        self.parks = {park["id"]: park for park in data["parkings"]}
+        # Pixel masks are taken from the label raster once and reused for every repaint
+        self.regions = {park["id"]: slot_region(self.index, slot) for slot, park in enumerate(data["parkings"])}
+        self.labels = {}
+
+        self.fig, self.ax = plt.subplots(figsize=(10, 10))
+        cmap, norm = heatmap_colormap()
+        self.image = self.ax.imshow(self.heatmap, cmap=cmap, norm=norm, origin="upper")
+        self.fig.colorbar(self.image, ax=self.ax, label="State")
+        for park in data["parkings"]:
+            self._update_label(park)
+
+        self.fig.canvas.mpl_connect('button_press_event', lambda event: on_click(event, self.data, self.index))
+        self.ax.set_title("Live Parking Heatmap")
+        self.ax.set_xlabel("X-axis")
+        self.ax.set_ylabel("Y-axis")
+
+    # Show the license plate at the centroid of an occupied spot, remove it otherwise
+    def _update_label(self, park):
+        label = self.labels.pop(park["id"], None)
+        if label is not None:
+            label.remove()
+        if park["car"] and park["license_plate"]:
+            polygon = np.array(park["coordinates"])
+            self.labels[park["id"]] = self.ax.text(
+                np.mean(polygon[:, 0]), np.mean(polygon[:, 1]), park["license_plate"],
+                color="black", fontsize=8, ha="center", va="center"
+            )
+
+    # Apply a list of slot states ({"id", "car", "license_plate"}); returns True if anything changed
+    def apply(self, changes):
+        dirty = False
+        for state in changes:
+            park = self.parks.get(state["id"])
+            region = self.regions.get(state["id"])
+            if park is None:
+                continue
+            if park["car"] == state["car"] and park["license_plate"] == state["license_plate"]:
+                continue
+            park["car"] = state["car"]
+            park["license_plate"] = state["license_plate"]
+            window, mask = region
+            self.heatmap[window][mask] = slot_value(park)
+            self._update_label(park)
+            dirty = True
+
+        if dirty:
+            self.image.set_data(self.heatmap)
+            self.fig.canvas.draw_idle()
+        return dirty
+
+    # Poll the source every interval milliseconds from the GUI event loop
+    def run(self, source, interval=200):
+        timer = self.fig.canvas.new_timer(interval=interval)
+        timer.add_callback(lambda: self.apply(source.poll()))
+        timer.start()
+        self._timer = timer  # Keep a reference, otherwise the timer is garbage collected
+        plt.show()
+
 # Example usage (replace `data` with your JSON data)
 data = {
     "global_coordinates": {
@@ -150,5 +258,32 @@ data = {
     ]
 }
 
-heatmap = generate_heatmap(data)
-plot_heatmap(data, heatmap)
\ No newline at end of file
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Parking heatmap (static or live)")
+    parser.add_argument("--slots", help="slot layout, e.g. all_parkings.json (default: built-in example)")
+    parser.add_argument("--live", choices=["journal", "mqtt"], help="follow occupancy changes live")
+    parser.add_argument("--state", default="occupancy_state.json", help="occupancy snapshot (journal mode)")
+    parser.add_argument("--journal", default="occupancy.journal", help="occupancy journal (journal mode)")
+    parser.add_argument("--broker", default="localhost", help="MQTT broker (mqtt mode)")
+    parser.add_argument("--port", type=int, default=1883, help="MQTT port (mqtt mode)")
+    parser.add_argument("--topic", default="devices/OnlineSimulator/messages/events/", help="MQTT topic (mqtt mode)")
+    parser.add_argument("--interval", type=int, default=200, help="refresh interval in ms (live mode)")
+    args = parser.parse_args()
+
+    if args.slots:
+        with open(args.slots, "r") as json_file:
+            data = json.load(json_file)
+
+    if args.live is None:
+        heatmap = generate_heatmap(data)
+        plot_heatmap(data, heatmap)
+    else:
+        from occupancy_sources import JournalSource, MqttSource
+
+        if args.live == "journal":
+            source = JournalSource(args.state, args.journal)
+        else:
+            source = MqttSource(args.broker, args.port, args.topic)
+        LiveHeatmap(data).run(source, args.interval)
\ No newline at end of file
@@ -0,0 +1,283 @@
+import argparse
+import calendar
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from occupancy_sources import message_changes
+from occupancy_store import atomic_write_json
+
+# Belegungs-Historie als Binärdateien mit Datensätzen fester Länge, eine Datei pro Tag (UTC).
+# Geschrieben wird nur angehängt, gelesen über np.memmap; Auswertungen laufen vektorisiert.
+#
+# Auswertung der letzten 30 Tage:
+#   python history.py --slots all_parkings.json --days 30 --plot utilization
+
+# 24 Byte pro Datensatz: Zeitstempel, Hash des Kennzeichens (0 = keins), Parkplatz-Index, Zustand
+RECORD = np.dtype([("ts", "<f8"), ("plate", "<u8"), ("slot", "<u4"), ("state", "u1")], align=True)
+SLOTS_FILE = "slots.json"
+DAY = 86400
+
+
+# 64-Bit-Hash eines Kennzeichens (das Kennzeichen selbst wird nicht gespeichert)
+def plate_hash(plate):
+    if not plate:
+        return 0
+    return int.from_bytes(hashlib.blake2b(plate.encode(), digest_size=8).digest(), "little")
+
+
+def day_start(ts):
+    return calendar.timegm(time.gmtime(ts)[:3] + (0, 0, 0))
+
+
+def day_path(directory, ts):
+    return os.path.join(directory, time.strftime("%Y-%m-%d", time.gmtime(ts)) + ".bin")
+
+
+# Parkplatz-IDs in Index-Reihenfolge (Indizes bleiben stabil, neue IDs werden angehängt)
+def load_slot_ids(directory):
+    try:
+        with open(os.path.join(directory, SLOTS_FILE), "r") as slots_file:
+            return json.load(slots_file)
+    except FileNotFoundError:
+        return []
+
+
+class HistoryWriter:
+    """Hängt Zustandsänderungen der Parkplätze an die Tagesdatei an.
+
+    Unveränderte Zustände (z. B. aus periodischen Snapshots) werden nicht erneut geschrieben.
+    Beim Tageswechsel steht am Anfang der neuen Datei der Zustand aller bekannten Parkplätze
+    zum Tagesbeginn, damit jede Tagesdatei ohne die vorherigen auswertbar ist.
+    """
+
+    def __init__(self, directory="history"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.slot_ids = load_slot_ids(directory)
+        self.slot_index = {slot_id: index for index, slot_id in enumerate(self.slot_ids)}
+        self.states = {}  # Parkplatz-Index -> (Zustand, Kennzeichen-Hash)
+        self._file = None
+        self._path = None
+
+    def _index(self, slot_id):
+        index = self.slot_index.get(slot_id)
+        if index is None:
+            index = len(self.slot_ids)
+            self.slot_ids.append(slot_id)
+            self.slot_index[slot_id] = index
+        return index
+
+    # Zustände ({"id", "car", "license_plate"}) zum Zeitpunkt ts speichern
+    def record(self, changes, ts=None):
+        ts = time.time() if ts is None else ts
+        path = day_path(self.directory, ts)
+        if path != self._path:
+            self._roll(path, day_start(ts))
+
+        rows = []
+        known = len(self.slot_ids)
+        for state in changes:
+            index = self._index(state["id"])
+            value = (bool(state["car"]), plate_hash(state.get("license_plate", "")))
+            if self.states.get(index) != value:
+                self.states[index] = value
+                rows.append((ts, value[1], index, value[0]))
+        if len(self.slot_ids) != known:
+            # Neue Parkplätze einmal pro Aufruf festhalten, bevor ihre Datensätze geschrieben werden
+            atomic_write_json(os.path.join(self.directory, SLOTS_FILE), self.slot_ids)
+        self._write(rows)
+
+    # Nachricht des DeltaPublisher speichern
+    def persist(self, message):
+        self.record(message_changes(message))
+
+    def _roll(self, path, start):
+        if self._file is not None:
+            self._file.close()
+        new_day = self._path is not None
+        self._path = path
+        self._file = open(path, "ab")
+        if new_day:
+            self._write([(start, plate, index, state) for index, (state, plate) in self.states.items()])
+
+    def _write(self, rows):
+        if rows:
+            self._file.write(np.array(rows, RECORD).tobytes())
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class HistoryReader:
+    """Liest Zeiträume aus den Tagesdateien über np.memmap, ohne sie ganz zu laden."""
+
+    def __init__(self, directory="history"):
+        self.directory = directory
+        self.slot_ids = load_slot_ids(directory)
+
+    def _day(self, ts):
+        path = day_path(self.directory, ts)
+        if not os.path.exists(path):
+            return None
+        count = os.path.getsize(path) // RECORD.itemsize  # Unvollständigen letzten Datensatz ignorieren
+        if count == 0:
+            return None
+        return np.memmap(path, RECORD, "r", shape=(count,))
+
+    # Alle Datensätze bis end aus den Tagen von start bis end. Aus dem ersten Tag sind auch die
+    # Datensätze vor start enthalten, damit der Zustand zu Beginn des Zeitraums bekannt ist.
+    def records(self, start, end):
+        parts = []
+        for day in range(day_start(start), int(end) + 1, DAY):
+            records = self._day(day)
+            if records is None:
+                continue
+            stop = np.searchsorted(records["ts"], end)  # Zeitstempel sind innerhalb einer Datei aufsteigend
+            parts.append(np.array(records[:stop]))
+        if not parts:
+            return np.zeros(0, RECORD)
+        return np.concatenate(parts)
+
+
+# Belegungsintervalle: pro Datensatz gilt der Zustand bis zum nächsten Datensatz desselben
+# Parkplatzes (bzw. bis end); alles auf den Zeitraum [start, end) beschnitten
+def _intervals(records, start, end, slot_count):
+    # Die Datensätze sind bereits zeitlich sortiert, eine stabile Sortierung nach Parkplatz
+    # reicht (mit 16-Bit-Schlüssel als Radix-Sort deutlich schneller)
+    key = records["slot"].astype(np.uint16) if slot_count <= 0xFFFF else records["slot"]
+    order = np.argsort(key, kind="stable")
+    slots = records["slot"][order].astype(np.int64)
+    ts = records["ts"][order]
+    same_next = np.zeros(len(slots), bool)
+    same_next[:-1] = slots[1:] == slots[:-1]
+    next_ts = np.where(same_next, np.roll(ts, -1), end)
+    begin = np.clip(ts, start, end)
+    finish = np.clip(next_ts, start, end)
+    return slots, records["state"][order].astype(bool), begin, finish
+
+
+# Belegte Sekunden pro Stunde des Tages (Ortszeit über utc_offset) für Intervalle -> (Anzahl, 24)
+def _hourly(keys, begin, finish, count, utc_offset):
+    begin = begin + utc_offset
+    finish = finish + utc_offset
+    first = np.floor(begin / 3600).astype(np.int64)
+    last = np.ceil(finish / 3600).astype(np.int64) - 1
+    pieces = np.maximum(last - first + 1, 0)
+    owner = np.repeat(np.arange(len(begin)), pieces)
+    hour = first[owner] + (np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces))
+    seconds = np.minimum(finish[owner], (hour + 1) * 3600.0) - np.maximum(begin[owner], hour * 3600.0)
+    bins = keys[owner] * 24 + hour % 24
+    return np.bincount(bins, weights=np.maximum(seconds, 0), minlength=count * 24).reshape(count, 24)
+
+
+# Kennzahlen pro Parkplatz-Index für [start, end): Auslastung, mittlere Standzeit, Anzahl
+# Belegungen und Auslastung pro Stunde des Tages. Standzeiten am Rand des Zeitraums werden
+# abgeschnitten gezählt.
+def summarize(records, start, end, slot_count, utc_offset=None):
+    if utc_offset is None:
+        utc_offset = time.localtime(start).tm_gmtoff
+    slots, occupied, begin, finish = _intervals(records, start, end, slot_count)
+    duration = finish - begin
+
+    active = occupied & (duration > 0)
+    occupied_seconds = np.bincount(slots[active], weights=duration[active], minlength=slot_count)
+
+    # Zusammenhängende Belegungen: aufeinanderfolgende Datensätze gleichen Zustands zusammenfassen
+    new_run = np.ones(len(slots), bool)
+    new_run[1:] = (slots[1:] != slots[:-1]) | (occupied[1:] != occupied[:-1])
+    run_id = np.cumsum(new_run) - 1
+    run_seconds = np.bincount(run_id, weights=duration)
+    run_slots = slots[new_run]
+    visits = occupied[new_run] & (run_seconds > 0)
+    visit_count = np.bincount(run_slots[visits], minlength=slot_count)
+    dwell_seconds = np.bincount(run_slots[visits], weights=run_seconds[visits], minlength=slot_count)
+
+    hourly = _hourly(slots[active], begin[active], finish[active], slot_count, utc_offset)
+    hour_totals = _hourly(np.zeros(1, np.int64), np.array([float(start)]), np.array([float(end)]), 1, utc_offset)[0]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "utilization": occupied_seconds / (end - start),
+            "mean_dwell": np.where(visit_count > 0, dwell_seconds / visit_count, np.nan),
+            "visits": visit_count,
+            "hourly": hourly / np.where(hour_totals > 0, hour_totals, np.nan),
+            "overall_mean_dwell": float(run_seconds[visits].mean()) if visits.any() else float("nan"),
+        }
+
+
+# Werte pro History-Index in die Reihenfolge einer Slot-Datei bringen (unbekannte IDs = NaN)
+def layout_values(data, slot_ids, values):
+    index = {slot_id: i for i, slot_id in enumerate(slot_ids)}
+    return np.array([values[index[p["id"]]] if p["id"] in index else np.nan for p in data["parkings"]], float)
+
+
+# Auslastung pro Parkplatz und Stunde des Tages als Matrix mit der Farbskala der Heatmap
+def plot_peak_hours(data, hourly):
+    import matplotlib.pyplot as plt
+    from heatmap import value_colormap
+
+    fig, ax = plt.subplots(figsize=(12, max(3, len(hourly) * 0.25)))
+    image = ax.imshow(np.ma.masked_invalid(hourly), cmap=value_colormap(), vmin=0, vmax=1, aspect="auto")
+    ax.set_yticks(range(len(hourly)))
+    ax.set_yticklabels([str(p["id"]) for p in data["parkings"]])
+    ax.set_xticks(range(24))
+    ax.set_xlabel("Stunde")
+    ax.set_ylabel("Parkplatz")
+    ax.set_title("Auslastung pro Stunde")
+    fig.colorbar(image, ax=ax, label="Auslastung")
+    return fig
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Belegungs-Historie auswerten")
+    parser.add_argument("--dir", default="history", help="Verzeichnis der Historie")
+    parser.add_argument("--slots", default="all_parkings.json", help="Parkplatz-Datei für Reihenfolge und Heatmap")
+    parser.add_argument("--days", type=float, default=7, help="Zeitraum bis jetzt in Tagen")
+    parser.add_argument("--start", help="Beginn (YYYY-MM-DD, UTC) statt --days")
+    parser.add_argument("--end", help="Ende (YYYY-MM-DD, UTC, exklusiv)")
+    parser.add_argument("--plot", choices=("utilization", "dwell", "hours"), help="Heatmap anzeigen")
+    args = parser.parse_args()
+
+    end = calendar.timegm(time.strptime(args.end, "%Y-%m-%d")) if args.end else time.time()
+    start = calendar.timegm(time.strptime(args.start, "%Y-%m-%d")) if args.start else end - args.days * DAY
+
+    with open(args.slots, "r") as json_file:
+        data = json.load(json_file)
+
+    begin = time.perf_counter()
+    reader = HistoryReader(args.dir)
+    records = reader.records(start, end)
+    result = summarize(records, start, end, len(reader.slot_ids))
+    elapsed = time.perf_counter() - begin
+
+    utilization = layout_values(data, reader.slot_ids, result["utilization"])
+    dwell = layout_values(data, reader.slot_ids, result["mean_dwell"])
+    hourly = np.array([layout_values(data, reader.slot_ids, result["hourly"][:, hour]) for hour in range(24)]).T
+    print(f"{len(records)} Datensätze in {elapsed * 1000:.0f} ms ausgewertet")
+    for park, share, seconds in zip(data["parkings"], utilization, dwell):
+        print(f"Parkplatz {park['id']}: Auslastung {share:.1%}, mittlere Standzeit {seconds / 60:.1f} min")
+    print(f"Mittlere Standzeit gesamt: {result['overall_mean_dwell'] / 60:.1f} min")
+    if np.isfinite(hourly).any():
+        peak = int(np.nanargmax(np.nanmean(hourly, axis=0)))
+        print(f"Stärkste Stunde: {peak}:00-{peak + 1}:00")
+
+    if args.plot:
+        import matplotlib.pyplot as plt
+        from heatmap import value_heatmap, plot_value_heatmap
+
+        if args.plot == "utilization":
+            plot_value_heatmap(data, value_heatmap(data, utilization), utilization, "Auslastung", "Auslastung", vmax=1)
+        elif args.plot == "dwell":
+            minutes = dwell / 60
+            plot_value_heatmap(data, value_heatmap(data, minutes), minutes, "Mittlere Standzeit", "Minuten",
+                               fmt="{:.0f} min")
+        else:
+            plot_peak_hours(data, hourly)
+        plt.show()
@@ -0,0 +1,52 @@
+import numpy as np
+
+
+class SlotHysteresis:
+    """Entprellt die Belegung aller Parkplätze mit einer Array-Operation pro Frame.
+
+    Pro Parkplatz liegen die letzten window Beobachtungen in einem Ringpuffer, dazu die
+    Anzahl belegter Stimmen, der bestätigte Zustand und der Zeitpunkt der letzten Änderung.
+    Ein freier Parkplatz gilt als belegt, sobald mindestens on_votes der letzten window
+    Frames belegt waren; ein belegter wird frei, wenn es höchstens off_votes waren. Nach einer
+    Änderung bleibt der Zustand mindestens min_hold Sekunden stehen. Ein einzelner Aussetzer
+    des Detektors führt so nicht mehr zu zwei Statuswechseln und zwei Nachrichten.
+    """
+
+    def __init__(self, states=(), window=5, on_votes=3, off_votes=1, min_hold=0.0):
+        if not 0 <= off_votes < on_votes <= window:
+            raise ValueError("Es muss 0 <= off_votes < on_votes <= window gelten")
+        self.window = window
+        self.on_votes = on_votes
+        self.off_votes = off_votes
+        self.min_hold = min_hold
+        self.reset(states)
+
+    # Zustand neu aufsetzen (Start oder neue Geometrie); der Puffer wird mit dem Zustand gefüllt
+    def reset(self, states, now=0.0):
+        self.state = np.array(states, bool).reshape(-1)
+        self.votes = np.repeat(self.state[None, :], self.window, axis=0)
+        self.counts = np.where(self.state, self.window, 0).astype(np.int16)
+        self.last_change = np.full(len(self.state), now, np.float64)
+        self._position = 0
+
+    # Beobachtung eines Frames eintragen; liefert die Indizes der Parkplätze, deren Zustand wechselt
+    def update(self, observed, now):
+        observed = np.asarray(observed, bool)
+        self.counts += observed.astype(np.int16) - self.votes[self._position]
+        self.votes[self._position] = observed
+        self._position = (self._position + 1) % self.window
+
+        ready = now - self.last_change >= self.min_hold
+        changed = ready & np.where(self.state, self.counts <= self.off_votes, self.counts >= self.on_votes)
+        self.state ^= changed
+        self.last_change[changed] = now
+        return np.flatnonzero(changed)
+
+    # Wie SlotEngine.apply_occupancy: "car" nur bei den geänderten Parkplätzen setzen
+    def apply(self, parkings, observed, now):
+        changed = []
+        for index in self.update(observed, now).tolist():
+            parking = parkings[index]
+            parking["car"] = bool(self.state[index])
+            changed.append(parking)
+        return changed
@@ -0,0 +1,309 @@
+import argparse
+import array
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark import git_commit, synthetic_layout, timing_stats
+from delta_publisher import DeltaPublisher
+from local_broker import LocalBroker
+from metrics import setup_logging
+from mqtt_publisher import MqttPublisher
+from spool import PublishSpool
+
+# Lasttest des MQTT-Versands: N simulierte Parkplätze (Lots) mit synthetischen Layouts und
+# zufälligen Belegungswechseln senden wie basic.py über DeltaPublisher und MqttPublisher, jedes
+# Lot mit eigener Verbindung und eigenem Topic. Die Lots verteilen sich auf mehrere Prozesse,
+# der Broker (local_broker.py) läuft in einem eigenen Prozess und zählt nicht zur CPU-Zeit der
+# Lots. Gemessen werden Nachrichten/s beim Broker, die Dauer von publish() und die Latenz vom
+# Erzeugen einer Nachricht bis zum Empfang (Perzentile), CPU-Zeit pro Lot und Speicherwachstum.
+#
+#   python loadtest.py --lots 10 100 1000 --slots 50 --duration 60 --output loadtest.json
+#   python loadtest.py --lots 500 --outage 20:5 --spool /tmp/spool     (Ausfälle des Brokers)
+#   python loadtest.py --lots 200 --broker 127.0.0.1:1883               (vorhandener Broker, ohne Latenz)
+
+
+# Aktueller Arbeitsspeicher des Prozesses in MB (ohne /proc: Spitzenwert)
+def rss_mb():
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class SimulatedLot:
+    """Ein Parkplatz-Gelände: Layout, Belegung und DeltaPublisher wie im ParkingMonitor.
+
+    Belegungswechsel kommen als Poisson-Prozess mit churn Wechseln pro Minute; jeder
+    Wechsel schaltet einen zufälligen Parkplatz um.
+    """
+
+    def __init__(self, lot_id, slots, churn, snapshot_interval, seed):
+        data = synthetic_layout(slots)
+        self.id = lot_id
+        self.parkings = data["parkings"]
+        self.rng = np.random.default_rng(seed)
+        for parking, occupied in zip(self.parkings, self.rng.random(slots) < 0.5):
+            parking["car"] = bool(occupied)
+        self.rate = churn / 60.0
+        self.delta = DeltaPublisher(data["global_coordinates"], snapshot_interval)
+
+    # Wechsel seit dem letzten Schritt anwenden; liefert die Nachricht oder None
+    def step(self, elapsed):
+        for slot in self.rng.integers(0, len(self.parkings), self.rng.poisson(self.rate * elapsed)).tolist():
+            parking = self.parkings[slot]
+            parking["car"] = not parking["car"]
+            self.delta.record(parking)
+        return self.delta.flush(self.parkings)
+
+
+# Broker-Prozess: Empfangszeit jeder Nachricht (auch innerhalb von Batches) nach (Topic, seq)
+def broker_process(connection, outage):
+    received = []
+
+    def record(topic, payload, when):
+        message = json.loads(payload)
+        for item in message if isinstance(message, list) else [message]:
+            received.append((topic, item["seq"], when))
+
+    broker = LocalBroker(port=0, listener=record).start()
+    connection.send(broker.port)
+    period, duration = outage or (0.0, 0.0)
+    start = time.monotonic()
+    while not connection.poll(0.1):
+        if period:
+            broker.set_online((time.monotonic() - start) % period < period - duration)
+    connection.recv()
+    broker.stop()
+    connection.send({"received": received, "packets": broker.received, "bytes": broker.bytes,
+                     "connections": broker.connections, "cpu_s": cpu_seconds()})
+
+
+# Arbeitsprozess: Lots first..last simulieren und über je einen MqttPublisher senden
+def worker_process(first, last, args, host, port, spool_dir, start_at, results):
+    setup_logging("ERROR")  # Fehlercodes einzelner Lots während eines Ausfalls nicht ausgeben
+    lots = []
+    publishers = []
+    for number in range(first, last):
+        lot = SimulatedLot(f"lot{number}", args.slots, args.churn, args.snapshot_interval, seed=number)
+        spool = None
+        if spool_dir:
+            spool = PublishSpool(os.path.join(spool_dir, lot.id), args.spool_capacity, args.spool_size * 1024 * 1024)
+            spool.on_drop = lot.delta.request_snapshot
+        publisher = MqttPublisher(host, port, f"{args.topic}/{lot.id}", tls=False, spool=spool, batch=args.spool_batch,
+                                  rate=args.spool_rate, client_id=f"loadtest-{lot.id}")
+        lots.append(lot)
+        publishers.append(publisher.connect(timeout=5.0))
+
+    # Gesendete Nachrichten kompakt als Arrays (Lot, seq, erzeugt, Dauer von publish()); ihr Speicher
+    # wird vom gemessenen Arbeitsspeicher abgezogen, damit er nicht als Wachstum erscheint
+    sent_lot, sent_seq = array.array("I"), array.array("I")
+    created, publish_times = array.array("d"), array.array("d")
+    memory = []
+    time.sleep(max(start_at - time.time(), 0.0))
+    cpu_start = cpu_seconds()
+    start = time.monotonic()
+    end = start + args.duration
+    # Lots zeitversetzt starten (ramp), sonst kommen alle ersten Snapshots gleichzeitig
+    offsets = np.linspace(0.0, args.ramp, len(lots), endpoint=False)
+    last_step = [start + offset for offset in offsets]
+    next_sample = start
+    while True:
+        now = time.monotonic()
+        if now >= end:
+            break
+        if now >= next_sample:
+            memory.append((round(now - start, 2), rss_mb() - len(created) * 24 / 2 ** 20))
+            next_sample += 1.0
+        for index, (lot, publisher) in enumerate(zip(lots, publishers)):
+            if now < last_step[index]:
+                continue
+            message = lot.step(now - last_step[index])
+            last_step[index] = now
+            if message is None:
+                continue
+            payload = json.dumps(message)
+            sent_lot.append(first + index)
+            sent_seq.append(message["seq"])
+            created.append(time.time())
+            begin = time.perf_counter()
+            publisher.publish(payload)
+            publish_times.append(time.perf_counter() - begin)
+        time.sleep(max(args.tick - (time.monotonic() - now), 0.0))
+    cpu = cpu_seconds() - cpu_start
+    memory.append((round(time.monotonic() - start, 2), rss_mb() - len(created) * 24 / 2 ** 20))
+
+    spooled = sum(len(p.spool) for p in publishers if p.spool is not None)
+    dropped = sum(p.spool.dropped for p in publishers if p.spool is not None)
+    for publisher in publishers:
+        publisher.close(timeout=args.drain)
+    results.put({"lots": len(lots), "sent": (sent_lot, sent_seq, created), "publish_times": publish_times, "cpu_s": cpu,
+                 "memory": memory, "spooled_at_end": spooled, "spool_dropped": dropped})
+
+
+# Speicher am Anfang und Ende sowie Wachstum pro Minute nach dem Hochlaufen (Summe über alle Prozesse)
+def memory_stats(samples_per_worker, duration, ramp):
+    start = sum(samples[0][1] for samples in samples_per_worker)
+    end = sum(samples[-1][1] for samples in samples_per_worker)
+    growth = 0.0
+    for samples in samples_per_worker:
+        seconds, values = np.array(samples).T
+        steady = seconds >= ramp
+        if steady.sum() > 2:
+            growth += float(np.polyfit(seconds[steady], values[steady], 1)[0]) * 60  # Steigung der Ausgleichsgeraden
+    return {"rss_start_mb": round(start, 1), "rss_end_mb": round(end, 1),
+            "growth_mb_per_min": round(growth, 2), "duration_s": duration}
+
+
+def run_once(args, lots):
+    outage = tuple(map(float, args.outage.split(":"))) if args.outage else None
+    broker = None
+    if args.broker:
+        host, port = args.broker.rsplit(":", 1)
+        port = int(port)
+    else:
+        host = "127.0.0.1"
+        connection, child = multiprocessing.Pipe()
+        broker = multiprocessing.Process(target=broker_process, args=(child, outage), daemon=True)
+        broker.start()
+        port = connection.recv()
+
+    spool_dir = None
+    if args.spool:
+        os.makedirs(args.spool, exist_ok=True)
+        spool_dir = tempfile.mkdtemp(prefix=f"lots{lots}_", dir=args.spool)  # Keine Reste früherer Läufe nachsenden
+
+    processes = min(args.processes, lots)
+    bounds = np.linspace(0, lots, processes + 1).astype(int)
+    results = multiprocessing.Queue()
+    start_at = time.time() + 1.0 + lots * 0.005  # Zeit zum Verbinden, dann starten alle Prozesse gemeinsam
+    workers = [multiprocessing.Process(target=worker_process,
+                                       args=(int(first), int(last), args, host, port, spool_dir, start_at, results))
+               for first, last in zip(bounds[:-1], bounds[1:])]
+    for worker in workers:
+        worker.start()
+    reports = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    broker_report = None
+    if broker is not None:
+        time.sleep(0.5)  # Letzte Nachrichten beim Broker ankommen lassen
+        connection.send("stop")
+        broker_report = connection.recv()
+        broker.join()
+
+    # Erzeugungszeit jeder Nachricht nach (Topic, seq), wie sie der Broker sieht
+    created = {}
+    for report in reports:
+        for lot, seq, when in zip(*report["sent"]):
+            created[(f"{args.topic}/lot{lot}", seq)] = when
+    cpu = sum(report["cpu_s"] for report in reports)
+    result = {
+        "lots": lots,
+        "slots": args.slots,
+        "processes": processes,
+        "duration_s": args.duration,
+        "sent": len(created),
+        "offered_per_s": round(len(created) / args.duration, 1),
+        "publish": timing_stats([t for report in reports for t in report["publish_times"]]),
+        "cpu": {
+            "lots_s": round(cpu, 3),
+            "ms_per_lot_s": round(cpu * 1000 / lots / args.duration, 4),  # CPU-Millisekunden pro Lot und Sekunde
+            "cores": round(cpu / args.duration, 3),
+        },
+        "memory": memory_stats([report["memory"] for report in reports], args.duration, args.ramp),
+        "spooled_at_end": sum(report["spooled_at_end"] for report in reports),
+        "spool_dropped": sum(report["spool_dropped"] for report in reports),
+    }
+    if broker_report is not None:
+        latencies = [when - created[(topic, seq)] for topic, seq, when in broker_report["received"]
+                     if (topic, seq) in created]
+        first_receipt = {}
+        for topic, seq, when in broker_report["received"]:
+            first_receipt.setdefault((topic, seq), when)
+        result.update({
+            "received": len(first_receipt),
+            "duplicates": len(broker_report["received"]) - len(first_receipt),
+            "lost": len(created.keys() - first_receipt.keys()),
+            "messages_per_s": round(len(first_receipt) / args.duration, 1),
+            "packets_per_s": round(broker_report["packets"] / args.duration, 1),
+            "bytes_per_s": round(broker_report["bytes"] / args.duration),
+            "end_to_end": timing_stats(latencies),
+            "broker_cpu_s": round(broker_report["cpu_s"], 3),
+        })
+    return result
+
+
+# Kurzfassung eines Ergebnisses für die Konsole
+def summary_line(result):
+    line = (f"{result['offered_per_s']} Nachrichten/s gesendet, publish() p50 {result['publish'].get('p50_ms', 0):.3f} ms"
+            f" p99 {result['publish'].get('p99_ms', 0):.3f} ms, {result['cpu']['ms_per_lot_s']:.3f} ms CPU pro Lot und s,"
+            f" Speicher {result['memory']['growth_mb_per_min']:+.2f} MB/min")
+    if "received" in result:
+        latency = result["end_to_end"]
+        line += (f"\n    Broker: {result['messages_per_s']} Nachrichten/s, {result['lost']} verloren,"
+                 f" Latenz p50 {latency.get('p50_ms', 0):.2f} ms p95 {latency.get('p95_ms', 0):.2f} ms"
+                 f" p99 {latency.get('p99_ms', 0):.2f} ms")
+    return line
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Lasttest des MQTT-Versands mit simulierten Parkplätzen")
+    parser.add_argument("--lots", type=int, nargs="+", default=[10, 100, 1000], help="Anzahl simulierter Lots")
+    parser.add_argument("--slots", type=int, default=50, help="Parkplätze pro Lot")
+    parser.add_argument("--churn", type=float, default=6.0, help="Belegungswechsel pro Lot und Minute")
+    parser.add_argument("--duration", type=float, default=30.0, help="Dauer pro Lauf in Sekunden")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Lots über so viele Sekunden verteilt starten")
+    parser.add_argument("--tick", type=float, default=0.1, help="Sekunden zwischen zwei Simulationsschritten")
+    parser.add_argument("--snapshot-interval", type=float, default=300.0, help="Sekunden zwischen Snapshots")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Prozesse für die Lots")
+    parser.add_argument("--topic", default="parking", help="Topic-Präfix, je Lot <präfix>/<lot>")
+    parser.add_argument("--broker", help="vorhandener Broker HOST:PORT statt local_broker.py (ohne Latenz)")
+    parser.add_argument("--outage", help="Ausfälle des lokalen Brokers als PERIODE:DAUER in Sekunden")
+    parser.add_argument("--spool", help="Verzeichnis für einen Spool pro Lot (Standard: ohne Spool)")
+    parser.add_argument("--spool-capacity", type=int, default=10_000, help="Nachrichten pro Spool")
+    parser.add_argument("--spool-size", type=int, default=4, help="MB pro Spool")
+    parser.add_argument("--spool-batch", type=int, default=100, help="Nachrichten pro Batch beim Nachsenden")
+    parser.add_argument("--spool-rate", type=float, default=200.0, help="Nachrichten pro Sekunde beim Nachsenden")
+    parser.add_argument("--drain", type=float, default=5.0, help="Sekunden zum Leeren der Spools am Ende")
+    parser.add_argument("--output", default="loadtest.json", help="Ergebnisdatei (JSON)")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    results = []
+    for lots in args.lots:
+        print(f"{lots} Lots mit je {args.slots} Parkplätzen, {args.duration:.0f} s")
+        result = run_once(args, lots)
+        results.append(result)
+        print(f"  {summary_line(result)}")
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+        "commit": git_commit(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Ergebnisse gespeichert: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import threading
+import time
+
+from metrics import log, setup_logging
+
+# Minimaler MQTT-3.1.1-Broker als Gegenstelle für Tests ohne echten Broker (kein TLS, keine
+# Anmeldung, keine Retained Messages). Nimmt Nachrichten mit QoS 0/1/2 an, leitet sie an
+# Abonnenten weiter und kann Ausfälle nachstellen:
+#   python local_broker.py --port 1883 --outage 30:10     (alle 30 s für 10 s nicht erreichbar)
+# Eingebettet, z. B. zum Prüfen des Spools (siehe spool.py):
+#   broker = LocalBroker(port=0).start(); ...; broker.set_online(False); ...; broker.stop()
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+SERVER_UNAVAILABLE = 3  # Rückgabecode im CONNACK, solange der Broker "offline" ist
+
+
+def _packet(kind, body=b"", flags=0):
+    length = len(body)
+    header = bytearray([kind << 4 | flags])
+    while True:
+        byte, length = length % 128, length // 128
+        header.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(header) + body
+
+
+def _string(data, pos):
+    length = int.from_bytes(data[pos:pos + 2], "big")
+    return data[pos + 2:pos + 2 + length].decode(), pos + 2 + length
+
+
+# Topic-Filter mit + (eine Ebene) und # (Rest)
+def topic_matches(pattern, topic):
+    pattern_parts, topic_parts = pattern.split("/"), topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+class LocalBroker:
+    """MQTT-Broker in einem eigenen Thread mit eigenem Event-Loop.
+
+    listener(topic, payload, received) wird für jede angenommene Nachricht im Thread des
+    Brokers aufgerufen; received ist time.time() beim Empfang. Mit keep=True werden die
+    Nachrichten zusätzlich in messages gesammelt. Mit acks = False nimmt er Nachrichten mit
+    QoS 1/2 an, bestätigt sie aber nicht (zum Prüfen, dass erst das PUBACK den Spool leert).
+    """
+
+    def __init__(self, host="127.0.0.1", port=1883, listener=None, keep=False):
+        self.host = host
+        self.port = port
+        self.listener = listener
+        self.keep = keep
+        self.messages = []
+        self.received = 0
+        self.bytes = 0
+        self.connections = 0
+        self.online = True
+        self.acks = True
+        self._clients = {}  # writer -> Liste der Topic-Filter
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,), name="broker", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def _run(self, started):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]  # Bei port=0 den zugewiesenen Port übernehmen
+        started.set()
+        self._loop.run_forever()
+        self._server.close()
+        self._loop.run_until_complete(self._server.wait_closed())
+        self._loop.close()
+
+    def stop(self):
+        self.set_online(False)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    # Ausfall nachstellen: offline werden alle Verbindungen getrennt und neue abgewiesen
+    def set_online(self, online):
+        self.online = online
+        if not online and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._drop_clients)
+
+    def _drop_clients(self):
+        for writer in list(self._clients):
+            writer.close()
+        self._clients.clear()
+
+    async def _read_packet(self, reader):
+        first = (await reader.readexactly(1))[0]
+        length = 0
+        shift = 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return first >> 4, first & 0x0F, await reader.readexactly(length)
+
+    async def _handle(self, reader, writer):
+        try:
+            kind, _, _ = await self._read_packet(reader)
+            if kind != CONNECT:
+                return
+            if not self.online:
+                writer.write(_packet(CONNACK, bytes([0, SERVER_UNAVAILABLE])))
+                await writer.drain()
+                return
+            writer.write(_packet(CONNACK, bytes([0, 0])))
+            self._clients[writer] = []
+            self.connections += 1
+            while True:
+                kind, flags, body = await self._read_packet(reader)
+                if kind == PUBLISH:
+                    self._publish(writer, flags, body)
+                elif kind == PUBREL:
+                    writer.write(_packet(PUBCOMP, body[:2]))
+                elif kind == SUBSCRIBE:
+                    pos, granted = 2, bytearray()
+                    while pos < len(body):
+                        pattern, pos = _string(body, pos)
+                        self._clients[writer].append(pattern)
+                        granted.append(0)  # Weitergeleitet wird immer mit QoS 0
+                        pos += 1
+                    writer.write(_packet(SUBACK, body[:2] + bytes(granted)))
+                elif kind == UNSUBSCRIBE:
+                    pos = 2
+                    while pos < len(body):
+                        pattern, pos = _string(body, pos)
+                        if pattern in self._clients[writer]:
+                            self._clients[writer].remove(pattern)
+                    writer.write(_packet(UNSUBACK, body[:2]))
+                elif kind == PINGREQ:
+                    writer.write(_packet(PINGRESP))
+                elif kind == DISCONNECT:
+                    return
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
+
+    def _publish(self, writer, flags, body):
+        received = time.time()
+        topic, pos = _string(body, 0)
+        qos = flags >> 1 & 3
+        if qos:
+            packet_id, pos = body[pos:pos + 2], pos + 2
+            if self.acks:
+                writer.write(_packet(PUBACK if qos == 1 else PUBREC, packet_id))
+        payload = body[pos:]
+        self.received += 1
+        self.bytes += len(payload)
+        if self.keep:
+            self.messages.append((topic, payload))
+        if self.listener is not None:
+            self.listener(topic, payload, received)
+
+        forward = None
+        for client, patterns in self._clients.items():
+            if any(topic_matches(pattern, topic) for pattern in patterns):
+                if forward is None:
+                    forward = _packet(PUBLISH, len(topic.encode()).to_bytes(2, "big") + topic.encode() + payload)
+                client.write(forward)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokaler MQTT-Broker zum Testen")
+    parser.add_argument("--host", default="127.0.0.1", help="Adresse")
+    parser.add_argument("--port", type=int, default=1883, help="Port")
+    parser.add_argument("--outage", help="Ausfälle nachstellen als PERIODE:DAUER in Sekunden, z. B. 30:10")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="DEBUG zeigt jede Nachricht")
+    args = parser.parse_args()
+    setup_logging(args.log_level)
+
+    def show(topic, payload, received):
+        log.debug("%s: %s", topic, payload[:200].decode(errors="replace"))
+
+    broker = LocalBroker(args.host, args.port, listener=show).start()
+    print(f"MQTT-Broker auf {args.host}:{broker.port}, beenden mit Strg+C")
+    period, duration = map(float, args.outage.split(":")) if args.outage else (0.0, 0.0)
+    start = time.monotonic()
+    last = broker.received
+    try:
+        while True:
+            time.sleep(1.0)
+            elapsed = time.monotonic() - start
+            online = not period or elapsed % period < period - duration
+            if online != broker.online:
+                broker.set_online(online)
+                print("Broker wieder erreichbar." if online else f"Broker für {duration:.0f} s nicht erreichbar.")
+            if broker.received != last:
+                print(f"{broker.received - last} Nachrichten/s, {broker.received} insgesamt, "
+                      f"{len(broker._clients)} Verbindung(en)")
+                last = broker.received
+    except KeyboardInterrupt:
+        broker.stop()
+
+
+if __name__ == "__main__":
+    main()
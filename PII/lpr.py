@@ -0,0 +1,150 @@
+import hashlib
+import queue
+import re
+
+import cv2
+
+
+# Nur Großbuchstaben und Ziffern behalten ("B-AB 123" -> "BAB123")
+def normalize_plate(text):
+    return re.sub(r"[^A-Z0-9]", "", text.upper())
+
+
+class StubRecognizer:
+    """Platzhalter ohne OCR: liefert ein stabiles Pseudo-Kennzeichen aus dem Bildinhalt (zum Testen)."""
+
+    def read(self, crop):
+        small = cv2.resize(crop, (8, 8), interpolation=cv2.INTER_AREA)
+        return "TEST" + hashlib.sha1(small.tobytes()).hexdigest()[:4].upper(), 1.0
+
+
+class EasyOcrRecognizer:
+    """Kennzeichen mit EasyOCR auf der CPU lesen (pip install easyocr)."""
+
+    def __init__(self, languages=("de", "en")):
+        import easyocr
+
+        self.reader = easyocr.Reader(list(languages), gpu=False, verbose=False)
+
+    # Bester Kandidat mit plausibler Länge als (Text, Konfidenz) oder None
+    def read(self, crop):
+        best = None
+        for _, text, confidence in self.reader.readtext(crop):
+            text = normalize_plate(text)
+            if 4 <= len(text) <= 10 and (best is None or confidence > best[1]):
+                best = (text, confidence)
+        return best
+
+
+RECOGNIZERS = {"stub": StubRecognizer, "easyocr": EasyOcrRecognizer}
+
+
+def load_recognizer(name):
+    if name not in RECOGNIZERS:
+        raise ValueError(f"Unbekannte Kennzeichenerkennung: {name}")
+    return RECOGNIZERS[name]()
+
+
+# Fahrzeug-Ausschnitt (Box um margin vergrößert) als Kopie, damit späteres Zeichnen nicht stört
+def vehicle_crop(frame, box, margin=0.1):
+    x1, y1, x2, y2 = box
+    dx, dy = int((x2 - x1) * margin), int((y2 - y1) * margin)
+    height, width = frame.shape[:2]
+    x1, y1 = max(x1 - dx, 0), max(y1 - dy, 0)
+    x2, y2 = min(x2 + dx, width - 1), min(y2 + dy, height - 1)
+    return frame[y1:y2 + 1, x1:x2 + 1].copy()
+
+
+class PlateReader:
+    """Entscheidet, wann ein Kennzeichen gelesen wird, und merkt sich die Ergebnisse.
+
+    Gelesen wird nur auf Parkplätzen, die die Entprellung als belegt bestätigt hat, und nur
+    wenn dort ein Fahrzeug neu auftaucht (bestätigter Wechsel frei -> belegt oder ein neuer
+    Track), jeweils nur der Ausschnitt dieses Fahrzeugs. Das Ergebnis gilt pro Parkplatz und
+    Track, bis der Parkplatz frei wird; ein bekannter Track nimmt sein Kennzeichen beim Wechsel
+    des Parkplatzes ohne erneutes Lesen mit. recognize() läuft in einer eigenen Pipeline-Stufe,
+    apply() übernimmt die Ergebnisse im Inferenz-Thread. Jeder Auftrag trägt eine laufende
+    Nummer, damit ein verspätetes Ergebnis nicht beim nächsten Fahrzeug auf dem Platz landet.
+    """
+
+    def __init__(self, recognizer, min_confidence=0.3, margin=0.1):
+        self.recognizer = recognizer
+        self.min_confidence = min_confidence
+        self.margin = margin
+        self.slots = {}  # Parkplatz-ID -> (Track-ID, Auftragsnummer, Kennzeichen oder None, solange gelesen wird)
+        self.tracks = {}  # Track-ID -> Kennzeichen
+        self.results = queue.Queue()
+        self.reads = 0
+        self._jobs = 0
+
+    # Leseaufträge (Parkplatz-ID, Track-ID, Auftragsnummer, Ausschnitt) für neue Fahrzeuge, höchstens
+    # limit Stück. cars enthält (Parkplatz-ID, Track-ID oder None, Box) und nur Fahrzeuge auf bestätigt
+    # belegten Parkplätzen; pro Parkplatz zählt das erste Fahrzeug.
+    def jobs(self, frame, cars, limit):
+        jobs = []
+        seen = set()
+        for parking_id, track_id, box in cars:
+            if parking_id in seen:
+                continue
+            seen.add(parking_id)
+            entry = self.slots.get(parking_id)
+            if entry is not None and (track_id is None or entry[0] == track_id):
+                continue  # Dieses Fahrzeug ist bereits gelesen oder in Arbeit
+            if track_id in self.tracks:
+                self._jobs += 1
+                self.slots[parking_id] = (track_id, self._jobs, None)
+                self.results.put((parking_id, track_id, self._jobs, self.tracks[track_id]))
+                continue
+            if len(jobs) >= limit:
+                continue  # Stufe ausgelastet: im nächsten Frame erneut versuchen
+            self._jobs += 1
+            self.slots[parking_id] = (track_id, self._jobs, None)
+            jobs.append((parking_id, track_id, self._jobs, vehicle_crop(frame, box, self.margin)))
+        return jobs
+
+    # Pipeline-Stufe: einen Ausschnitt lesen (leerer Text, wenn nichts Verlässliches erkannt wurde)
+    def recognize(self, job):
+        parking_id, track_id, number, crop = job
+        result = self.recognizer.read(crop)
+        self.reads += 1
+        plate = result[0] if result is not None and result[1] >= self.min_confidence else ""
+        self.results.put((parking_id, track_id, number, plate))
+        return None
+
+    # Fertige Ergebnisse in die Parkplätze schreiben; liefert die geänderten Parkplätze.
+    # Ergebnisse für Parkplätze, die inzwischen nicht mehr belegt sind, werden verworfen.
+    def apply(self, parkings):
+        if self.results.empty():
+            return []
+        by_id = {parking["id"]: parking for parking in parkings}
+        changed = []
+        while True:
+            try:
+                parking_id, track_id, number, plate = self.results.get_nowait()
+            except queue.Empty:
+                break
+            entry = self.slots.get(parking_id)
+            if entry is None or entry[1] != number:
+                continue  # Inzwischen frei oder ein anderes Fahrzeug
+            parking = by_id.get(parking_id)
+            if parking is None or not parking["car"]:
+                del self.slots[parking_id]  # Parkplatz nicht (mehr) belegt: nichts übernehmen
+                continue
+            self.slots[parking_id] = (track_id, number, plate)
+            if track_id is not None and plate:
+                self.tracks[track_id] = plate
+            if parking.get("license_plate", "") != plate:
+                parking["license_plate"] = plate
+                changed.append(parking)
+        return changed
+
+    # Parkplatz wurde frei: Kennzeichen vergessen
+    def vacate(self, parking):
+        self.slots.pop(parking["id"], None)
+        parking["license_plate"] = ""
+
+    # Kennzeichen nicht mehr verfolgter Tracks vergessen
+    def retain(self, track_ids):
+        if len(self.tracks) > 2 * len(track_ids) + 64:
+            alive = set(track_ids)
+            self.tracks = {track_id: plate for track_id, plate in self.tracks.items() if track_id in alive}
@@ -0,0 +1,258 @@
+import bisect
+import collections
+import logging
+import math
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Messwerte des laufenden Programms im Prometheus-Textformat über einen lokalen HTTP-Endpunkt:
+#   curl http://127.0.0.1:9108/metrics
+#   curl http://127.0.0.1:9108/profile/start        (Sampling-Profiler über alle Threads starten)
+#   curl http://127.0.0.1:9108/profile/stop         (anhalten, Bericht mit den teuersten Funktionen)
+
+PREFIX = "parking"
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+log = logging.getLogger("parking")
+
+
+# Ausgaben pro Ereignis laufen über logging; level z. B. "DEBUG" (jedes Auto, jede Nachricht) oder "WARNING"
+def setup_logging(level="INFO"):
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=level.upper())
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+class Histogram:
+    """Verteilung von Messwerten in festen Buckets (kumuliert erst bei der Ausgabe)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {total}")
+        lines.append(f"{name}_sum{_labels(labels)} {self.sum:.6f}")
+        lines.append(f"{name}_count{_labels(labels)} {self.count}")
+        return lines
+
+
+class Metrics:
+    """Zähler, Latenz-Histogramme und erst beim Abruf berechnete Werte.
+
+    inc() und observe() sind für die heißen Pfade gedacht und kosten nur ein Dictionary-
+    Lookup unter einer Sperre. Werte, die ohnehin woanders gezählt werden (Warteschlangen,
+    Pipeline-Stufen, Bewegungsfilter), liefern Callbacks beim Abruf, statt doppelt gezählt
+    zu werden.
+    """
+
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self.help = {}  # Name -> (Typ, Beschreibung)
+        self.counters = collections.defaultdict(float)  # (Name, Labels) -> Wert
+        self.histograms = {}  # (Name, Labels) -> Histogram
+        self.callbacks = []  # (Name, Typ, Beschreibung, Funktion -> [(Labels, Wert)])
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, text):
+        self.help[name] = (kind, text)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self.counters[key] += amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    # Dauer eines Blocks in Sekunden als Histogramm erfassen
+    @contextmanager
+    def time(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    # Wert beim Abruf berechnen; func liefert eine Liste von (Labels-Dict, Wert)
+    def collect(self, name, kind, text, func):
+        self.callbacks.append((name, kind, text, func))
+
+    # Warteschlangen (Tiefe, verworfene Elemente) und Stufen (Elemente, Rechenzeit) einer Pipeline
+    def watch_pipeline(self, pipeline):
+        self.collect("queue_depth", "gauge", "Elemente in der Warteschlange",
+                     lambda: [({"queue": q.name}, q.qsize()) for q in pipeline.queues])
+        self.collect("queue_dropped_total", "counter", "Verworfene Elemente (z. B. Frames bei Überlast)",
+                     lambda: [({"queue": q.name}, q.dropped) for q in pipeline.queues])
+        self.collect("stage_items_total", "counter", "Verarbeitete Elemente pro Pipeline-Stufe",
+                     lambda: [({"stage": stage.name}, stage.processed) for stage in pipeline.stages])
+        self.collect("stage_busy_seconds_total", "counter", "Rechenzeit pro Pipeline-Stufe",
+                     lambda: [({"stage": stage.name}, stage.busy_time) for stage in pipeline.stages])
+
+    def render(self):
+        families = collections.defaultdict(list)
+        with self._lock:
+            for (name, labels), value in self.counters.items():
+                families[name].append(f"{self.prefix}_{name}{_labels(dict(labels))} {value:g}")
+            for (name, labels), histogram in self.histograms.items():
+                families[name].extend(histogram.lines(f"{self.prefix}_{name}", dict(labels)))
+        kinds = {name: kind for name, (kind, _) in self.help.items()}
+        for name, kind, text, func in self.callbacks:
+            self.help.setdefault(name, (kind, text))
+            kinds[name] = kind
+            for labels, value in func():
+                families[name].append(f"{self.prefix}_{name}{_labels(labels)} {value:g}")
+
+        lines = []
+        for name in sorted(families):
+            kind, text = self.help.get(name, (kinds.get(name) or self._kind(name), ""))
+            if text:
+                lines.append(f"# HELP {self.prefix}_{name} {text}")
+            lines.append(f"# TYPE {self.prefix}_{name} {kind}")
+            lines.extend(families[name])
+        return "\n".join(lines) + "\n"
+
+    def _kind(self, name):
+        return "histogram" if any(key[0] == name for key in self.histograms) else "counter"
+
+
+class SamplingProfiler:
+    """Stichproben der Stacks aller Threads (sys._current_frames) in festem Abstand.
+
+    Im Gegensatz zu cProfile erfasst er auch die Pipeline-Threads und kostet nur einen
+    Thread, der alle interval Sekunden aufwacht; er lässt sich daher im Betrieb an- und
+    abschalten. start() und stop() dürfen gleichzeitig aus mehreren HTTP-Threads kommen.
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self.own = collections.Counter()  # Funktion, in der gerade gerechnet wird
+        self.total = collections.Counter()  # Funktion irgendwo im Stack
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval=0.005):
+        with self._lock:
+            if self.running:
+                return False
+            self.samples = 0
+            self.own.clear()
+            self.total.clear()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, interval):
+        me = threading.get_ident()
+        while not self._stop.wait(interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                self.samples += 1
+                self.own[self._where(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    where = self._where(frame)
+                    if where not in seen:
+                        seen.add(where)
+                        self.total[where] += 1
+                    frame = frame.f_back
+
+    @staticmethod
+    def _where(frame):
+        code = frame.f_code
+        return f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno} {code.co_name}"
+
+    # Anhalten und die teuersten Funktionen als Text liefern
+    def stop(self, top=25):
+        with self._lock:
+            if not self.running:
+                return "Profiler läuft nicht.\n"
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        samples = max(self.samples, 1)
+        lines = [f"{self.samples} Stichproben (alle Threads, Leerlauf inklusive)", "", "eigene Zeit:"]
+        lines += [f"  {count / samples:6.1%}  {where}" for where, count in self.own.most_common(top)]
+        lines += ["", "inklusive Aufrufe:"]
+        lines += [f"  {count / samples:6.1%}  {where}" for where, count in self.total.most_common(top)]
+        return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        server = self.server
+        if url.path == "/metrics":
+            self._reply(server.metrics.render(), "text/plain; version=0.0.4")
+        elif url.path == "/profile/start":
+            try:
+                interval = float(parse_qs(url.query).get("interval", ["0.005"])[0])
+            except ValueError:
+                interval = math.nan
+            if not (math.isfinite(interval) and interval > 0):
+                self.send_error(400, "interval muss eine positive Zahl (Sekunden) sein")
+                return
+            started = server.profiler.start(interval)
+            self._reply("Profiler gestartet.\n" if started else "Profiler läuft bereits.\n")
+        elif url.path == "/profile/stop":
+            self._reply(server.profiler.stop())
+        else:
+            self.send_error(404)
+
+    def _reply(self, text, content_type="text/plain; charset=utf-8"):
+        body = text.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug("metrics: " + format, *args)
+
+
+# HTTP-Endpunkt in einem Hintergrund-Thread starten; None, wenn der Port belegt ist
+def start_server(metrics, port=9108, host="127.0.0.1", profiler=None):
+    try:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as error:
+        log.warning("Metrik-Endpunkt auf %s:%s nicht verfügbar: %s", host, port, error)
+        return None
+    server.daemon_threads = True
+    server.metrics = metrics
+    server.profiler = profiler or SamplingProfiler()
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    log.info("Metriken unter http://%s:%s/metrics", host, server.server_port)
+    return server
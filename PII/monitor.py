@@ -0,0 +1,356 @@
+import json
+import threading
+import time
+
+import cv2
+
+from delta_publisher import DeltaPublisher
+from hysteresis import SlotHysteresis
+from metrics import Metrics, log
+from motion_gate import MotionGate
+from occupancy_store import OccupancyStore
+from pipeline import Pipeline, STOP, DROP_OLDEST, BLOCK
+from roi import RoiDetector
+from slot_engine import SlotEngine
+from tracker import IouTracker
+
+# Gemeinsamer Ablauf von basic.py und azure_basic.py: Capture -> Inferenz -> Anzeige und
+# Inferenz -> Publish. Die Skripte liefern nur noch Einstellungen (config.py) und den Versand.
+
+FRAME_SIZE = (1020, 500)  # Arbeitsgröße aller Frames, auch für detector.py, multi_camera.py und batch_analysis.py
+
+
+# COCO-Klassen laden
+def load_class_list(path="coco.txt"):
+    with open(path, "r") as my_file:
+        return my_file.read().split("\n")
+
+
+# Modell laden und einmal rechnen lassen, damit das erste echte Frame nicht die Initialisierung zahlt
+def load_model(config, class_list):
+    from detector import load_detector
+
+    detector = load_detector(config.backend, config.model, class_list, config.classes)
+    detector.warmup()
+    return detector
+
+
+# Videoquelle öffnen (bei Streams dauert das oft länger als das Modell)
+def open_stream(source):
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise RuntimeError(f"Videoquelle konnte nicht geöffnet werden: {source}")
+    return cap
+
+
+# Parkplätze rastern und die gespeicherte Belegung wiederherstellen
+def open_slots(config, class_list):
+    engine = SlotEngine(config.slots, class_list, config.classes)
+    store = OccupancyStore(config.state, config.journal)
+    store.restore(engine.parkings)
+    history = None
+    if config.history:
+        from history import HistoryWriter
+
+        history = HistoryWriter(config.history)
+    return engine, store, history
+
+
+class ParkingMonitor:
+    """Erkennung, Zuordnung und Zustand der Parkplätze einer Videoquelle.
+
+    Baut die Pipeline-Stufen capture und inferenz (optional kennzeichen) auf und stellt
+    render() für den Hauptthread bereit. Nachrichten landen als (Payload, Nachricht) in
+    publish_queue; wer sie versendet, entscheidet das aufrufende Skript. Laufzeiten und
+    Zähler sammelt metrics (siehe metrics.py).
+    """
+
+    def __init__(self, config, class_list, detector, cap, engine, store, history=None, timer=None, paused=None,
+                 metrics=None):
+        self.config = config
+        self.class_list = class_list
+        self.detector = detector
+        self.cap = cap
+        self.engine = engine
+        self.parkings = engine.parkings
+        self.store = store
+        self.history = history
+        self.timer = timer  # Bericht nach dem ersten verarbeiteten Frame
+        self.paused = paused or threading.Event()  # Status für Pause (wird von der Capture-Stufe geprüft)
+        self.screenshot_counter = 0
+        self.metrics = metrics or Metrics()  # Auch vom Skript für den Versand genutzt
+
+        # Bewegungsfilter: bei unverändertem Bild die letzten Detektionen weiterverwenden
+        self.gate = MotionGate(engine.index.raster, force_every=config.force_every)
+        self.detections = None
+
+        # Fahrzeuge zwischen den Detektor-Aufrufen weiterverfolgen
+        self.tracker = IouTracker()
+
+        # Kennzeichen nur bei Bedarf lesen und bis zum Freiwerden des Parkplatzes merken
+        self.plates = None
+        if config.lpr:
+            from lpr import PlateReader, load_recognizer
+
+            self.plates = PlateReader(load_recognizer(config.lpr))
+
+        # Ausschnitte um die Parkplätze und passende Inferenz-Bildgröße
+        self.roi = RoiDetector(engine.index, target_px=config.roi_target_px)
+
+        # Änderungen pro Frame zu einer Nachricht zusammenfassen (Delta + regelmäßiger Snapshot)
+        self.delta = DeltaPublisher(engine.global_coordinates, config.snapshot_interval, config.debounce)
+        self.delta.seq = store.seq  # Sequenznummern über Neustarts hinweg fortsetzen
+
+        # Bestätigte Belegung pro Parkplatz in Arrays (Ringpuffer der letzten Beobachtungen)
+        self.hysteresis = SlotHysteresis([p["car"] for p in self.parkings], config.window, config.on_votes,
+                                         config.off_votes, config.hold)
+
+        # Pipeline aufbauen: Capture -> Inferenz -> Anzeige, Inferenz -> Publish
+        self.pipeline = Pipeline()
+        policy = BLOCK if config.no_drop else DROP_OLDEST
+        self.frame_queue = self.pipeline.queue(config.queue_size, policy, "frames")
+        self.render_queue = self.pipeline.queue(config.queue_size, DROP_OLDEST, "anzeige")
+        self.publish_queue = self.pipeline.queue(config.publish_queue_size, BLOCK, "publish")  # Deltas dürfen nicht verloren gehen
+        self.capture_stage = self.pipeline.stage("capture", self.capture, outbox=self.frame_queue)
+        self.inference_stage = self.pipeline.stage("inferenz", self.inference, self.frame_queue, self.render_queue,
+                                                   upstream=[self.capture_stage])
+        self.lpr_queue = self.pipeline.queue(config.lpr_queue_size, DROP_OLDEST, "kennzeichen")
+        if self.plates is not None:
+            self.pipeline.stage("kennzeichen", self.plates.recognize, self.lpr_queue, upstream=[self.inference_stage])
+
+        # Metriken: Warteschlangen und Stufen werden erst beim Abruf ausgelesen
+        metrics = self.metrics
+        metrics.describe("stage_seconds", "histogram", "Dauer pro Schritt im Frame-Pfad und beim Versand")
+        metrics.describe("frames_total", "counter", "Gelesene Frames")
+        metrics.describe("detector_runs_total", "counter", "Aufrufe des Detektors")
+        metrics.describe("slot_changes_total", "counter", "Bestätigte Statuswechsel der Parkplätze")
+        metrics.watch_pipeline(self.pipeline)
+        metrics.collect("motion_gate_total", "counter", "Vom Bewegungsfilter geprüfte bzw. übersprungene Frames",
+                        lambda: [({"result": "checked"}, self.gate.checked), ({"result": "skipped"}, self.gate.skipped)])
+
+    # Belegung speichern (Journal, Snapshot und Verlauf)
+    def persist(self, message):
+        with self.metrics.time("stage_seconds", stage="persist"):
+            self.store.persist(message)
+            if self.history is not None:
+                self.history.persist(message)
+
+    # Nachricht an die Publish-Stufe übergeben (enthält nur Kopien des Zustands)
+    def queue_message(self, message):
+        if message is not None:
+            self.publish_queue.put((json.dumps(message), message))
+
+    # Stufe 1: Frame lesen und Framegröße anpassen
+    def capture(self):
+        if self.paused.is_set():
+            time.sleep(0.05)
+            return None
+        with self.metrics.time("stage_seconds", stage="decode"):
+            ret, frame = self.cap.read()
+        if not ret:
+            return STOP
+        self.metrics.inc("frames_total")
+        with self.metrics.time("stage_seconds", stage="resize"):
+            return cv2.resize(frame, FRAME_SIZE)
+
+    # Stufe 2: YOLO-Vorhersagen, Zuordnung zu Parkplätzen und Statusänderungen
+    def inference(self, frame):
+        config = self.config
+        engine = self.engine
+        metrics = self.metrics
+        if engine.reload_if_changed():
+            self.delta.request_snapshot()  # Neue Geometrie: Empfänger brauchen den vollständigen Zustand
+            self.gate.set_slots(engine.index.raster)
+            self.roi.set_slots(engine.index)
+            self.hysteresis.reset([p["car"] for p in self.parkings], time.time())
+
+        # Detektor nur jedes detect_every-te Frame und nur, wenn sich im Bereich der Parkplätze
+        # etwas verändert hat; ohne Bewegung werden die letzten Detektionen erneut bestätigt
+        due = not config.tracking or self.tracker.due(config.detect_every) or self.detections is None
+        if due and (not config.motion_gate or self.gate.should_run(frame) or self.detections is None):
+            with metrics.time("stage_seconds", stage="inference"):
+                if config.roi:
+                    self.detections = self.roi.predict(self.detector, frame)  # Nur die Bereiche mit Parkplätzen
+                else:
+                    self.detections = self.detector.detect(frame)
+            metrics.inc("detector_runs_total")
+
+        # Alle Autos in einem Schritt über das Label-Raster den Parkplätzen zuordnen
+        now = time.time()
+        assign_start = time.perf_counter()
+        tracks = []
+        if config.tracking:
+            self.tracker.update(self.detections if due else None)
+            self.tracker.locate(engine.index, now)
+            for track_id, slot_index, dwell in self.tracker.pop_departures():
+                if slot_index < len(engine.ids):
+                    log.info("Fahrzeug #%s stand %.0f s auf Parkplatz %s.", track_id, dwell, engine.ids[slot_index])
+            tracks = self.tracker.parked(now)
+            assignment = engine.assign(self.tracker.detections())
+        else:
+            assignment = engine.assign(self.detections)
+        occupied = engine.occupancy(assignment)
+        metrics.observe("stage_seconds", time.perf_counter() - assign_start, stage="assign")
+
+        # Entprellte Statuswechsel: Python-Code läuft nur für Parkplätze, die sich wirklich ändern
+        for parking in self.hysteresis.apply(self.parkings, occupied, now):
+            state = "belegt" if parking["car"] else "frei"
+            log.info("Parkplatz %s wurde auf '%s' gesetzt.", parking["id"], state)
+            metrics.inc("slot_changes_total", state=state)
+            if not parking["car"] and self.plates is not None:
+                self.plates.vacate(parking)
+            self.delta.record(parking)
+        occupied = self.hysteresis.state.copy()  # Angezeigt wird der bestätigte Zustand
+
+        # Kennzeichen: fertige Ergebnisse übernehmen und nur neu geparkte Fahrzeuge auf bestätigt
+        # belegten Parkplätzen lesen lassen (ein kurzer Fehlalarm startet keinen Leseauftrag)
+        if self.plates is not None:
+            for parking in self.plates.apply(self.parkings):
+                self.delta.record(parking)
+            if config.tracking:
+                cars = [(engine.ids[slot_index], track_id, box) for track_id, slot_index, _, box in tracks
+                        if occupied[slot_index]]
+                self.plates.retain(self.tracker.ids.tolist())
+            else:
+                cars = [(engine.ids[slot_id], None, box) for box, _, _, slot_id in engine.cars_in_slots(assignment)
+                        if occupied[slot_id]]
+            for job in self.plates.jobs(frame, cars, config.lpr_queue_size - self.lpr_queue.qsize()):
+                self.lpr_queue.put(job)
+
+        # Alle Änderungen dieses Frames als eine Nachricht an die Publish-Stufe übergeben
+        self.queue_message(self.delta.flush(self.parkings))
+
+        if self.timer is not None:
+            print(self.timer.report())
+            self.timer = None
+
+        return frame, assignment, occupied, engine.ids, engine.polygons, tracks
+
+    # Stufe 4 (Hauptthread): Ergebnis einzeichnen
+    def render(self, frame, assignment, occupied, ids, polygons, tracks):
+        headless = self.config.headless
+
+        # Erkannte Autos in Parkplätzen markieren
+        for (x1, y1, x2, y2), (cx, cy), class_id, slot_id in self.engine.cars_in_slots(assignment):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.circle(frame, (cx, cy), 3, (0, 0, 255), -1)
+            log.debug("Auto erkannt in Parkplatz ID: %s, Klasse: %s", ids[slot_id], self.class_list[class_id])
+
+        # Track-ID und Standzeit geparkter Fahrzeuge
+        for track_id, _, dwell, (x1, y1, _, _) in tracks:
+            cv2.putText(frame, f"#{track_id} {dwell:.0f}s", (x1, max(y1 - 4, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 0), 1)
+
+        # Parkplatz einfärben basierend auf dem Status
+        for parking_id, area_np, is_occupied in zip(ids, polygons, occupied):
+            if is_occupied:
+                # Parkplatz rot einfärben
+                cv2.polylines(frame, [area_np], True, (0, 0, 255), 2)
+                cv2.putText(frame, f"{parking_id}", tuple(area_np[0].tolist()), cv2.FONT_HERSHEY_COMPLEX, 0.5, (0, 0, 255), 1)
+            else:
+                # Parkplatz grün einfärben
+                cv2.polylines(frame, [area_np], True, (0, 255, 0), 2)
+                cv2.putText(frame, f"{parking_id}", tuple(area_np[0].tolist()), cv2.FONT_HERSHEY_COMPLEX, 0.5, (255, 255, 255), 1)
+
+        # Tastenanweisungen oben rechts einfügen (nur mit Fenster)
+        if headless:
+            return frame
+        instructions = [
+            "Leertaste: Pause/Weiter",
+            "S: Screenshot speichern",
+            "Q: Beenden"
+        ]
+
+        x_offset = frame.shape[1] - 300
+        y_offset = 20
+        for i, text in enumerate(instructions):
+            cv2.putText(frame, text, (x_offset, y_offset + i * 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+        return frame
+
+    # Screenshot des aktuellen Frames speichern
+    def save_screenshot(self, frame):
+        screenshot_filename = f"screenshot_{self.screenshot_counter}.jpg"
+        cv2.imwrite(screenshot_filename, frame)  # Aktuelles Frame speichern
+        log.info("Screenshot gespeichert: %s", screenshot_filename)
+        self.screenshot_counter += 1
+
+    # Noch entprellte Änderungen als letzte Nachricht (nach pipeline.stop())
+    def final_message(self):
+        return self.delta.flush(self.parkings, force=True)
+
+    # Ressourcen freigeben und Zusammenfassung ausgeben
+    def close(self):
+        self.store.close()
+        if self.history is not None:
+            self.history.close()
+        print(self.pipeline.summary())
+        print(self.gate.summary())
+        if self.plates is not None:
+            print(f"Kennzeichen: {self.plates.reads} Ausschnitte gelesen")
+        self.cap.release()
+
+
+class Viewer:
+    """Hauptschleife für Anzeige und Tasten bzw. ohne Fenster für Signale und Vorschaubilder.
+
+    Wird vor dem Laden des Modells erzeugt: das Fenster ist sofort da und die Signal-Handler
+    sind installiert, bevor asyncio.run() SIGINT übernehmen kann.
+    """
+
+    def __init__(self, config):
+        from headless import PreviewWriter, SignalControl
+
+        self.headless = config.headless
+        self.paused = threading.Event()  # An ParkingMonitor übergeben
+        # Ohne Fenster: Signale statt Tasten, gezeichnet wird nur für Vorschau und Screenshots
+        self.control = SignalControl(self.paused) if self.headless else None
+        self.preview = PreviewWriter(config.preview_interval, config.preview_path)
+        self.frame = None
+        self.latest = None  # Letztes noch nicht gezeichnetes Ergebnis (nur ohne Fenster)
+        if not self.headless:
+            cv2.namedWindow('RGB')
+
+    # Ein Element der Anzeige-Warteschlange (oder None) verarbeiten; False = beenden
+    def step(self, item, monitor):
+        if item is STOP:
+            return False
+
+        if self.headless:
+            if self.control.stop_requested():
+                return False
+            if item is not None:
+                self.latest = item
+            screenshot = self.control.screenshot_requested()
+            preview = self.preview.due()
+            if self.latest is not None and (screenshot or preview):
+                self.frame = monitor.render(*self.latest)
+                self.latest = None
+                if preview:
+                    self.preview.write(self.frame)
+            if screenshot and self.frame is not None:
+                monitor.save_screenshot(self.frame)
+            return True
+
+        if item is not None:
+            self.frame = monitor.render(*item)
+
+        # Frame anzeigen
+        if self.frame is not None:
+            cv2.imshow("RGB", self.frame)
+
+        # Tasteneingaben verarbeiten
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('q'):  # Taste 'q' zum Beenden
+            return False
+        elif key == 32:  # Leertaste
+            # Pause-Status umschalten
+            if self.paused.is_set():
+                self.paused.clear()
+            else:
+                self.paused.set()
+        elif key == ord('s') and self.frame is not None:  # Taste 's' für Screenshot
+            monitor.save_screenshot(self.frame)
+        return True
+
+    def close(self):
+        if not self.headless:
+            cv2.destroyAllWindows()
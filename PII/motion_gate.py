@@ -0,0 +1,67 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Entscheidet pro Frame, ob die YOLO-Inferenz nötig ist.
+
+    Das Frame wird verkleinert und in Graustufen mit dem Frame der letzten Inferenz
+    verglichen, aber nur innerhalb der (etwas vergrößerten) Vereinigung aller Parkplatz-
+    Polygone. Ändern sich dort mehr als changed_fraction der Pixel um mehr als
+    pixel_threshold Grauwerte, oder liegt die letzte Inferenz force_every Frames zurück,
+    wird neu erkannt; sonst können die vorherigen Detektionen weiterverwendet werden.
+    """
+
+    def __init__(self, slot_raster, scale=4, pixel_threshold=25, changed_fraction=0.01,
+                 force_every=30, margin=20):
+        self.scale = scale
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.force_every = force_every
+        self.margin = margin
+        self.checked = 0
+        self.skipped = 0
+        self._reference = None
+        self._since_inference = 0
+        self.set_slots(slot_raster)
+
+    # Maske aus dem Label-Bild der Parkplätze (SlotIndex.raster) neu berechnen
+    def set_slots(self, slot_raster):
+        mask = (slot_raster >= 0).astype(np.uint8)
+        if self.margin > 0:
+            # Fahrzeuge ragen über die Parkplatzgrenzen hinaus, deshalb etwas Rand hinzunehmen
+            kernel = np.ones((2 * self.margin + 1, 2 * self.margin + 1), np.uint8)
+            mask = cv2.dilate(mask, kernel)
+        height, width = mask.shape
+        self._size = (max(width // self.scale, 1), max(height // self.scale, 1))
+        self.mask = cv2.resize(mask, self._size, interpolation=cv2.INTER_NEAREST).astype(bool)
+        self._mask_pixels = max(int(self.mask.sum()), 1)
+        self._reference = None  # Neue Geometrie: beim nächsten Frame sicher neu erkennen
+
+    def _small(self, frame):
+        small = cv2.resize(frame, self._size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    # True, wenn für dieses Frame neu erkannt werden muss
+    def should_run(self, frame):
+        self.checked += 1
+        small = self._small(frame)
+        run = self._reference is None or self._since_inference + 1 >= self.force_every
+        if not run:
+            diff = cv2.absdiff(small, self._reference)
+            changed = np.count_nonzero((diff > self.pixel_threshold) & self.mask)
+            run = bool(changed / self._mask_pixels > self.changed_fraction)
+
+        if run:
+            self._reference = small
+            self._since_inference = 0
+        else:
+            self._since_inference += 1
+            self.skipped += 1
+        return run
+
+    def summary(self):
+        rate = self.skipped / self.checked * 100 if self.checked else 0.0
+        return f"Bewegungsfilter: {self.skipped} von {self.checked} Inferenzen übersprungen ({rate:.0f} %)"
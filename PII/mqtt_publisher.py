@@ -0,0 +1,179 @@
+import threading
+import time
+
+from metrics import log
+from spool import MAX_BATCH_BYTES, PublishSpool, RateLimiter, batch_payload, watch_spool
+
+# MQTT-Versand für basic.py, multi_camera.py, supervisor.py und loadtest.py. Solange der Broker nicht erreichbar ist oder
+# publish() einen Fehlercode liefert, landen Nachrichten im Spool (spool.py) statt verloren zu
+# gehen; ein Hintergrund-Thread sendet sie nach dem Wiederverbinden in Batches (JSON-Array)
+# mit begrenzter Rate. Ausprobieren ohne echten Broker:
+#   python local_broker.py --port 1883 --outage 30:10
+#   python basic.py --broker-host 127.0.0.1 --broker-port 1883 --no-tls --headless
+
+
+class MqttPublisher:
+    """Eine MQTT-Verbindung mit optionalem Spool auf der Festplatte.
+
+    Reihenfolge bleibt erhalten: solange der Spool nicht leer ist, werden auch neue
+    Nachrichten dort angehängt, bis der Drain-Thread aufgeholt hat. paho puffert selbst
+    höchstens max_queued Nachrichten; ist dieser Puffer voll, liefert publish() einen
+    Fehlercode und die Nachricht geht ebenfalls in den Spool. Rückgabecode 0 heißt nur, dass
+    paho die Nachricht angenommen hat: der Drain-Thread sendet deshalb mit QoS 1 und gibt einen
+    Batch erst frei, wenn der Broker ihn bestätigt hat (PUBACK, höchstens ack_timeout Sekunden).
+    """
+
+    def __init__(self, host, port, topic, password="", tls=True, spool=None, metrics=None,
+                 batch=100, rate=200.0, max_queued=1000, client_id="", qos=1, ack_timeout=10.0):
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.password = password
+        self.tls = tls
+        self.spool = spool
+        self.metrics = metrics
+        self.batch = batch
+        self.limiter = RateLimiter(rate, burst=batch)
+        self.max_queued = max_queued
+        self.client_id = client_id
+        self.qos = qos
+        self.ack_timeout = ack_timeout
+        self.client = None
+        self.connected = threading.Event()
+        self._wake = threading.Event()
+        self._closing = threading.Event()
+        self._drainer = None
+        if metrics is not None:
+            metrics.describe("publish_total", "counter", "Nachrichten an den Broker nach Ergebnis und Rückgabecode (rc)")
+            metrics.describe("publish_acked_total", "counter", "Vom Broker bestätigte Nachrichten")
+            if spool is not None:
+                watch_spool(metrics, spool)
+
+    # Verbinden (paho erst hier importieren, damit der Import des Skripts schnell bleibt); wartet
+    # höchstens timeout Sekunden, danach verbindet paho im Hintergrund weiter
+    def connect(self, timeout=10.0):
+        from paho.mqtt import client as mqtt
+
+        client = mqtt.Client(self.client_id)
+        client.username_pw_set(username="", password=self.password)
+        if self.tls:
+            client.tls_set()
+        client.max_queued_messages_set(self.max_queued)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_publish = self._on_publish
+        self.client = client
+        if self.spool is None:
+            client.connect(self.host, self.port, keepalive=60)  # Ohne Spool wie bisher: Broker muss da sein
+        else:
+            client.connect_async(self.host, self.port, keepalive=60)
+            self._drainer = threading.Thread(target=self._drain, name="spool", daemon=True)
+            self._drainer.start()
+        client.loop_start()
+        if not self.connected.wait(timeout):
+            log.warning("Broker %s:%s noch nicht erreichbar, Nachrichten werden gespoolt.", self.host, self.port)
+        return self
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            log.warning("Verbindung zum Broker abgelehnt. Fehlercode: %s", rc)
+            return
+        log.info("Verbindung zum Broker %s:%s hergestellt.", self.host, self.port)
+        self.connected.set()
+        self._wake.set()
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected.clear()
+        if rc != 0:
+            log.warning("Verbindung zum Broker verloren. Fehlercode: %s", rc)
+
+    # Callback-Funktion, die ausgeführt wird, wenn eine Nachricht erfolgreich gesendet wurde
+    # (bei QoS 1 nach dem PUBACK des Brokers)
+    def _on_publish(self, client, userdata, mid):
+        if self.metrics is not None:
+            self.metrics.inc("publish_acked_total")
+        log.debug("Nachricht erfolgreich veröffentlicht. Message ID: %s", mid)
+
+    def _send(self, payload):
+        start = time.perf_counter()
+        result = self.client.publish(self.topic, payload, qos=self.qos)
+        if self.metrics is not None:
+            self.metrics.observe("stage_seconds", time.perf_counter() - start, stage="publish")
+            self.metrics.inc("publish_total", result="ok" if result.rc == 0 else "error", rc=result.rc)
+        return result
+
+    # Auf die Bestätigung des Brokers warten; False, wenn sie nicht innerhalb von ack_timeout kommt
+    def _confirmed(self, result):
+        if not self.qos:
+            return True
+        try:
+            result.wait_for_publish(self.ack_timeout)
+        except (RuntimeError, ValueError):
+            return False  # Verbindung weg bzw. Nachricht nicht angenommen
+        return result.is_published()
+
+    def _spool(self, payload):
+        self.spool.append(payload)
+        self._wake.set()
+        if self.metrics is not None:
+            self.metrics.inc("spool_appended_total")
+
+    # Nachricht senden bzw. bei Ausfall im Spool ablegen
+    def publish(self, payload):
+        log.debug("Sende JSON-Daten: %s", payload)
+        if self.spool is not None and (len(self.spool) or not self.connected.is_set()):
+            self._spool(payload)
+            return
+        rc = self._send(payload).rc
+        if rc == 0:
+            log.debug("Nachricht wurde erfolgreich in die Warteschlange gestellt.")
+            return
+        log.warning("Fehler beim Senden der Nachricht. Fehlercode: %s", rc)
+        if self.spool is not None:
+            self._spool(payload)
+
+    # Drain-Thread: nach dem Wiederverbinden den Spool in Batches mit begrenzter Rate leeren
+    def _drain(self):
+        while not self._closing.is_set():
+            if not len(self.spool) or not self.connected.is_set():
+                self._wake.wait(0.5)
+                self._wake.clear()
+                continue
+            start, payloads = self.spool.peek(self.batch, MAX_BATCH_BYTES)
+            time.sleep(self.limiter.delay(len(payloads)))
+            result = self._send(batch_payload(payloads))
+            if result.rc == 0 and self._confirmed(result):
+                self.spool.ack(start, len(payloads))
+                log.debug("%d Nachricht(en) aus dem Spool gesendet, %d verbleiben.", len(payloads), len(self.spool))
+                if self.metrics is not None:
+                    self.metrics.inc("spool_drained_total", len(payloads))
+            else:
+                log.warning("Spool: Senden nicht bestätigt (Fehlercode %s), neuer Versuch in 1 s.", result.rc)
+                self._closing.wait(1.0)
+
+    # Spool noch bis zu timeout Sekunden leeren, dann Verbindung und Spool schließen
+    def close(self, timeout=5.0):
+        if self._drainer is not None:
+            deadline = time.monotonic() + timeout
+            while len(self.spool) and self.connected.is_set() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self._closing.set()
+            self._wake.set()
+            self._drainer.join()
+        if self.client is not None:
+            self.client.loop_stop()
+            self.client.disconnect()
+        if self.spool is not None:
+            if len(self.spool):
+                log.info("%d Nachricht(en) bleiben im Spool für den nächsten Start.", len(self.spool))
+            self.spool.close()
+
+
+# Verbindung mit Spool für Ausfälle aus den Broker-Einstellungen (config.add_broker_arguments)
+def connect_broker(config, metrics=None):
+    spool = None
+    if config.spool:
+        spool = PublishSpool(config.spool, config.spool_capacity, config.spool_size * 1024 * 1024)
+    publisher = MqttPublisher(config.broker_host, config.broker_port, config.topic, config.connection_string,
+                              config.tls, spool, metrics, config.spool_batch, config.spool_rate)
+    return publisher.connect()
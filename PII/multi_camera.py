@@ -0,0 +1,291 @@
+import argparse
+import json
+import threading
+import time
+
+import cv2
+
+from config import add_broker_arguments
+from delta_publisher import DeltaPublisher
+from detector import BACKENDS, load_detector
+from hysteresis import SlotHysteresis
+from metrics import log, setup_logging
+from monitor import FRAME_SIZE, load_class_list
+from motion_gate import MotionGate
+from mqtt_publisher import connect_broker
+from occupancy_store import OccupancyStore, restore_states
+from pipeline import Pipeline, BLOCK
+from slot_engine import SlotEngine
+
+# Mehrere Kameras in einem Prozess: pro Kamera ein Thread zum Lesen, ein gemeinsamer
+# YOLO-Aufruf pro Batch und eine Publish-Stufe für alle Kameras.
+#
+# Beispiel:
+#   python multi_camera.py --camera parking1.mp4 all_parkings.json --camera parking2.mp4 lot2.json
+
+
+class FrameGrabber(threading.Thread):
+    """Liest fortlaufend Frames einer Quelle und hält nur das neueste bereit.
+
+    Mit drop=False wartet der Thread, bis das vorherige Frame abgeholt wurde
+    (für Videodateien, bei denen kein Frame übersprungen werden soll).
+    """
+
+    def __init__(self, source, drop=True):
+        super().__init__(daemon=True)
+        self.cap = cv2.VideoCapture(source)
+        self.drop = drop
+        self.finished = False
+        self.dropped = 0
+        self._frame = None
+        self._stopping = False
+        self._condition = threading.Condition()
+
+    def run(self):
+        while not self._stopping:
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            frame = cv2.resize(frame, FRAME_SIZE)
+            with self._condition:
+                while not self.drop and self._frame is not None and not self._stopping:
+                    self._condition.wait(0.1)
+                if self._frame is not None:
+                    self.dropped += 1
+                self._frame = frame
+        self.finished = True
+        self.cap.release()
+
+    # Neuestes Frame abholen (None, wenn seit dem letzten Aufruf keins dazugekommen ist)
+    def take(self):
+        with self._condition:
+            frame, self._frame = self._frame, None
+            self._condition.notify_all()
+        return frame
+
+    # Quelle zu Ende gelesen und letztes Frame abgeholt
+    def exhausted(self):
+        with self._condition:
+            return self.finished and self._frame is None
+
+    def stop(self):
+        self._stopping = True
+        with self._condition:
+            self._condition.notify_all()
+
+
+class Camera:
+    """Zustand einer Kamera: Parkplätze, Bewegungsfilter, Belegung und Nachrichten.
+
+    frames ist die Bildquelle mit take(), exhausted() und stop() (FrameGrabber hier,
+    FrameRing im Supervisor). states/seq stellen die gespeicherte Belegung wieder her.
+    """
+
+    def __init__(self, name, frames, slot_path, class_list, args, states=None, seq=0):
+        self.name = name
+        self.frames_source = frames
+        self.engine = SlotEngine(slot_path, class_list, args.classes)
+        self.gate = MotionGate(self.engine.index.raster, force_every=args.force_every) if args.motion_gate else None
+        if states:
+            restore_states(self.engine.parkings, states)
+        self.hysteresis = SlotHysteresis([p["car"] for p in self.engine.parkings], args.window, args.on_votes,
+                                         args.off_votes)
+        self.delta = DeltaPublisher(self.engine.global_coordinates, args.snapshot_interval, args.debounce)
+        self.delta.seq = seq
+        self.detections = None
+        self.frames = 0
+        self.inferences = 0
+
+    # Geänderte Slot-Datei übernehmen (vor dem Bewegungsfilter aufrufen)
+    def refresh_slots(self):
+        if self.engine.reload_if_changed():
+            self.delta.request_snapshot()
+            self.hysteresis.reset([p["car"] for p in self.engine.parkings], time.time())
+            if self.gate is not None:
+                self.gate.set_slots(self.engine.index.raster)
+
+    def needs_inference(self, frame):
+        if self.gate is None:
+            return True
+        return self.gate.should_run(frame) or self.detections is None
+
+    # Detektionen (oder None = letzte weiterverwenden) auswerten; liefert die Nachricht oder None
+    def update(self, detections):
+        self.frames += 1
+        if detections is not None:
+            self.detections = detections
+            self.inferences += 1
+        if self.detections is None:
+            return None
+
+        assignment = self.engine.assign(self.detections)
+        occupied = self.engine.occupancy(assignment)
+        for parking in self.hysteresis.apply(self.engine.parkings, occupied, time.time()):
+            state = "belegt" if parking["car"] else "frei"
+            log.info("[%s] Parkplatz %s wurde auf '%s' gesetzt.", self.name, parking["id"], state)
+            self.delta.record(parking)
+
+        message = self.delta.flush(self.engine.parkings)
+        if message is not None:
+            message["camera"] = self.name
+        return message
+
+    # Noch entprellte Änderungen als letzte Nachricht abholen
+    def finish(self):
+        message = self.delta.flush(self.engine.parkings, force=True)
+        if message is not None:
+            message["camera"] = self.name
+        return message
+
+
+# Pfade für die gespeicherte Belegung einer Kamera
+def camera_store(name):
+    return OccupancyStore(f"occupancy_state_{name}.json", f"occupancy_{name}.journal")
+
+
+# Eine Runde: neueste Frames aller Kameras holen, den Detector einmal pro Batch aufrufen und
+# die Ergebnisse an die Kameras verteilen. Liefert eine Liste von (Kamera, Nachricht) und die
+# Anzahl der Detector-Aufrufe, oder None, wenn gerade kein neues Frame vorliegt.
+def run_round(cameras, detector, max_batch):
+    ready = []
+    for camera in cameras:
+        frame = camera.frames_source.take()
+        if frame is not None:
+            ready.append((camera, frame))
+    if not ready:
+        return None
+
+    # Nur Kameras mit Bewegung im Bereich der Parkplätze kommen in den Batch
+    pending = []
+    for camera, frame in ready:
+        camera.refresh_slots()
+        if camera.needs_inference(frame):
+            pending.append((camera, frame))
+
+    detections = {}
+    calls = 0
+    for i in range(0, len(pending), max_batch):
+        chunk = pending[i:i + max_batch]
+        results = detector.predict([frame for _, frame in chunk])
+        for (camera, _), result in zip(chunk, results):
+            detections[camera.name] = result
+        calls += 1
+
+    messages = []
+    for camera, _ in ready:
+        message = camera.update(detections.get(camera.name))
+        if message is not None:
+            messages.append((camera, message))
+    return messages, calls, len(pending)
+
+
+# Gemeinsame Kommandozeilen-Optionen (auch für supervisor.py)
+def build_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--camera", nargs=2, action="append", metavar=("QUELLE", "SLOTDATEI"), required=True,
+                        help="Videoquelle (Datei, Kamera-Index oder URL) und zugehörige Parkplatz-Datei")
+    parser.add_argument("--model", default="yolov8s.pt", help="YOLO-Modell (.pt, .onnx oder OpenVINO-Ordner)")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto", help="Inferenz-Backend")
+    parser.add_argument("--classes", nargs="+", default=["car"], help="ausgewertete Klassen aus coco.txt (z. B. car truck bus)")
+    parser.add_argument("--max-batch", type=int, default=16, help="maximale Anzahl Frames pro YOLO-Aufruf")
+    parser.add_argument("--no-drop", action="store_true", help="keine Frames überspringen (Videodateien)")
+    parser.add_argument("--no-motion-gate", dest="motion_gate", action="store_false", help="Bewegungsfilter aus")
+    parser.add_argument("--force-every", type=int, default=30, help="spätestens nach so vielen Frames neu erkennen")
+    parser.add_argument("--window", type=int, default=5, help="Entprellung: Anzahl betrachteter Frames pro Parkplatz")
+    parser.add_argument("--on-votes", type=int, default=3, help="Entprellung: belegte Frames bis 'belegt'")
+    parser.add_argument("--off-votes", type=int, default=1, help="Entprellung: höchstens so viele belegte Frames bis 'frei'")
+    parser.add_argument("--snapshot-interval", type=float, default=300.0, help="Sekunden zwischen Snapshots")
+    parser.add_argument("--debounce", type=float, default=0.0, help="Entprell-Fenster für Änderungen in Sekunden")
+    add_broker_arguments(parser)  # Broker und Spool wie in basic.py (siehe config.py)
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="WARNING blendet die Meldung pro Statuswechsel aus")
+    return parser
+
+
+def main():
+    args = build_parser("Mehrere Kameras mit gebündelter YOLO-Inferenz auswerten").parse_args()
+    setup_logging(args.log_level)
+
+    class_list = load_class_list()
+
+    cameras = []
+    stores = {}
+    for i, (source, slot_path) in enumerate(args.camera):
+        # Ziffern als Kamera-Index interpretieren (wie cv2.VideoCapture(0))
+        source = int(source) if source.isdigit() else source
+        name = f"cam{i}"
+        stores[name] = camera_store(name)
+        grabber = FrameGrabber(source, drop=not args.no_drop)
+        cameras.append(Camera(name, grabber, slot_path, class_list, args, stores[name].states, stores[name].seq))
+
+    detector = load_detector(args.backend, args.model, class_list, args.classes)
+
+    publisher = connect_broker(args)
+
+    # Verworfene Deltas im Spool durch Snapshots aller Kameras ersetzen
+    def request_snapshots():
+        for camera in cameras:
+            camera.delta.request_snapshot()
+
+    if publisher.spool is not None:
+        publisher.spool.on_drop = request_snapshots
+
+    # Speichern und Senden läuft in einer eigenen Stufe, damit die Inferenz nicht wartet;
+    # ist der Broker nicht erreichbar, landen die Nachrichten im Spool
+    def publish(item):
+        camera, payload, message = item
+        stores[camera.name].persist(message)
+        publisher.publish(payload)
+
+    pipeline = Pipeline()
+    publish_queue = pipeline.queue(64 * len(cameras), BLOCK, "publish")
+    pipeline.stage("publish", publish, publish_queue)
+    pipeline.start()
+
+    for camera in cameras:
+        camera.frames_source.start()
+
+    batches = 0
+    batch_frames = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            result = run_round(cameras, detector, args.max_batch)
+            if result is None:
+                if all(camera.frames_source.exhausted() for camera in cameras):
+                    break
+                time.sleep(0.002)
+                continue
+
+            messages, calls, frames = result
+            batches += calls
+            batch_frames += frames
+            for camera, message in messages:
+                publish_queue.put((camera, json.dumps(message), message))
+    except KeyboardInterrupt:
+        print("Beendet")
+    finally:
+        for camera in cameras:
+            camera.frames_source.stop()
+        pipeline.stop()
+        for camera in cameras:
+            message = camera.finish()
+            if message is not None:
+                stores[camera.name].persist(message)
+                publisher.publish(json.dumps(message))
+            stores[camera.name].close()
+        publisher.close()
+
+    elapsed = time.perf_counter() - start
+    print(pipeline.summary())
+    if batches:
+        print(f"{batches} Detector-Aufrufe, im Mittel {batch_frames / batches:.1f} Frames pro Batch")
+    for camera in cameras:
+        fps = camera.frames / elapsed if elapsed > 0 else 0.0
+        print(f"{camera.name}: {camera.frames} Frames ({fps:.1f} FPS), {camera.inferences} Inferenzen, "
+              f"{camera.frames_source.dropped} Frames übersprungen")
+    pipeline.raise_if_failed()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import json
+import os
+import queue
+
+# Quellen für Belegungsänderungen, z. B. für die Live-Heatmap.
+# Jede Quelle hat poll(): liefert die seit dem letzten Aufruf geänderten Parkplatz-Zustände
+# ({"id", "car", "license_plate"}) als Liste, ohne zu blockieren.
+
+
+# Änderungen aus einer DeltaPublisher-Nachricht ("delta" oder "snapshot") extrahieren
+def message_changes(message):
+    if message.get("type") == "delta":
+        return message["changes"]
+    return [
+        {"id": p["id"], "car": p["car"], "license_plate": p.get("license_plate", "")}
+        for p in message.get("parkings", [])
+    ]
+
+
+class QueueSource:
+    """Nachrichten aus einer In-Process-Warteschlange (queue.Queue) lesen."""
+
+    def __init__(self, message_queue):
+        self.queue = message_queue
+
+    def poll(self):
+        changes = []
+        while True:
+            try:
+                message = self.queue.get_nowait()
+            except queue.Empty:
+                return changes
+            changes.extend(message_changes(message))
+
+
+class JournalSource:
+    """Das Journal des OccupancyStore mitlesen (wie tail -f).
+
+    Beim ersten Aufruf und nach jeder Kompaktierung wird zuerst der Snapshot gelesen, danach
+    nur noch neu angehängte Zeilen. Eine Kompaktierung erkennt poll() an der Generation statt
+    an der Größe des Journals: compact() ersetzt den Snapshot atomar (neue Datei) und beginnt
+    das Journal mit anderen Zeilen, auch wenn es bis zum nächsten Aufruf wieder länger als
+    vorher ist. Einträge, die der Snapshot schon enthält (seq <= Snapshot), werden übersprungen.
+    """
+
+    HEAD_BYTES = 64  # Anfang des Journals, an dem ein neu begonnenes Journal erkannt wird
+
+    def __init__(self, snapshot_path="occupancy_state.json", journal_path="occupancy.journal"):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.skipped = 0  # Unlesbare Zeilen
+        self._offset = None
+        self._buffer = b""
+        self._head = b""
+        self._generation = None
+        self._snapshot_seq = 0
+
+    def _read_snapshot(self):
+        self._snapshot_seq = 0
+        try:
+            with open(self.snapshot_path, "r") as snapshot_file:
+                snapshot = json.load(snapshot_file)
+            states = list(snapshot["slots"].values())
+            self._snapshot_seq = snapshot.get("seq", 0)
+            return states
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return []
+
+    # Snapshot-Datei als (Inode, Änderungszeit); ändert sich bei jeder Kompaktierung
+    def _snapshot_generation(self):
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    # Beginnt das Journal noch mit denselben Bytes wie beim letzten Lesen?
+    def _same_journal(self):
+        if not self._head:
+            return True
+        try:
+            with open(self.journal_path, "rb") as journal_file:
+                return journal_file.read(len(self._head)) == self._head
+        except FileNotFoundError:
+            return False
+
+    def poll(self):
+        changes = []
+        generation = self._snapshot_generation()
+        try:
+            size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            size = 0
+        if (self._offset is None or generation != self._generation or size < self._offset
+                or not self._same_journal()):
+            changes.extend(self._read_snapshot())
+            self._generation = generation
+            self._offset = 0
+            self._buffer = b""
+            self._head = b""
+        if size == self._offset:
+            return changes
+
+        with open(self.journal_path, "rb") as journal_file:
+            journal_file.seek(self._offset)
+            data = journal_file.read()
+        if self._offset == 0:
+            self._head = data[:self.HEAD_BYTES]
+        self._offset += len(data)
+        self._buffer += data
+
+        # Nur vollständige Zeilen verarbeiten, der Rest wird beim nächsten Aufruf ergänzt
+        lines = self._buffer.split(b"\n")
+        self._buffer = lines.pop()
+        for line in lines:
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+                state = {"id": entry["id"], "car": entry["car"], "license_plate": entry["license_plate"]}
+            except (ValueError, KeyError, TypeError):
+                self.skipped += 1  # Eine kaputte Zeile darf das Mitlesen nicht beenden
+                continue
+            if entry.get("seq", 0) > self._snapshot_seq:
+                changes.append(state)
+        return changes
+
+
+class MqttSource:
+    """Nachrichten der Detektion über einen (lokalen) MQTT-Broker abonnieren."""
+
+    def __init__(self, host="localhost", port=1883, topic="parking/occupancy"):
+        from paho.mqtt import client as mqtt
+
+        self._queue = QueueSource(queue.Queue())
+        self.client = mqtt.Client()
+        self.client.on_message = self._on_message
+        self.client.connect(host, port, keepalive=60)
+        self.client.subscribe(topic)
+        self.client.loop_start()
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            payload = json.loads(msg.payload)
+        except json.JSONDecodeError:
+            print(f"Ungültige Nachricht auf {msg.topic} ignoriert.")
+            return
+        # Vom AzureSender gebündelte Nachrichten sind JSON-Arrays
+        for message in payload if isinstance(payload, list) else [payload]:
+            self._queue.queue.put(message)
+
+    def poll(self):
+        return self._queue.poll()
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
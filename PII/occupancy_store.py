@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import time
+
+from delta_publisher import slot_state
+
+
+# JSON-Datei atomar schreiben: erst temporäre Datei im selben Ordner, dann umbenennen
+def atomic_write_json(path, data, indent=None):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump(data, tmp_file, indent=indent)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Gespeicherte Zustände ({id: {"car", "license_plate", ...}}) auf Parkplätze übertragen
+def restore_states(parkings, states):
+    for parking in parkings:
+        state = states.get(parking["id"])
+        if state is not None:
+            parking["car"] = state["car"]
+            parking["license_plate"] = state["license_plate"]
+
+
+class OccupancyStore:
+    """Laufzeit-Belegung getrennt von der Parkplatz-Geometrie (all_parkings.json).
+
+    Änderungen werden als je eine kompakte JSON-Zeile an ein Journal angehängt. Nach
+    compact_every Einträgen (und bei jedem Snapshot) wird der komplette Zustand aus dem
+    Speicher atomar in die Snapshot-Datei geschrieben und das Journal geleert. Beim Start
+    wird der Snapshot geladen und das Journal darüber abgespielt; Einträge mit einer
+    Sequenznummer <= der des Snapshots sind bereits enthalten und werden übersprungen.
+    """
+
+    def __init__(self, snapshot_path="occupancy_state.json", journal_path="occupancy.journal",
+                 compact_every=1000):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        self.seq = 0
+        self.states = {}
+        self._journal = None
+        self._entries = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.snapshot_path, "r") as snapshot_file:
+                snapshot = json.load(snapshot_file)
+            self.seq = snapshot["seq"]
+            self.states = snapshot["slots"]
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, KeyError) as ex:
+            print(f"Snapshot {self.snapshot_path} unlesbar, starte ohne gespeicherten Zustand: {ex}")
+
+        snapshot_seq = self.seq
+        damaged = False
+        try:
+            with open(self.journal_path, "r") as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        damaged = True  # Unvollständige letzte Zeile nach einem Absturz
+                        break
+                    self._entries += 1
+                    if entry["seq"] <= snapshot_seq:
+                        continue
+                    self.states[entry["id"]] = {
+                        "id": entry["id"], "car": entry["car"], "license_plate": entry["license_plate"],
+                    }
+                    self.seq = max(self.seq, entry["seq"])
+        except FileNotFoundError:
+            pass
+
+        # Sonst würden neue Einträge an die beschädigte Zeile angehängt
+        if damaged:
+            self.compact()
+
+    # Gespeicherte Belegung auf die geladenen Parkplätze übertragen
+    def restore(self, parkings):
+        restore_states(parkings, self.states)
+
+    def append(self, seq, changes):
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a")
+        timestamp = round(time.time(), 3)
+        lines = []
+        for state in changes:
+            self.states[state["id"]] = state
+            lines.append(json.dumps({"seq": seq, "ts": timestamp, **state}, separators=(",", ":")))
+        self._journal.write("\n".join(lines) + "\n")
+        self._journal.flush()
+        self.seq = max(self.seq, seq)
+        self._entries += len(lines)
+        if self._entries >= self.compact_every:
+            self.compact()
+
+    # Snapshot aus dem Speicher atomar schreiben und danach das Journal leeren
+    def compact(self, seq=None, states=None):
+        if states is not None:
+            self.states = {state["id"]: state for state in states}
+        if seq is not None:
+            self.seq = max(self.seq, seq)
+        atomic_write_json(self.snapshot_path, {"seq": self.seq, "slots": self.states})
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, "w")
+        self._entries = 0
+
+    # Nachricht des DeltaPublisher speichern
+    def persist(self, message):
+        if message["type"] == "snapshot":
+            self.compact(message["seq"], [slot_state(p) for p in message["parkings"]])
+        else:
+            self.append(message["seq"], message["changes"])
+
+    def close(self):
+        if self._journal is not None:
+            self.compact()
+            self._journal.close()
+            self._journal = None
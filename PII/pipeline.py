@@ -0,0 +1,178 @@
+import queue
+import threading
+import time
+import traceback
+
+# Markiert das Ende des Datenstroms zwischen zwei Stufen
+STOP = object()
+
+# Verhalten einer vollen Warteschlange
+DROP_OLDEST = "drop_oldest"  # Ältestes Element verwerfen (Live-Kamera, begrenzte Latenz)
+BLOCK = "block"  # Erzeuger warten lassen (Videodatei, kein Frame darf fehlen)
+
+
+class BoundedQueue:
+    """Begrenzte Warteschlange zwischen zwei Stufen mit wählbarem Verhalten bei Überlauf."""
+
+    def __init__(self, maxsize=2, policy=DROP_OLDEST, name=""):
+        if policy not in (DROP_OLDEST, BLOCK):
+            raise ValueError(f"Unbekannte Warteschlangen-Strategie: {policy}")
+        self.name = name
+        self.policy = policy
+        self.dropped = 0
+        self.stop_event = None  # Wird von der Pipeline gesetzt, damit blockierende put() abbrechen
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, item):
+        if self.policy == BLOCK:
+            while True:
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    if self.stop_event is not None and self.stop_event.is_set():
+                        if item is not STOP:
+                            return False
+                        break  # STOP muss ankommen, notfalls auf Kosten des ältesten Elements
+
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    # Wirft queue.Empty, wenn innerhalb von timeout nichts ankommt
+    def get(self, timeout=None):
+        return self._queue.get(timeout=timeout)
+
+    def get_nowait(self):
+        return self._queue.get_nowait()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def empty(self):
+        return self._queue.empty()
+
+
+class Stage(threading.Thread):
+    """Eine Pipeline-Stufe in einem eigenen Thread.
+
+    Ohne inbox ist die Stufe eine Quelle: func() wird wiederholt aufgerufen und liefert
+    ein Element, None (nichts weiterzugeben) oder STOP. Mit inbox wird func(item) für
+    jedes ankommende Element aufgerufen; das Ergebnis geht (falls nicht None) an outbox.
+    """
+
+    def __init__(self, name, func, inbox=None, outbox=None, upstream=()):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.upstream = list(upstream)
+        self.stop_event = threading.Event()
+        self.processed = 0
+        self.busy_time = 0.0
+        self.error = None  # Ausnahme, mit der die Stufe abgebrochen ist
+
+    # Beim Stoppen noch vorhandene Elemente abarbeiten, solange vorgelagerte Stufen laufen
+    def _finished(self):
+        return (
+            self.stop_event.is_set()
+            and self.inbox.empty()
+            and not any(stage.is_alive() for stage in self.upstream)
+        )
+
+    def run(self):
+        try:
+            while True:
+                if self.inbox is None:
+                    if self.stop_event.is_set():
+                        break
+                    start = time.perf_counter()
+                    result = self.func()
+                else:
+                    try:
+                        item = self.inbox.get(timeout=0.1)
+                    except queue.Empty:
+                        if self._finished():
+                            break
+                        continue
+                    if item is STOP:
+                        break
+                    start = time.perf_counter()
+                    result = self.func(item)
+
+                if result is STOP:
+                    break
+                if result is not None:
+                    self.busy_time += time.perf_counter() - start
+                    self.processed += 1
+                    if self.outbox is not None:
+                        self.outbox.put(result)
+        except Exception as ex:
+            print(f"Fehler in Pipeline-Stufe '{self.name}': {ex}")
+            traceback.print_exc()
+            self.error = ex
+            self.stop_event.set()
+        finally:
+            if self.outbox is not None:
+                self.outbox.put(STOP)
+
+
+class Pipeline:
+    """Startet und stoppt eine Kette von Stufen, die über BoundedQueues verbunden sind."""
+
+    def __init__(self):
+        self.stop_event = threading.Event()
+        self.stages = []
+        self.queues = []
+
+    def queue(self, maxsize=2, policy=DROP_OLDEST, name=""):
+        q = BoundedQueue(maxsize, policy, name)
+        q.stop_event = self.stop_event
+        self.queues.append(q)
+        return q
+
+    def stage(self, name, func, inbox=None, outbox=None, upstream=()):
+        stage = Stage(name, func, inbox, outbox, upstream)
+        stage.stop_event = self.stop_event
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self, timeout=5.0):
+        self.stop_event.set()
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def is_running(self):
+        return any(stage.is_alive() for stage in self.stages)
+
+    # Stufen, die mit einer Ausnahme abgebrochen sind (und damit die ganze Pipeline gestoppt haben)
+    @property
+    def failed(self):
+        return [stage for stage in self.stages if stage.error is not None]
+
+    # Nach stop() und dem Aufräumen: mit Fehlerstatus beenden, wenn eine Stufe abgebrochen ist
+    def raise_if_failed(self):
+        if self.failed:
+            names = ", ".join(stage.name for stage in self.failed)
+            raise SystemExit(f"Abbruch wegen eines Fehlers in Pipeline-Stufe {names}")
+
+    # Kurzer Überblick für die Konsole: verarbeitete Elemente, Zeit pro Element, verworfene Elemente
+    def summary(self):
+        lines = []
+        for stage in self.stages:
+            per_item = stage.busy_time / stage.processed * 1000 if stage.processed else 0.0
+            lines.append(f"{stage.name}: {stage.processed} Elemente, {per_item:.1f} ms/Element")
+        for q in self.queues:
+            lines.append(f"Warteschlange {q.name}: {q.dropped} verworfen")
+        return "\n".join(lines)
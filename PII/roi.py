@@ -0,0 +1,131 @@
+import math
+
+import cv2
+import numpy as np
+
+
+# Auf ein Vielfaches von 32 aufrunden (YOLO-Stride) und begrenzen
+def _round_imgsz(size, min_imgsz, max_imgsz):
+    return int(min(max(math.ceil(size / 32) * 32, min_imgsz), max_imgsz))
+
+
+# Typische Parkplatzgröße in Pixeln (Median der kürzeren Bounding-Box-Seite)
+def median_slot_size(bboxes):
+    if len(bboxes) == 0:
+        return 0.0
+    sides = np.minimum(bboxes[:, 2] - bboxes[:, 0], bboxes[:, 3] - bboxes[:, 1]) + 1
+    return float(np.median(sides))
+
+
+# Bildgröße für YOLO, bei der ein Parkplatz im Ausschnitt noch mindestens target_px groß ist
+def choose_imgsz(region_size, slot_size, target_px=32, min_imgsz=320, max_imgsz=1280):
+    if slot_size <= 0:
+        return max_imgsz
+    return _round_imgsz(target_px * region_size / slot_size, min_imgsz, max_imgsz)
+
+
+# Rechtecke (x1, y1, x2, y2) um alle Parkplätze: zusammenhängende Bereiche der um margin
+# vergrößerten Parkplatz-Maske; bei zu vielen Bereichen ein einziges umschließendes Rechteck
+def slot_regions(slot_raster, margin=40, max_regions=4):
+    mask = (slot_raster >= 0).astype(np.uint8)
+    if not mask.any():
+        return []
+    kernel = np.ones((2 * margin + 1, 2 * margin + 1), np.uint8)
+    mask = cv2.dilate(mask, kernel)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+    regions = [
+        (int(x), int(y), int(x + w - 1), int(y + h - 1))
+        for x, y, w, h, _ in stats[1:count]
+    ]
+    if len(regions) > max_regions:
+        xs1, ys1, xs2, ys2 = zip(*regions)
+        regions = [(min(xs1), min(ys1), max(xs2), max(ys2))]
+    return regions
+
+
+# Bereich in überlappende Kacheln mit höchstens tile_size Seitenlänge zerlegen
+def tile_region(region, tile_size, overlap):
+    x1, y1, x2, y2 = region
+    tile_size = max(int(tile_size), overlap + 1)
+    step = tile_size - overlap
+
+    def starts(lo, hi):
+        if hi - lo + 1 <= tile_size:
+            return [lo]
+        positions = list(range(lo, hi - tile_size + 1, step))
+        positions.append(hi - tile_size + 1)  # Letzte Kachel bündig am Rand
+        return positions
+
+    return [
+        (x, y, min(x + tile_size - 1, x2), min(y + tile_size - 1, y2))
+        for y in starts(y1, y2)
+        for x in starts(x1, x2)
+    ]
+
+
+class RoiDetector:
+    """Führt YOLO nur auf Ausschnitten aus, die die Parkplätze abdecken.
+
+    Die Ausschnitte und die Inferenz-Bildgröße (imgsz) werden einmal aus der Geometrie
+    berechnet: imgsz wird so gewählt, dass ein typischer Parkplatz im skalierten Ausschnitt
+    mindestens target_px Pixel groß bleibt. Reicht max_imgsz dafür nicht, wird der Bereich
+    gekachelt. Die Detektionen werden in Frame-Koordinaten zurückgerechnet und Doppelte aus
+    überlappenden Kacheln per NMS entfernt. predict() nimmt einen Detector (detector.py)
+    und liefert ein Array im Format von results[0].boxes.data (x1, y1, x2, y2, conf, cls).
+    Exportierte Modelle mit fester Eingabegröße ignorieren die gewählte imgsz.
+    """
+
+    def __init__(self, index, target_px=32, min_imgsz=320, max_imgsz=1280, margin=40, iou_threshold=0.5):
+        self.target_px = target_px
+        self.min_imgsz = min_imgsz
+        self.max_imgsz = max_imgsz
+        self.margin = margin
+        self.iou_threshold = iou_threshold
+        self.set_slots(index)
+
+    def set_slots(self, index):
+        slot_size = median_slot_size(index.bboxes)
+        # Größte Kachel, in der ein Parkplatz bei max_imgsz noch target_px groß ist
+        max_tile = self.max_imgsz * slot_size / self.target_px if slot_size else self.max_imgsz
+        overlap = int(slot_size) + self.margin
+
+        self.crops = []  # Liste von ((x1, y1, x2, y2), imgsz)
+        for region in slot_regions(index.raster, self.margin):
+            for tile in tile_region(region, max_tile, overlap):
+                size = max(tile[2] - tile[0], tile[3] - tile[1]) + 1
+                imgsz = choose_imgsz(size, slot_size, self.target_px, self.min_imgsz, self.max_imgsz)
+                self.crops.append((tile, imgsz))
+
+    def predict(self, detector, frame):
+        if not self.crops:
+            return np.zeros((0, 6), np.float32)
+
+        # Ausschnitte mit gleicher imgsz gemeinsam als Batch an den Detector geben
+        groups = {}
+        for (x1, y1, x2, y2), imgsz in self.crops:
+            groups.setdefault(imgsz, []).append((x1, y1, frame[y1:y2 + 1, x1:x2 + 1]))
+
+        parts = []
+        for imgsz, crops in groups.items():
+            results = detector.predict([crop for _, _, crop in crops], imgsz=imgsz)
+            for (x1, y1, _), data in zip(crops, results):
+                data = data.copy()
+                data[:, [0, 2]] += x1
+                data[:, [1, 3]] += y1
+                parts.append(data)
+
+        detections = np.concatenate(parts) if parts else np.zeros((0, 6), np.float32)
+        if len(self.crops) > 1 and len(detections) > 1:
+            detections = self._deduplicate(detections)
+        return detections
+
+    # Doppelte Boxen aus überlappenden Kacheln entfernen (NMS pro Klasse)
+    def _deduplicate(self, detections):
+        keep = []
+        for class_id in np.unique(detections[:, 5]):
+            indices = np.flatnonzero(detections[:, 5] == class_id)
+            boxes = detections[indices, :4]
+            xywh = np.column_stack((boxes[:, :2], boxes[:, 2:] - boxes[:, :2])).tolist()
+            kept = cv2.dnn.NMSBoxes(xywh, detections[indices, 4].tolist(), 0.0, self.iou_threshold)
+            keep.extend(indices[np.asarray(kept, np.int64).reshape(-1)].tolist())
+        return detections[sorted(keep)]
@@ -0,0 +1,99 @@
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Aufbau des Headers (int64): geschriebene Frames, gelesene Frames, Quelle zu Ende,
+# danach eine Sequenznummer pro Slot (-1 = wird gerade beschrieben)
+_HEAD, _TAIL, _FINISHED = 0, 1, 2
+_SEQ = 4
+
+
+class FrameRing:
+    """Ringpuffer für Frames fester Größe in multiprocessing.shared_memory.
+
+    Genau ein Prozess schreibt (Decoder), genau einer liest (Inferenz). Frames werden
+    direkt in den gemeinsamen Speicher kopiert statt gepickelt. Mit drop=True liest
+    take() immer das neueste Frame (ältere werden übersprungen), mit drop=False der Reihe
+    nach; der Schreiber wartet dann, solange der Ring voll ist. Jeder Slot trägt eine
+    Sequenznummer, damit ein während des Kopierens überschriebenes Frame erkannt wird.
+    """
+
+    def __init__(self, shape, slots=4, name=None, drop=True):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.drop = drop
+        self.dropped = 0
+        self._owner = name is None
+        frame_bytes = int(np.prod(self.shape))
+        header_bytes = ((_SEQ + slots) * 8 + 63) // 64 * 64
+
+        if self._owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_bytes + slots * frame_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.header = np.ndarray((_SEQ + slots,), np.int64, buffer=self.shm.buf)
+        self.frames = np.ndarray((slots,) + self.shape, np.uint8, buffer=self.shm.buf, offset=header_bytes)
+        if self._owner:
+            self.header[:] = 0
+        self._last = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # Parameter, mit denen ein anderer Prozess denselben Ring öffnet
+    def spec(self):
+        return {"shape": self.shape, "slots": self.slots, "name": self.name, "drop": self.drop}
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(**spec)
+
+    # Frame schreiben (Decoder-Seite); False, wenn bei drop=False auf Platz gewartet und abgebrochen wurde
+    def write(self, frame, stop_event=None):
+        head = int(self.header[_HEAD])
+        if not self.drop:
+            while head - int(self.header[_TAIL]) >= self.slots:
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                time.sleep(0.001)
+        slot = head % self.slots
+        self.header[_SEQ + slot] = -1
+        self.frames[slot] = frame
+        self.header[_SEQ + slot] = head + 1
+        self.header[_HEAD] = head + 1
+        return True
+
+    def finish(self):
+        self.header[_FINISHED] = 1
+
+    # Nächstes bzw. neuestes Frame als Kopie abholen (Inferenz-Seite), None wenn nichts Neues da ist
+    def take(self):
+        while True:
+            head = int(self.header[_HEAD])
+            if head == self._last:
+                return None
+            number = head if self.drop else self._last + 1
+            slot = (number - 1) % self.slots
+            frame = self.frames[slot].copy()
+            if int(self.header[_SEQ + slot]) == number:
+                self.dropped += number - self._last - 1  # Erst nach dem Lesen zählen, nicht pro Versuch
+                self._last = number
+                self.header[_TAIL] = number
+                return frame
+            # Slot wurde während des Kopierens überschrieben: neu versuchen
+
+    def exhausted(self):
+        return bool(self.header[_FINISHED]) and int(self.header[_HEAD]) == self._last
+
+    def stop(self):
+        pass
+
+    def close(self):
+        # Erst die NumPy-Sichten freigeben, sonst lässt sich der Speicher nicht schließen
+        del self.header
+        del self.frames
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
@@ -0,0 +1,131 @@
+import json
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from slot_geometry import NO_SLOT, SlotIndex
+
+# Ergebnis einer Zuordnung: nur Detektionen der Zielklassen, je eine Zeile pro Fahrzeug
+Assignment = namedtuple("Assignment", ["boxes", "centers", "class_ids", "slot_ids"])
+
+
+# Detektionen (Torch-Tensor oder Array) in ein NumPy-Array (N, >=6) umwandeln
+def to_numpy(detections):
+    if hasattr(detections, "cpu"):
+        detections = detections.cpu().numpy()
+    detections = np.asarray(detections, dtype=np.float32)
+    if detections.ndim != 2 or detections.shape[0] == 0:
+        return np.zeros((0, 6), np.float32)
+    return detections
+
+
+# Lookup-Tabelle Klassen-ID -> relevant (z. B. 'car' in class_name)
+def build_class_mask(class_list, target_classes=("car",)):
+    return np.array([any(t in name for t in target_classes) for name in class_list], dtype=bool)
+
+
+class SlotEngine:
+    """Ordnet Fahrzeug-Detektionen über ein vorberechnetes Label-Bild den Parkplätzen zu."""
+
+    def __init__(self, path="all_parkings.json", class_list=(), target_classes=("car",), check_interval=1.0):
+        self.path = path
+        self.class_list = list(class_list)
+        self.class_mask = build_class_mask(self.class_list, target_classes)
+        self.check_interval = check_interval
+
+        # Referenzen bleiben stabil, damit Skripte sie weiterverwenden können
+        self.global_coordinates = {}
+        self.parkings = []
+        self.ids = []
+        self.polygons = []
+        self.index = None
+
+        self._mtime = None
+        self._geometry = None
+        self._next_check = 0.0
+        self.reload_if_changed(force=True)
+
+    # Slot-Datei nur neu rastern, wenn sich die Geometrie tatsächlich geändert hat
+    def reload_if_changed(self, force=False):
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        with open(self.path, "r") as json_file:
+            data = json.load(json_file)
+
+        global_coordinates = data["global_coordinates"]
+        parkings = data["parkings"]
+        geometry = (
+            tuple(global_coordinates["ur"]), tuple(global_coordinates["ul"]),
+            tuple((p["id"], tuple(map(tuple, p["coordinates"]))) for p in parkings),
+        )
+        if geometry == self._geometry:
+            return False  # Nur der Belegungsstatus wurde geschrieben
+        self._geometry = geometry
+
+        # Belegungsstatus bereits bekannter Parkplätze übernehmen
+        previous = {p["id"]: p for p in self.parkings}
+        for parking in parkings:
+            if parking["id"] in previous:
+                parking["car"] = previous[parking["id"]]["car"]
+                parking["license_plate"] = previous[parking["id"]].get("license_plate", "")
+
+        self.global_coordinates.clear()
+        self.global_coordinates.update(global_coordinates)
+        self.parkings[:] = parkings
+        # Neue Listen statt Änderung vor Ort, damit andere Threads eine konsistente Sicht behalten
+        self.ids = [p["id"] for p in parkings]
+        self.index = SlotIndex(
+            [p["coordinates"] for p in parkings], global_coordinates["ur"][0], global_coordinates["ul"][1]
+        )
+        self.polygons = self.index.polygons
+        print(f"Parkplatz-Raster neu berechnet ({len(parkings)} Parkplätze).")
+        return True
+
+    # Alle Detektionen eines Frames mit einem vektorisierten Zugriff auf das Raster zuordnen
+    def assign(self, detections):
+        data = to_numpy(detections)
+        class_ids = data[:, 5].astype(np.int32)
+        valid = (class_ids >= 0) & (class_ids < len(self.class_mask))
+        valid[valid] = self.class_mask[class_ids[valid]]
+        data, class_ids = data[valid], class_ids[valid]
+
+        boxes = data[:, :4].astype(np.int32)
+        centers = np.stack(((boxes[:, 0] + boxes[:, 2]) // 2, (boxes[:, 1] + boxes[:, 3]) // 2), axis=1)
+
+        slot_ids = self.index.query_points(centers[:, 0], centers[:, 1])
+        return Assignment(boxes, centers, class_ids, slot_ids)
+
+    # Belegung je Parkplatz (True = mindestens ein Fahrzeug im Polygon)
+    def occupancy(self, assignment):
+        slot_ids = assignment.slot_ids
+        return np.bincount(slot_ids[slot_ids >= 0], minlength=len(self.parkings)) > 0
+
+    # "car"-Attribut der Parkplätze an die Belegung anpassen; liefert die geänderten Parkplätze
+    def apply_occupancy(self, occupied):
+        changed = []
+        for parking, is_occupied in zip(self.parkings, occupied.tolist()):
+            if parking["car"] != is_occupied:
+                parking["car"] = is_occupied
+                changed.append(parking)
+        return changed
+
+    # Autos innerhalb eines Parkplatzes als Python-Werte (für das Zeichnen mit OpenCV)
+    def cars_in_slots(self, assignment):
+        matched = assignment.slot_ids >= 0
+        return zip(
+            assignment.boxes[matched].tolist(), assignment.centers[matched].tolist(),
+            assignment.class_ids[matched].tolist(), assignment.slot_ids[matched].tolist(),
+        )
@@ -0,0 +1,110 @@
+import cv2
+import numpy as np
+
+# Wert im Label-Bild für Pixel, die zu keinem Parkplatz gehören
+NO_SLOT = -1
+
+
+class SlotIndex:
+    """Räumlicher Index über alle Parkplatz-Polygone eines Bildes.
+
+    Punktabfragen laufen über ein Label-Bild (Pixelwert = Index des Parkplatzes) und kosten
+    unabhängig von der Anzahl der Parkplätze einen Array-Zugriff. Für Abfragen mit einem
+    Rechteck (z. B. Fahrzeug-Box) liegen die Bounding-Boxen der Polygone zusätzlich in einem
+    gleichmäßigen Raster aus Buckets der Größe cell_size; geprüft werden nur die Parkplätze
+    in den Buckets, die das Rechteck berührt. Überlappen sich Polygone, gewinnt im Label-Bild
+    das zuletzt hinzugefügte.
+    """
+
+    def __init__(self, polygons, width, height, cell_size=64):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.raster = np.full((height, width), NO_SLOT, np.int32)
+        self.polygons = []
+        self.buckets = {}
+        self._bbox_list = []
+        self._bboxes = None
+        for polygon in polygons:
+            self.add(polygon)
+
+    # Polygon hinzufügen, ohne den restlichen Index neu aufzubauen; liefert seinen Index
+    def add(self, polygon):
+        index = len(self.polygons)
+        area = np.array(polygon, np.int32).reshape(-1, 2)
+        self.polygons.append(area)
+        cv2.fillPoly(self.raster, [area], index)
+
+        x1, y1 = area.min(axis=0).tolist()
+        x2, y2 = area.max(axis=0).tolist()
+        self._bbox_list.append((x1, y1, x2, y2))
+        self._bboxes = None
+        for cell in self._cells(x1, y1, x2, y2):
+            self.buckets.setdefault(cell, []).append(index)
+        return index
+
+    # Polygon entfernen, ohne den Index neu aufzubauen; alle späteren Indizes rücken um eins nach vorn
+    def remove(self, index):
+        area = self.polygons.pop(index)
+        x1, y1, x2, y2 = self._bbox_list.pop(index)
+        self._bboxes = None
+        for cell in self._cells(x1, y1, x2, y2):
+            self.buckets[cell].remove(index)
+        for members in self.buckets.values():
+            members[:] = [member - 1 if member > index else member for member in members]
+
+        # Pixel des Polygons erhalten den Parkplatz darunter (falls überlappend), dann nachrücken
+        x1, y1 = max(x1, 0), max(y1, 0)
+        window = self.raster[y1:y2 + 1, x1:x2 + 1]
+        freed = window == index
+        patch = np.full(window.shape, NO_SLOT, np.int32)
+        for other in self.query_box(x1, y1, x2, y2):
+            label = other if other < index else other + 1  # Raster ist noch nicht nachgerückt
+            cv2.fillPoly(patch, [(self.polygons[other] - (x1, y1)).astype(np.int32)], label)
+        window[freed] = patch[freed]
+        self.raster[self.raster > index] -= 1
+        return area
+
+    # Bounding-Boxen als Array (N, 4) mit x1, y1, x2, y2
+    @property
+    def bboxes(self):
+        if self._bboxes is None:
+            self._bboxes = np.array(self._bbox_list, np.int32).reshape(-1, 4)
+        return self._bboxes
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def _cells(self, x1, y1, x2, y2):
+        size = self.cell_size
+        for cy in range(int(y1) // size, int(y2) // size + 1):
+            for cx in range(int(x1) // size, int(x2) // size + 1):
+                yield cx, cy
+
+    # Parkplatz-Index an einem Punkt oder NO_SLOT
+    def query_point(self, x, y):
+        x, y = int(x), int(y)
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return int(self.raster[y, x])
+        return NO_SLOT
+
+    # Vektorisierte Variante für viele Punkte (z. B. alle Fahrzeug-Mittelpunkte eines Frames)
+    def query_points(self, xs, ys):
+        xs = np.asarray(xs, np.int32)
+        ys = np.asarray(ys, np.int32)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        slot_ids = np.full(xs.shape, NO_SLOT, np.int32)
+        slot_ids[inside] = self.raster[ys[inside], xs[inside]]
+        return slot_ids
+
+    # Indizes aller Parkplätze, deren Bounding-Box das Rechteck schneidet (aufsteigend sortiert)
+    def query_box(self, x1, y1, x2, y2):
+        candidates = set()
+        for cell in self._cells(x1, y1, x2, y2):
+            candidates.update(self.buckets.get(cell, ()))
+        if not candidates:
+            return []
+        candidates = np.fromiter(candidates, np.int64, len(candidates))
+        boxes = self.bboxes[candidates]
+        overlap = (boxes[:, 0] <= x2) & (boxes[:, 2] >= x1) & (boxes[:, 1] <= y2) & (boxes[:, 3] >= y1)
+        return sorted(candidates[overlap].tolist())
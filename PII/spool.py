@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from metrics import log
+
+# Begrenzter Puffer auf der Festplatte für Nachrichten, die gerade nicht gesendet werden können
+# (Broker bzw. IoT Hub nicht erreichbar). Die Nutzdaten liegen in einer vorab angelegten
+# Segmentdatei, die als Ring beschrieben wird; die Verwaltung (Position, Länge und CRC jeder
+# Nachricht, Anfang und Ende) liegt in einer Indexdatei, die über np.memmap eingeblendet ist.
+# Nach einem Neustart wird der Rest des Puffers einfach weiter gesendet.
+
+DATA_FILE = "spool.dat"
+INDEX_FILE = "spool.idx"
+MAGIC = b"PSPOOL1"
+
+# IoT Hub erlaubt maximal 256 KB pro Nachricht, etwas Reserve für Header lassen
+MAX_BATCH_BYTES = 200_000
+
+HEADER = np.dtype([("magic", "S8"), ("capacity", "<u8"), ("data_size", "<u8"), ("head", "<u8"),
+                   ("tail", "<u8"), ("write_pos", "<u8"), ("dropped", "<u8")])
+ENTRY = np.dtype([("offset", "<u8"), ("length", "<u4"), ("crc", "<u4")])
+
+
+class PublishSpool:
+    """Nachrichten in Sendereihenfolge, begrenzt auf capacity Nachrichten und data_size Bytes.
+
+    head und tail zählen Nachrichten fortlaufend; Nachricht n steht im Index an Stelle
+    n % capacity. Ist der Puffer voll, wird wie bei DROP_OLDEST die älteste Nachricht
+    verworfen, in dropped gezählt und on_drop() aufgerufen. Gelesen wird mit peek(), erst ack() gibt die
+    Nachrichten frei, sobald der Empfänger sie bestätigt hat. peek() liefert dazu die Nummer der
+    ersten gelesenen Nachricht mit: werden zwischen peek() und ack() älteste Nachrichten
+    verworfen, gibt ack() trotzdem nur die tatsächlich gesendeten frei. Nicht synchronisiert auf die Platte
+    geschrieben wird nur bei close(): Abstürze des Prozesses überstehen die Daten im
+    Seitencache des Betriebssystems, nur ein Stromausfall nicht.
+    """
+
+    def __init__(self, directory="spool", capacity=100_000, data_size=64 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.on_drop = None  # Z. B. DeltaPublisher.request_snapshot: Empfänger haben Deltas verpasst
+        self._lock = threading.Lock()
+        index_path = os.path.join(directory, INDEX_FILE)
+        if not os.path.exists(index_path):
+            self._create(index_path, capacity, data_size)
+        self._header = np.memmap(index_path, HEADER, mode="r+", shape=(1,))
+        if self._header["magic"][0] != MAGIC:
+            raise ValueError(f"{index_path} ist keine Spool-Indexdatei")
+        self.capacity = int(self._header["capacity"][0])
+        self.data_size = int(self._header["data_size"][0])
+        self._entries = np.memmap(index_path, ENTRY, mode="r+", offset=HEADER.itemsize, shape=(self.capacity,))
+        self._fd = os.open(os.path.join(directory, DATA_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        os.ftruncate(self._fd, self.data_size)
+        self._check()
+        if len(self):
+            log.info("Spool %s: %d Nachricht(en) aus dem letzten Lauf noch zu senden.", directory, len(self))
+
+    @staticmethod
+    def _create(index_path, capacity, data_size):
+        header = np.zeros(1, HEADER)
+        header["magic"] = MAGIC
+        header["capacity"] = capacity
+        header["data_size"] = data_size
+        with open(index_path, "wb") as index_file:
+            index_file.write(header.tobytes())
+            index_file.truncate(HEADER.itemsize + capacity * ENTRY.itemsize)
+
+    # Nach einem Absturz: Nachrichten ab der ersten mit falscher Prüfsumme verwerfen
+    def _check(self):
+        for seq in range(self.head, self.tail):
+            entry = self._entries[seq % self.capacity]
+            data = os.pread(self._fd, int(entry["length"]), int(entry["offset"]))
+            if zlib.crc32(data) != entry["crc"]:
+                log.warning("Spool %s: %d unvollständige Nachricht(en) verworfen.", self.directory, self.tail - seq)
+                self._set(tail=seq)
+                break
+
+    def _get(self, field):
+        return int(self._header[field][0])
+
+    def _set(self, **values):
+        for field, value in values.items():
+            self._header[field] = value
+
+    @property
+    def head(self):
+        return self._get("head")
+
+    @property
+    def tail(self):
+        return self._get("tail")
+
+    @property
+    def dropped(self):
+        return self._get("dropped")
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def _drop_oldest(self):
+        self._set(head=self.head + 1, dropped=self.dropped + 1)
+        if self.on_drop is not None:
+            self.on_drop()
+
+    # Nachricht (str oder bytes) anhängen; bei vollem Puffer die ältesten verwerfen
+    def append(self, payload):
+        data = payload.encode() if isinstance(payload, str) else payload
+        if len(data) > self.data_size:
+            raise ValueError(f"Nachricht mit {len(data)} Byte ist größer als der Spool ({self.data_size} Byte)")
+        with self._lock:
+            if not len(self):
+                self._set(write_pos=0)
+            pos = self._get("write_pos")
+            if pos + len(data) > self.data_size:
+                # Das Ende der Datei reicht nicht: dort liegende (älteste) Nachrichten aufgeben, vorne weiter
+                while len(self) and self._entries[self.head % self.capacity]["offset"] >= pos:
+                    self._drop_oldest()
+                pos = 0
+            while len(self) and (len(self) >= self.capacity or self._overlaps(pos, len(data))):
+                self._drop_oldest()
+
+            os.pwrite(self._fd, data, pos)
+            tail = self.tail
+            self._entries[tail % self.capacity] = (pos, len(data), zlib.crc32(data))
+            self._set(tail=tail + 1, write_pos=pos + len(data))
+
+    # Überschneidet sich der Bereich mit der ältesten Nachricht?
+    def _overlaps(self, pos, length):
+        oldest = self._entries[self.head % self.capacity]
+        start = int(oldest["offset"])
+        return pos < start + int(oldest["length"]) and start < pos + length
+
+    # Älteste Nachrichten lesen, ohne sie zu entfernen (höchstens limit Stück bzw. max_bytes);
+    # liefert (Nummer der ersten Nachricht, Nachrichten)
+    def peek(self, limit=100, max_bytes=None):
+        payloads = []
+        size = 0
+        with self._lock:
+            start = self.head
+            for seq in range(start, min(self.tail, start + limit)):
+                entry = self._entries[seq % self.capacity]
+                length = int(entry["length"])
+                if max_bytes is not None and payloads and size + length > max_bytes:
+                    break
+                payloads.append(os.pread(self._fd, length, int(entry["offset"])).decode())
+                size += length
+        return start, payloads
+
+    # Die count ab Nummer start gelesenen Nachrichten als gesendet markieren; inzwischen
+    # verworfene Nachrichten verschieben den Anfang nicht über noch ungesendete hinaus
+    def ack(self, start, count):
+        with self._lock:
+            self._set(head=max(self.head, min(start + count, self.tail)))
+
+    def close(self):
+        self._header.flush()
+        self._entries.flush()
+        os.fsync(self._fd)
+        os.close(self._fd)
+
+
+# Füllstand und Verluste des Spools als Metriken (vgl. Metrics.watch_pipeline)
+def watch_spool(metrics, spool):
+    metrics.describe("spool_appended_total", "counter", "Im Spool abgelegte Nachrichten")
+    metrics.describe("spool_drained_total", "counter", "Aus dem Spool nachgesendete Nachrichten")
+    metrics.collect("spool_messages", "gauge", "Nachrichten im Spool", lambda: [({}, len(spool))])
+    metrics.collect("spool_dropped_total", "counter", "Wegen vollem Spool verworfene Nachrichten",
+                    lambda: [({}, spool.dropped)])
+
+
+class RateLimiter:
+    """Token Bucket: höchstens rate Nachrichten pro Sekunde, Spitzen bis burst."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.last = time.monotonic()
+
+    # Wartezeit in Sekunden, bis count Nachrichten gesendet werden dürfen (werden sofort verbucht)
+    def delay(self, count):
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= count
+        return max(-self.tokens / self.rate, 0.0)
+
+
+# Mehrere JSON-Nachrichten als ein JSON-Array (wie die Batches des AzureSender)
+def batch_payload(payloads):
+    if len(payloads) == 1:
+        return payloads[0]
+    return "[" + ",".join(payloads) + "]"
@@ -0,0 +1,67 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Misst die Phasen des Programmstarts bis zum ersten verarbeiteten Frame.
+
+    Phasen können nacheinander (phase()) oder gleichzeitig in Threads (run_concurrently())
+    laufen; der Bericht zeigt pro Phase Beginn und Dauer relativ zum Start, sodass sichtbar
+    wird, welche Phase den Start tatsächlich verzögert.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []  # (Name, Beginn, Dauer) in Sekunden seit dem Start
+        self._lock = threading.Lock()
+
+    def add(self, name, begin):
+        end = time.perf_counter()
+        with self._lock:
+            self.phases.append((name, begin - self.started, end - begin))
+
+    @contextmanager
+    def phase(self, name):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, begin)
+
+    # Awaitable messen (für asyncio, z. B. Verbindungsaufbau zum IoT Hub)
+    async def measure(self, name, awaitable):
+        begin = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.add(name, begin)
+
+    # Aufgaben {Name: Funktion} gleichzeitig ausführen; liefert {Name: Ergebnis}.
+    # Der erste Fehler einer Aufgabe wird nach dem Ende aller Aufgaben erneut ausgelöst.
+    def run_concurrently(self, tasks):
+        results = {}
+        errors = []
+
+        def run(name, func):
+            try:
+                with self.phase(name):
+                    results[name] = func()
+            except BaseException as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=run, args=item, name=item[0], daemon=True) for item in tasks.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def report(self, title="Start"):
+        total = time.perf_counter() - self.started
+        lines = [f"{title}: {total:.2f} s bis zum ersten Frame"]
+        for name, begin, duration in sorted(self.phases, key=lambda phase: phase[1]):
+            lines.append(f"  {name:<12} {duration:6.2f} s  ({begin:.2f} - {begin + duration:.2f})")
+        return "\n".join(lines)
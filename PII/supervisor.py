@@ -0,0 +1,176 @@
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+
+from metrics import setup_logging
+from monitor import FRAME_SIZE, load_class_list
+from multi_camera import build_parser, camera_store
+from mqtt_publisher import connect_broker
+from shm_ring import FrameRing
+
+# Verteilung auf mehrere CPU-Kerne: ein Decoder-Prozess pro Kamera schreibt Frames in einen
+# Ringpuffer im Shared Memory, Inferenz-Prozesse werten jeweils mehrere Kameras aus und
+# schicken nur die kompakten Belegungs-Nachrichten an diesen Prozess, der speichert und sendet.
+#
+# Beispiel:
+#   python supervisor.py --cameras-per-worker 4 --camera cam1.mp4 lot1.json --camera cam2.mp4 lot2.json ...
+
+FRAME_SHAPE = (FRAME_SIZE[1], FRAME_SIZE[0], 3)
+DONE = "__done__"
+
+
+# Decoder-Prozess: Frames lesen, skalieren und in den Ringpuffer schreiben
+def decode_worker(source, ring_spec, stop_event):
+    import cv2
+
+    cv2.setNumThreads(1)  # Ein Kern pro Decoder, die Parallelität kommt über die Prozesse
+    ring = FrameRing.attach(ring_spec)
+    cap = cv2.VideoCapture(source)
+    try:
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if not ring.write(cv2.resize(frame, FRAME_SIZE), stop_event):
+                break
+    finally:
+        ring.finish()
+        cap.release()
+        ring.close()
+
+
+# Inferenz-Prozess: mehrere Kameras mit gebündelten Detector-Aufrufen auswerten
+def inference_worker(worker_id, specs, args, out_queue, stop_event):
+    from detector import load_detector
+    from multi_camera import Camera, run_round
+
+    setup_logging(args.log_level)  # "spawn": Logging-Einstellungen werden nicht vererbt
+
+    class_list = load_class_list()
+
+    cameras = [
+        Camera(spec["name"], FrameRing.attach(spec["ring"]), spec["slot_path"], class_list, args,
+               spec["states"], spec["seq"])
+        for spec in specs
+    ]
+    detector = load_detector(args.backend, args.model, class_list, args.classes, threads=args.threads_per_worker)
+    calls = 0
+    start = time.perf_counter()
+    try:
+        while not stop_event.is_set():
+            result = run_round(cameras, detector, args.max_batch)
+            if result is None:
+                if all(camera.frames_source.exhausted() for camera in cameras):
+                    break
+                time.sleep(0.002)
+                continue
+            messages, round_calls, _ = result
+            calls += round_calls
+            for camera, message in messages:
+                out_queue.put((camera.name, message))
+    finally:
+        for camera in cameras:
+            message = camera.finish()
+            if message is not None:
+                out_queue.put((camera.name, message))
+        elapsed = time.perf_counter() - start
+        stats = {
+            "worker": worker_id,
+            "calls": calls,
+            "cameras": [
+                {"name": camera.name, "frames": camera.frames, "inferences": camera.inferences,
+                 "dropped": camera.frames_source.dropped, "fps": camera.frames / elapsed if elapsed > 0 else 0.0}
+                for camera in cameras
+            ],
+        }
+        for camera in cameras:
+            camera.frames_source.close()
+        out_queue.put((DONE, stats))
+
+
+def main():
+    parser = build_parser("Kameras auf mehrere Prozesse verteilen (Shared-Memory-Frames)")
+    parser.add_argument("--cameras-per-worker", type=int, default=4, help="Kameras pro Inferenz-Prozess")
+    parser.add_argument("--threads-per-worker", type=int, default=0,
+                        help="Inferenz-Threads pro Prozess (0 = Kerne gleichmäßig aufteilen)")
+    parser.add_argument("--ring-slots", type=int, default=4, help="Frames pro Ringpuffer")
+    args = parser.parse_args()
+    setup_logging(args.log_level)
+
+    groups = [args.camera[i:i + args.cameras_per_worker] for i in range(0, len(args.camera), args.cameras_per_worker)]
+    if args.threads_per_worker <= 0:
+        args.threads_per_worker = max(1, (os.cpu_count() or 1) // len(groups))
+
+    # "spawn" startet saubere Prozesse ohne geerbte Threads (OpenCV, MQTT)
+    ctx = mp.get_context("spawn")
+    stop_event = ctx.Event()
+    out_queue = ctx.Queue()
+
+    rings = []
+    stores = {}
+    decoders = []
+    workers = []
+    index = 0
+    for worker_id, group in enumerate(groups):
+        specs = []
+        for source, slot_path in group:
+            name = f"cam{index}"
+            index += 1
+            source = int(source) if source.isdigit() else source
+            ring = FrameRing(FRAME_SHAPE, args.ring_slots, drop=not args.no_drop)
+            rings.append(ring)
+            stores[name] = camera_store(name)
+            decoders.append(ctx.Process(target=decode_worker, args=(source, ring.spec(), stop_event), daemon=True))
+            specs.append({"name": name, "slot_path": slot_path, "ring": ring.spec(),
+                          "states": stores[name].states, "seq": stores[name].seq})
+        workers.append(ctx.Process(target=inference_worker, args=(worker_id, specs, args, out_queue, stop_event),
+                                   daemon=True))
+
+    # Nur dieser Prozess sendet; Snapshots entstehen in den Inferenz-Prozessen, verworfene
+    # Deltas im Spool gleicht deshalb erst der nächste periodische Snapshot aus
+    publisher = connect_broker(args)
+
+    for process in decoders + workers:
+        process.start()
+    print(f"{len(decoders)} Decoder- und {len(workers)} Inferenz-Prozesse gestartet.")
+
+    finished = 0
+    try:
+        while finished < len(workers):
+            try:
+                name, message = out_queue.get(timeout=0.5)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    print("Alle Inferenz-Prozesse beendet.")
+                    break
+                continue
+            except KeyboardInterrupt:
+                # Prozesse geordnet beenden und ihre letzten Nachrichten noch annehmen
+                print("Beende Prozesse ...")
+                stop_event.set()
+                continue
+
+            if name == DONE:
+                finished += 1
+                for camera in message["cameras"]:
+                    print(f"{camera['name']}: {camera['frames']} Frames ({camera['fps']:.1f} FPS), "
+                          f"{camera['inferences']} Inferenzen, {camera['dropped']} Frames übersprungen")
+                continue
+
+            stores[name].persist(message)
+            publisher.publish(json.dumps(message))
+    finally:
+        stop_event.set()
+        for process in workers + decoders:
+            process.join(5)
+        for ring in rings:
+            ring.close()
+        for store in stores.values():
+            store.close()
+        publisher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Die Skripte liegen flach in PII/ und importieren sich gegenseitig ohne Paket
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Heatmap-Tests zeichnen ohne Fenster
+os.environ.setdefault("MPLBACKEND", "Agg")
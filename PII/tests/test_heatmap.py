@@ -0,0 +1,43 @@
+import numpy as np
+
+from heatmap import BLACK, GREEN_LP, RED_1, WHITE, LiveHeatmap, build_index, generate_heatmap, value_heatmap
+from slot_geometry import NO_SLOT
+
+
+def layout():
+    return {
+        "global_coordinates": {"ul": [0, 120], "ur": [200, 120], "ol": [0, 0], "or": [200, 0]},
+        "parkings": [
+            {"id": "A", "coordinates": [[10, 10], [60, 12], [55, 80], [5, 75]], "car": False, "license_plate": ""},
+            {"id": "B", "coordinates": [[60, 12], [110, 15], [104, 90], [55, 80]], "car": True, "license_plate": ""},
+            {"id": "C", "coordinates": [[150, 40], [230, 40], [230, 150], [150, 150]], "car": True,
+             "license_plate": "AB123"},
+        ],
+    }
+
+
+def test_painting_matches_click_lookup():
+    data = layout()
+    index = build_index(data)
+    heatmap = generate_heatmap(data, index)
+    expected = {NO_SLOT: BLACK, 0: WHITE, 1: RED_1, 2: GREEN_LP}
+    for y in range(heatmap.shape[0]):
+        for x in range(heatmap.shape[1]):
+            assert heatmap[y, x] == expected[index.query_point(x, y)]
+
+
+def test_value_heatmap_uses_same_raster():
+    data = layout()
+    index = build_index(data)
+    values = value_heatmap(data, [0.25, 0.5, 1.0], index)
+    assert np.array_equal(np.isnan(values), index.raster == NO_SLOT)
+    assert np.all(values[index.raster == 1] == 0.5)
+
+
+def test_live_repaint_matches_full_paint():
+    data = layout()
+    live = LiveHeatmap(data)
+    assert live.apply([{"id": "A", "car": True, "license_plate": "XY9"}, {"id": "B", "car": False,
+                                                                       "license_plate": ""}])
+    assert np.array_equal(live.heatmap, generate_heatmap(data))
+    assert not live.apply([{"id": "A", "car": True, "license_plate": "XY9"}])
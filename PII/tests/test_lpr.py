@@ -0,0 +1,140 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from config import load_config
+from lpr import PlateReader, StubRecognizer
+from monitor import ParkingMonitor, load_class_list, open_slots
+
+COCO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "coco.txt")
+CAR_CLASS = 2  # Index von "car" in coco.txt
+
+
+class FixedDetector:
+    """Liefert die zuletzt gesetzten Boxen (Ersatz für detector.Detector)."""
+
+    def __init__(self):
+        self.detections = np.zeros((0, 6), np.float32)
+
+    def detect(self, frame):
+        return self.detections
+
+
+def layout():
+    parkings = []
+    for number in range(3):
+        x = 20 + number * 300
+        parkings.append({"id": f"P{number}", "coordinates": [[x, 100], [x + 250, 100], [x + 250, 400], [x, 400]],
+                         "car": False, "license_plate": ""})
+    return {"global_coordinates": {"ul": [0, 500], "ur": [1020, 500], "ol": [0, 0], "or": [1020, 0]},
+            "parkings": parkings}
+
+
+@pytest.fixture
+def monitor(tmp_path):
+    slots_path = tmp_path / "slots.json"
+    slots_path.write_text(json.dumps(layout()))
+    config = load_config("Test", [
+        "--slots", str(slots_path), "--state", str(tmp_path / "state.json"),
+        "--journal", str(tmp_path / "state.journal"), "--history", "", "--spool", "", "--headless",
+        "--lpr", "stub", "--no-tracking", "--no-motion-gate", "--no-roi",
+        "--window", "3", "--on-votes", "2", "--off-votes", "0",
+    ])
+    class_list = load_class_list(COCO)
+    engine, store, history = open_slots(config, class_list)
+    monitor = ParkingMonitor(config, class_list, FixedDetector(), None, engine, store, history)
+    yield monitor
+    store.close()
+
+
+FRAME = np.random.default_rng(0).integers(0, 255, (500, 1020, 3), np.uint8)
+
+
+# Ein Frame mit Autos auf den Parkplätzen slots auswerten; liefert die neuen Leseaufträge
+def step(monitor, *slots):
+    boxes = [[60 + slot * 300, 150, 230 + slot * 300, 350, 0.9, CAR_CLASS] for slot in slots]
+    monitor.detector.detections = np.array(boxes, np.float32).reshape(-1, 6)
+    monitor.inference(FRAME)
+    while not monitor.publish_queue.empty():
+        monitor.publish_queue.get_nowait()
+    jobs = []
+    while not monitor.lpr_queue.empty():
+        jobs.append(monitor.lpr_queue.get_nowait())
+    return jobs
+
+
+def parking(monitor, parking_id):
+    return next(p for p in monitor.parkings if p["id"] == parking_id)
+
+
+def test_single_detection_starts_no_read(monitor):
+    assert step(monitor, 0) == []  # Eine Stimme: noch nicht bestätigt
+    assert step(monitor) == []
+    assert step(monitor) == []
+    assert monitor.plates.slots == {}
+    assert not parking(monitor, "P0")["car"]
+
+
+def test_confirmed_slot_is_read_once(monitor):
+    assert step(monitor, 0, 1) == []
+    jobs = step(monitor, 0, 1)
+    assert sorted(job[0] for job in jobs) == ["P0", "P1"]
+    for job in jobs:
+        monitor.plates.recognize(job)
+
+    for _ in range(5):
+        assert step(monitor, 0, 1) == []  # Ergebnis liegt im Cache pro Parkplatz
+    assert parking(monitor, "P0")["license_plate"].startswith("TEST")
+    assert monitor.plates.reads == 2
+
+
+def test_vacate_clears_cached_plate(monitor):
+    step(monitor, 0)
+    for job in step(monitor, 0):
+        monitor.plates.recognize(job)
+    step(monitor, 0)
+    assert parking(monitor, "P0")["license_plate"]
+
+    for _ in range(3):
+        step(monitor)  # Bestätigt frei
+    assert not parking(monitor, "P0")["car"]
+    assert parking(monitor, "P0")["license_plate"] == ""
+    assert "P0" not in monitor.plates.slots
+
+    step(monitor, 0)
+    assert [job[0] for job in step(monitor, 0)] == ["P0"]  # Neues Fahrzeug wird wieder gelesen
+
+
+def test_late_result_for_vacated_slot_is_discarded(monitor):
+    step(monitor, 0)
+    old_jobs = step(monitor, 0)
+    for _ in range(3):
+        step(monitor)
+    step(monitor, 0)
+    new_jobs = step(monitor, 0)
+
+    for job in old_jobs:
+        monitor.plates.recognize(job)  # Ergebnis für das vorige Fahrzeug kommt erst jetzt
+    step(monitor, 0)
+    assert parking(monitor, "P0")["license_plate"] == ""
+    for job in new_jobs:
+        monitor.plates.recognize(job)
+    step(monitor, 0)
+    assert parking(monitor, "P0")["license_plate"].startswith("TEST")
+
+
+def test_known_track_keeps_plate_without_reading():
+    reader = PlateReader(StubRecognizer())
+    parkings = [{"id": "A", "car": True, "license_plate": ""}, {"id": "B", "car": True, "license_plate": ""}]
+    for job in reader.jobs(FRAME, [("A", 7, (10, 10, 200, 200))], 4):
+        reader.recognize(job)
+    reader.apply(parkings)
+    plate = parkings[0]["license_plate"]
+
+    reader.vacate(parkings[0])
+    assert reader.jobs(FRAME, [("B", 7, (300, 10, 500, 200))], 4) == []  # Track 7 parkt um
+    reader.apply(parkings)
+    assert parkings[1]["license_plate"] == plate
+    assert reader.reads == 1
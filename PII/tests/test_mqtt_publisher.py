@@ -0,0 +1,102 @@
+import json
+import time
+
+import pytest
+
+from local_broker import LocalBroker
+from mqtt_publisher import MqttPublisher
+from spool import PublishSpool
+
+pytest.importorskip("paho.mqtt.client")
+
+
+# Bis condition() wahr ist oder timeout abläuft
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+@pytest.fixture
+def broker():
+    broker = LocalBroker(port=0, keep=True).start()
+    yield broker
+    broker.stop()
+
+
+def open_publisher(broker, tmp_path, **kwargs):
+    spool = PublishSpool(str(tmp_path / "spool"))
+    publisher = MqttPublisher(broker.host, broker.port, "test", tls=False, spool=spool, rate=0, **kwargs)
+    return publisher.connect(timeout=2.0)
+
+
+# Empfangene Nachrichten in Reihenfolge, Batches (JSON-Arrays) aufgelöst
+def received(broker):
+    messages = []
+    for _, payload in broker.messages:
+        data = json.loads(payload)
+        messages.extend(data if isinstance(data, list) else [data])
+    return messages
+
+
+def test_spools_while_broker_down_and_drains_in_batches(broker, tmp_path):
+    broker.set_online(False)
+    publisher = open_publisher(broker, tmp_path, batch=10)
+    for number in range(35):
+        publisher.publish(json.dumps(number))
+    assert len(publisher.spool) == 35
+    assert broker.received == 0
+
+    broker.set_online(True)
+    assert wait_for(lambda: not len(publisher.spool))
+    assert received(broker) == list(range(35))
+    assert broker.received == 4  # 10 + 10 + 10 + 5 Nachrichten
+    publisher.close()
+
+
+def test_live_messages_wait_behind_spool(broker, tmp_path):
+    broker.set_online(False)
+    publisher = open_publisher(broker, tmp_path, batch=5)
+    for number in range(10):
+        publisher.publish(json.dumps(number))
+    broker.set_online(True)
+    for number in range(10, 20):
+        publisher.publish(json.dumps(number))
+    assert wait_for(lambda: not len(publisher.spool) and len(received(broker)) >= 20)
+    assert received(broker) == list(range(20))
+    publisher.close()
+
+
+def test_spool_is_acked_only_after_puback(broker, tmp_path):
+    broker.set_online(False)
+    publisher = open_publisher(broker, tmp_path, batch=10, ack_timeout=0.3)
+    for number in range(5):
+        publisher.publish(json.dumps(number))
+
+    broker.acks = False
+    broker.set_online(True)
+    assert wait_for(lambda: broker.received >= 1)
+    time.sleep(0.5)
+    assert len(publisher.spool) == 5  # Gesendet, aber ohne PUBACK nicht freigegeben
+
+    broker.acks = True
+    assert wait_for(lambda: not len(publisher.spool))
+    assert received(broker)[-5:] == list(range(5))  # Nach dem Timeout erneut gesendet
+    publisher.close()
+
+
+def test_restart_sends_leftover_spool(broker, tmp_path):
+    broker.set_online(False)
+    publisher = open_publisher(broker, tmp_path)
+    for number in range(3):
+        publisher.publish(json.dumps(number))
+    publisher.close(timeout=0)
+
+    broker.set_online(True)
+    publisher = open_publisher(broker, tmp_path)
+    assert wait_for(lambda: not len(publisher.spool))
+    assert received(broker) == [0, 1, 2]
+    publisher.close()
@@ -0,0 +1,69 @@
+import json
+
+from occupancy_sources import JournalSource
+from occupancy_store import OccupancyStore
+
+
+def state(slot_id, car, plate=""):
+    return {"id": slot_id, "car": car, "license_plate": plate}
+
+
+def open_store(tmp_path):
+    return OccupancyStore(str(tmp_path / "state.json"), str(tmp_path / "state.journal"))
+
+
+def open_source(tmp_path):
+    return JournalSource(str(tmp_path / "state.json"), str(tmp_path / "state.journal"))
+
+
+def test_reads_snapshot_then_new_lines(tmp_path):
+    store = open_store(tmp_path)
+    store.compact(1, [state("A", True), state("B", False)])
+    source = open_source(tmp_path)
+    assert sorted(s["id"] for s in source.poll()) == ["A", "B"]
+    assert source.poll() == []
+
+    store.append(2, [state("B", True)])
+    assert source.poll() == [state("B", True)]
+
+
+def test_compaction_with_longer_journal_rereads_snapshot(tmp_path):
+    store = open_store(tmp_path)
+    store.compact(1, [state("A", False)])
+    store.append(2, [state("A", True)])
+    source = open_source(tmp_path)
+    source.poll()
+
+    # Kompaktieren und das Journal vor dem nächsten Aufruf über den alten Offset wachsen lassen
+    store.compact(3, [state("A", True, "ABC123"), state("C", False)])
+    for seq in range(4, 7):
+        store.append(seq, [state(f"LONG-SLOT-ID-{seq}", True, "LONGPLATE")])
+
+    changes = source.poll()
+    ids = [s["id"] for s in changes]
+    assert "C" in ids  # Snapshot wurde neu gelesen
+    assert ids[-3:] == ["LONG-SLOT-ID-4", "LONG-SLOT-ID-5", "LONG-SLOT-ID-6"]
+    assert source.skipped == 0
+
+
+def test_skips_entries_already_in_snapshot(tmp_path):
+    store = open_store(tmp_path)
+    store.append(1, [state("A", True)])
+    store.append(2, [state("A", False)])
+    # Snapshot geschrieben, Journal aber noch nicht geleert (Moment mitten in compact())
+    with open(tmp_path / "state.json", "w") as snapshot_file:
+        json.dump({"seq": 2, "slots": {"A": state("A", False)}}, snapshot_file)
+
+    assert open_source(tmp_path).poll() == [state("A", False)]
+
+
+def test_broken_line_is_skipped(tmp_path):
+    store = open_store(tmp_path)
+    source = open_source(tmp_path)
+    source.poll()
+    with open(tmp_path / "state.journal", "a") as journal_file:
+        journal_file.write("{kaputt\n")
+    store.append(1, [state("A", True)])
+
+    assert source.poll() == [state("A", True)]
+    assert source.skipped == 1
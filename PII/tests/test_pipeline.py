@@ -0,0 +1,41 @@
+import pytest
+
+from pipeline import BLOCK, STOP, Pipeline
+
+
+def source(items):
+    items = list(items)
+    return lambda: items.pop(0) if items else STOP
+
+
+def test_items_flow_through_stages():
+    pipeline = Pipeline()
+    middle = pipeline.queue(4, BLOCK, "mitte")
+    results = []
+    first = pipeline.stage("quelle", source(range(5)), outbox=middle)
+    pipeline.stage("senke", results.append, middle, upstream=[first])
+    pipeline.start()
+    pipeline.stop()
+    assert results == list(range(5))
+    assert pipeline.failed == []
+    pipeline.raise_if_failed()
+
+
+def test_failing_stage_stops_pipeline_and_is_reported(capsys):
+    pipeline = Pipeline()
+    middle = pipeline.queue(4, BLOCK, "mitte")
+
+    def fail(item):
+        raise ValueError(f"kaputt bei {item}")
+
+    first = pipeline.stage("quelle", source(range(1000)), outbox=middle)
+    pipeline.stage("auswertung", fail, middle, upstream=[first])
+    pipeline.start()
+    for stage in pipeline.stages:
+        stage.join(5)
+
+    assert pipeline.stop_event.is_set()
+    assert [stage.name for stage in pipeline.failed] == ["auswertung"]
+    assert "Traceback" in capsys.readouterr().err
+    with pytest.raises(SystemExit, match="auswertung"):
+        pipeline.raise_if_failed()
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from shm_ring import FrameRing
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing((2, 2, 3), slots=4)
+    yield ring
+    ring.close()
+
+
+def frame(value):
+    return np.full((2, 2, 3), value, np.uint8)
+
+
+def test_drop_mode_returns_newest_and_counts_skipped(ring):
+    for value in range(1, 4):
+        ring.write(frame(value))
+    assert ring.take()[0, 0, 0] == 3
+    assert ring.dropped == 2
+    assert ring.take() is None
+
+
+def test_ordered_mode_returns_every_frame():
+    ring = FrameRing((2, 2, 3), slots=4, drop=False)
+    try:
+        for value in range(1, 4):
+            ring.write(frame(value))
+        assert [ring.take()[0, 0, 0] for _ in range(3)] == [1, 2, 3]
+        assert ring.dropped == 0
+    finally:
+        ring.close()
+
+
+class OverwritingFrames:
+    """Sicht auf ring.frames, die beim ersten Kopieren ein neues Frame schreiben lässt."""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.frames = ring.frames
+        self.pending = 1
+
+    def __setitem__(self, slot, value):
+        self.frames[slot] = value
+
+    def __getitem__(self, slot):
+        view = self.frames[slot]
+        if not self.pending:
+            return view
+        self.pending -= 1
+        outer = self
+
+        class Copying:
+            def copy(self):
+                data = view.copy()
+                for value in range(10, 14):
+                    outer.ring.write(frame(value))  # Schreiber überholt den Leser während des Kopierens
+                return data
+
+        return Copying()
+
+
+def test_retry_counts_skipped_frames_once(ring):
+    for value in range(1, 4):
+        ring.write(frame(value))
+    frames, ring.frames = ring.frames, OverwritingFrames(ring)
+    try:
+        taken = ring.take()
+    finally:
+        ring.frames = frames
+    assert taken[0, 0, 0] == 13
+    assert ring.dropped == 6  # Frames 1..6 übersprungen, Frame 7 (Wert 13) gelesen
@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+
+from spool import DATA_FILE, ENTRY, HEADER, INDEX_FILE, PublishSpool, RateLimiter, batch_payload
+
+
+def open_spool(tmp_path, **kwargs):
+    return PublishSpool(str(tmp_path / "spool"), **kwargs)
+
+
+def test_peek_and_ack_keep_order(tmp_path):
+    spool = open_spool(tmp_path)
+    for number in range(5):
+        spool.append(f'{{"n":{number}}}')
+    start, payloads = spool.peek(3)
+    assert (start, payloads) == (0, ['{"n":0}', '{"n":1}', '{"n":2}'])
+    assert len(spool) == 5  # peek() entfernt nichts
+    spool.ack(start, len(payloads))
+    assert spool.peek(10) == (3, ['{"n":3}', '{"n":4}'])
+    spool.close()
+
+
+def test_full_spool_drops_oldest(tmp_path):
+    spool = open_spool(tmp_path, capacity=4)
+    drops = []
+    spool.on_drop = lambda: drops.append(True)
+    for number in range(6):
+        spool.append(str(number))
+    assert spool.peek(10)[1] == ["2", "3", "4", "5"]
+    assert spool.dropped == 2 and len(drops) == 2
+    spool.close()
+
+
+def test_ack_after_drop_keeps_unsent_messages(tmp_path):
+    spool = open_spool(tmp_path, capacity=10)
+    for number in range(10):
+        spool.append(str(number))
+    start, payloads = spool.peek(5)  # 0..4 werden gesendet
+    for number in range(10, 13):
+        spool.append(str(number))  # verwirft 0, 1, 2
+    spool.ack(start, len(payloads))
+    assert spool.peek(20)[1] == [str(number) for number in range(5, 13)]
+
+    start, payloads = spool.peek(3)  # 5..7
+    for number in range(13, 20):
+        spool.append(str(number))  # verwirft 5..9, also auch mehr als gesendet wurde
+    spool.ack(start, len(payloads))
+    assert spool.peek(20)[1] == [str(number) for number in range(10, 20)]
+    spool.close()
+
+
+def test_wraps_around_data_file(tmp_path):
+    spool = open_spool(tmp_path, capacity=100, data_size=64)
+    for number in range(20):
+        spool.append(f"{number:010d}")  # 10 Byte, höchstens 6 passen in die Datei
+        start, payloads = spool.peek(1)
+        if number % 2:
+            spool.ack(start, 1)
+    payloads = spool.peek(100)[1]
+    assert payloads == sorted(payloads) and payloads[-1] == f"{19:010d}"
+    spool.close()
+
+
+def test_restart_keeps_unsent_messages(tmp_path):
+    spool = open_spool(tmp_path)
+    for number in range(4):
+        spool.append(str(number))
+    spool.ack(0, 1)
+    spool.close()
+
+    spool = open_spool(tmp_path)
+    assert spool.peek(10) == (1, ["1", "2", "3"])
+    spool.close()
+
+
+def corrupt_last_record(directory, data):
+    header = np.fromfile(os.path.join(directory, INDEX_FILE), HEADER, count=1)[0]
+    entries = np.fromfile(os.path.join(directory, INDEX_FILE), ENTRY, offset=HEADER.itemsize)
+    entry = entries[(int(header["tail"]) - 1) % int(header["capacity"])]
+    with open(os.path.join(directory, DATA_FILE), "r+b") as data_file:
+        data_file.seek(int(entry["offset"]))
+        data_file.write(data[:int(entry["length"])])
+
+
+def test_restart_drops_broken_record(tmp_path):
+    spool = open_spool(tmp_path)
+    for number in range(3):
+        spool.append(f'{{"n":{number}}}')
+    del spool  # Absturz: kein close()
+    corrupt_last_record(str(tmp_path / "spool"), b'{"n":9}')
+
+    spool = open_spool(tmp_path)
+    assert spool.peek(10)[1] == ['{"n":0}', '{"n":1}']
+    spool.append('{"n":3}')
+    assert spool.peek(10)[1] == ['{"n":0}', '{"n":1}', '{"n":3}']
+    spool.close()
+
+
+def test_restart_drops_partially_written_record(tmp_path):
+    spool = open_spool(tmp_path)
+    spool.append("erste")
+    spool.append("zweite")
+    del spool
+    corrupt_last_record(str(tmp_path / "spool"), b"\0" * 16)  # Daten nur zum Teil auf der Platte
+
+    spool = open_spool(tmp_path)
+    assert spool.peek(10) == (0, ["erste"])
+    spool.close()
+
+
+def test_batch_payload_and_rate_limiter():
+    assert batch_payload(['{"a":1}']) == '{"a":1}'
+    assert batch_payload(['{"a":1}', '{"b":2}']) == '[{"a":1},{"b":2}]'
+    limiter = RateLimiter(100, burst=10)
+    assert limiter.delay(10) == 0.0
+    assert 0.04 < limiter.delay(5) <= 0.05
+    assert RateLimiter(0).delay(1000) == 0.0
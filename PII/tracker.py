@@ -0,0 +1,166 @@
+import numpy as np
+
+from slot_engine import to_numpy
+from slot_geometry import NO_SLOT
+
+
+# IoU aller Paare zweier Box-Arrays (N, 4) und (M, 4) -> (N, M)
+def iou_matrix(a, b):
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class IouTracker:
+    """Verfolgt Fahrzeuge zwischen zwei Detektor-Aufrufen.
+
+    Detektionen werden per IoU (gierig, beste Überlappung zuerst, danach nächster
+    Mittelpunkt) den bestehenden Tracks zugeordnet. Zwischen den Aufrufen schreibt ein
+    Modell mit konstanter Geschwindigkeit (geglättet wie ein Alpha-Beta-/Kalman-Filter) die
+    Boxen fort, sodass der Detektor nur jedes k-te Frame laufen muss. Ein Track verschwindet erst, wenn er max_missed Aufrufe in
+    Folge nicht bestätigt wurde. Jeder Track hat eine feste ID, den Parkplatz unter seinem
+    Mittelpunkt und den Zeitpunkt, seit dem er dort steht. Alle Zustände liegen in Arrays.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_distance=0.75, max_missed=2, smoothing=0.5):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.smoothing = smoothing
+        self.next_id = 1
+        self.boxes = np.zeros((0, 4), np.float32)
+        self.velocity = np.zeros((0, 4), np.float32)  # Änderung der Box pro Frame
+        self.scores = np.zeros(0, np.float32)
+        self.class_ids = np.zeros(0, np.float32)
+        self.ids = np.zeros(0, np.int64)
+        self.missed = np.zeros(0, np.int32)
+        self.age = np.zeros(0, np.int32)  # Frames seit der letzten Bestätigung
+        self.slot_ids = np.zeros(0, np.int32)
+        self.since = np.zeros(0, np.float64)  # Zeitpunkt, seit dem der Track auf slot_ids steht
+        self.departures = []  # (Track-ID, Parkplatz-Index, Standzeit in s) seit dem letzten Abholen
+        self._since_update = 0
+        self._last_seen = 0.0
+
+    # True, wenn der Detektor bei Schrittweite every in diesem Frame wieder laufen soll
+    def due(self, every):
+        return self._since_update + 1 >= every
+
+    # Ein Frame weiter: Boxen fortschreiben und, falls vorhanden, mit Detektionen korrigieren
+    def update(self, detections=None):
+        self.boxes += self.velocity
+        self.age += 1
+        if detections is None:
+            self._since_update += 1
+            return
+        self._since_update = 0
+
+        data = to_numpy(detections)[:, :6]
+        track_index, detection_index = self._match(data[:, :4])
+
+        # Bestätigte Tracks: Geschwindigkeit aus der Verschiebung seit der letzten Messung
+        measured = data[detection_index, :4]
+        previous = self.boxes[track_index] - self.velocity[track_index] * self.age[track_index, None]
+        observed = (measured - previous) / self.age[track_index, None]
+        self.velocity[track_index] = self.smoothing * observed + (1 - self.smoothing) * self.velocity[track_index]
+        self.boxes[track_index] = measured
+        self.scores[track_index] = data[detection_index, 4]
+        self.class_ids[track_index] = data[detection_index, 5]
+        self.missed[track_index] = 0
+        self.age[track_index] = 0
+
+        # Nicht bestätigte Tracks altern und werden nach max_missed Aufrufen entfernt
+        unmatched = np.ones(len(self.ids), bool)
+        unmatched[track_index] = False
+        self.missed[unmatched] += 1
+        self._remove(self.missed > self.max_missed)
+
+        # Neue Tracks für Detektionen ohne Partner
+        new = np.ones(len(data), bool)
+        new[detection_index] = False
+        self._add(data[new])
+
+    # Zuordnung zuerst über IoU; übrig gebliebene Paare über den Abstand der Mittelpunkte
+    # (relativ zur Box-Diagonale), damit auch schnelle Fahrzeuge ohne Geschwindigkeit passen
+    def _match(self, boxes):
+        iou = iou_matrix(self.boxes, boxes)
+        centers_a = (self.boxes[:, :2] + self.boxes[:, 2:]) / 2
+        centers_b = (boxes[:, :2] + boxes[:, 2:]) / 2
+        diagonal = np.hypot(*(self.boxes[:, 2:] - self.boxes[:, :2]).T)
+        distance = np.hypot(*(centers_a[:, None, :] - centers_b[None, :, :]).transpose(2, 0, 1))
+        distance = distance / np.maximum(diagonal[:, None], 1.0)
+
+        track_index, detection_index = [], []
+        used_tracks, used_detections = set(), set()
+        for valid, priority in ((iou >= self.iou_threshold, -iou), (distance <= self.max_distance, distance)):
+            rows, cols = np.nonzero(valid)
+            order = np.argsort(priority[rows, cols], kind="stable")
+            for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+                if row in used_tracks or col in used_detections:
+                    continue
+                used_tracks.add(row)
+                used_detections.add(col)
+                track_index.append(row)
+                detection_index.append(col)
+        return np.array(track_index, np.int64), np.array(detection_index, np.int64)
+
+    def _add(self, data):
+        count = len(data)
+        self.boxes = np.concatenate((self.boxes, data[:, :4]))
+        self.velocity = np.concatenate((self.velocity, np.zeros((count, 4), np.float32)))
+        self.scores = np.concatenate((self.scores, data[:, 4]))
+        self.class_ids = np.concatenate((self.class_ids, data[:, 5]))
+        self.ids = np.concatenate((self.ids, np.arange(self.next_id, self.next_id + count)))
+        self.next_id += count
+        self.missed = np.concatenate((self.missed, np.zeros(count, np.int32)))
+        self.age = np.concatenate((self.age, np.zeros(count, np.int32)))
+        self.slot_ids = np.concatenate((self.slot_ids, np.full(count, NO_SLOT, np.int32)))
+        self.since = np.concatenate((self.since, np.zeros(count)))
+
+    def _remove(self, mask):
+        if not mask.any():
+            return
+        self._depart(mask, self._last_seen)
+        keep = ~mask
+        for name in ("boxes", "velocity", "scores", "class_ids", "ids", "missed", "age", "slot_ids", "since"):
+            setattr(self, name, getattr(self, name)[keep])
+
+    # Standzeiten der Tracks in mask abschließen, die auf einem Parkplatz standen
+    def _depart(self, mask, now):
+        parked = mask & (self.slot_ids != NO_SLOT)
+        for track_id, slot_id, since in zip(self.ids[parked].tolist(), self.slot_ids[parked].tolist(),
+                                            self.since[parked].tolist()):
+            self.departures.append((track_id, slot_id, now - since))
+
+    # Parkplatz unter dem Mittelpunkt jedes Tracks bestimmen (wie SlotEngine.assign)
+    def locate(self, index, now):
+        boxes = self.boxes.astype(np.int32)
+        slot_ids = index.query_points((boxes[:, 0] + boxes[:, 2]) // 2, (boxes[:, 1] + boxes[:, 3]) // 2)
+        moved = slot_ids != self.slot_ids
+        self._depart(moved, now)
+        self.slot_ids = slot_ids
+        self.since[moved] = now
+        self._last_seen = now
+
+    # Aktuelle Tracks im Format von boxes.data (x1, y1, x2, y2, conf, cls), Zeilen wie self.ids
+    def detections(self):
+        return np.column_stack((self.boxes, self.scores, self.class_ids)).astype(np.float32)
+
+    # Geparkte Fahrzeuge als Python-Werte: (Track-ID, Parkplatz-Index, Standzeit in s, Box)
+    def parked(self, now):
+        mask = self.slot_ids != NO_SLOT
+        return list(zip(
+            self.ids[mask].tolist(), self.slot_ids[mask].tolist(), (now - self.since[mask]).tolist(),
+            self.boxes[mask].astype(np.int32).tolist(),
+        ))
+
+    # Abgeschlossene Standzeiten abholen
+    def pop_departures(self):
+        departures, self.departures = self.departures, []
+        return departures